@@ -1,18 +1,54 @@
 import sys  
 sys.tracebacklimit = 1  
 
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from routes.user import user
-from routes.payment import payment
+from config.cloud import configurar_cloudinary
+from config.storage import ADJUNTO_MAX_BYTES, CUERPO_MARGEN_BYTES, LimiteCuerpo
+from config.db import DB_ASYNC, MarcaEscritura, dispose_engines
+from models import adjuntos, directorio, particiones
 from fastapi.middleware.cors import CORSMiddleware
 from routes.carer import carer
-from routes.materia import materia
 from routes.updateUser import updateUser
-from routes.message import message
-from routes.asignarMateria import asignar
 from fastapi.staticfiles import StaticFiles
 
-api_escu = FastAPI()
+# DB_ASYNC=true sirve las mismas rutas sobre el engine async (asyncpg)
+if DB_ASYNC:
+    from routes.userAsync import user
+    from routes.paymentAsync import payment
+    from routes.materiaAsync import materia
+    from routes.messageAsync import message
+    from routes.asignarMateriaAsync import asignar
+else:
+    from routes.user import user
+    from routes.payment import payment
+    from routes.materia import materia
+    from routes.message import message
+    from routes.asignarMateria import asignar
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada de esto corre al importar: el esquema se crea con `python -m migrations`
+    # y los engines se abren en el primer request que los usa
+    os.makedirs("uploads", exist_ok=True)
+    configurar_cloudinary()
+    adjuntos.reanudar_pendientes()
+    gc = asyncio.create_task(adjuntos.gc_periodico())
+    mantenimiento = asyncio.create_task(particiones.mantener_periodico())
+    recarga = asyncio.create_task(directorio.recargar_periodico())
+    yield
+    gc.cancel()
+    mantenimiento.cancel()
+    recarga.cancel()
+    adjuntos.detener()
+    await dispose_engines()
+
+
+api_escu = FastAPI(lifespan=lifespan)
 
 api_escu.include_router(user)
 
@@ -28,6 +64,16 @@ api_escu.include_router(message)
 
 api_escu.include_router(asignar)
 
+# El tamaño de los adjuntos se controla antes de que se parsee el formulario
+api_escu.add_middleware(
+    LimiteCuerpo,
+    rutas=["/messages/send"],
+    max_bytes=ADJUNTO_MAX_BYTES + CUERPO_MARGEN_BYTES,
+)
+
+# Read-your-writes entre workers: ver config/db.py
+api_escu.add_middleware(MarcaEscritura)
+
 api_escu.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -36,4 +82,4 @@ api_escu.add_middleware(
     allow_headers=["*"]
 )
 
-api_escu.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+api_escu.mount("/uploads", StaticFiles(directory="uploads", check_dir=False), name="uploads")
@@ -0,0 +1,42 @@
+import asyncio, hmac, os
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# Costo de bcrypt (cada +1 duplica el tiempo; 12 ~ 100-250ms por hash)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hilos dedicados a hashear: acota cuánta CPU se lleva el login y no ocupa
+# el threadpool de FastAPI ni el event loop (bcrypt libera el GIL)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash")
+
+
+def _verificar(plain, stored):
+    """Devuelve (ok, nuevo_hash). nuevo_hash no es None si hay que regrabarlo."""
+    if not stored:
+        return False, None
+    if pwd_context.identify(stored, required=False) is None:
+        # Fila vieja con la contraseña en texto plano: se hashea al loguearse
+        ok = hmac.compare_digest(stored.encode(), plain.encode())
+        return ok, (pwd_context.hash(plain) if ok else None)
+    return pwd_context.verify_and_update(plain, stored)
+
+
+def hash_password(plain: str) -> str:
+    return _pool.submit(pwd_context.hash, plain).result()
+
+
+def verificar_password(plain: str, stored: str):
+    return _pool.submit(_verificar, plain, stored).result()
+
+
+async def hash_password_async(plain: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_pool, pwd_context.hash, plain)
+
+
+async def verificar_password_async(plain: str, stored: str):
+    return await asyncio.get_running_loop().run_in_executor(_pool, _verificar, plain, stored)
@@ -1,15 +1,23 @@
-import datetime, pytz, jwt
+import datetime, pytz, jwt, threading, time
+from collections import OrderedDict
+from fastapi import Request
 
 class Security:
     secret = "cualquier cosa"
 
+    # Tokens ya verificados -> payload. LRU acotado; cada entrada vence en el "exp"
+    # del token, así el polling del mismo cliente no repite el decode HS256.
+    cache_max = 1024
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
     @classmethod
     def hoy(cls):
         return datetime.datetime.now(pytz.timezone("America/Buenos_Aires"))
 
     @classmethod
-    def generate_token(cls, authUser):   
-        ahora = cls.hoy()     
+    def generate_token(cls, authUser):
+        ahora = cls.hoy()
         payload = {
             "iat": int(ahora.timestamp()),
             "exp": int((ahora + datetime.timedelta(minutes=480)).timestamp()),
@@ -21,6 +29,25 @@ class Security:
             print("Error en JWT: ", e)
             return None
 
+    @classmethod
+    def _cache_get(cls, token):
+        with cls._cache_lock:
+            payload = cls._cache.get(token)
+            if payload is None:
+                return None
+            if payload.get("exp", 0) <= time.time():
+                del cls._cache[token]
+                return None
+            cls._cache.move_to_end(token)
+            return payload
+
+    @classmethod
+    def _cache_put(cls, token, payload):
+        with cls._cache_lock:
+            cls._cache[token] = payload
+            cls._cache.move_to_end(token)
+            while len(cls._cache) > cls.cache_max:
+                cls._cache.popitem(last=False)
 
     @classmethod
     def verify_token(cls, headers):
@@ -32,8 +59,19 @@ class Security:
         try:
             # Quitar el "Bearer " del inicio
             token = token_header.split(" ")[1]
-            payload = jwt.decode(token, cls.secret, algorithms=["HS256"])
-            return payload
+            payload = cls._cache_get(token)
+            if payload is None:
+                payload = jwt.decode(token, cls.secret, algorithms=["HS256"])
+                cls._cache_put(token, payload)
+            return dict(payload)
         except Exception as e:
             print("Error al verificar token: ", e)
             return {"error": "Token inválido o expirado"}
+
+
+def verificar_token(request: Request) -> dict:
+    """Dependencia de FastAPI: payload del token, o {"error": ...} si no es válido.
+
+    Las rutas siguen respondiendo 401 con ese dict cuando falta "iat".
+    """
+    return Security.verify_token(request.headers)
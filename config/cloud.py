@@ -0,0 +1,13 @@
+import os
+
+
+def configurar_cloudinary():
+    """Configura las credenciales de Cloudinary (se llama en el startup de la app)."""
+    import cloudinary
+
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME", "dydhfghau"),
+        api_key=os.getenv("CLOUDINARY_API_KEY", "231924475335554"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET", "ZytmRYQuMFnRJHEGDYFjN17QTro"),
+        secure=True
+    )
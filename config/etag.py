@@ -0,0 +1,30 @@
+# ETag débiles para los endpoints que el frontend consulta por polling. La
+# versión sale de algo barato (un contador de models/versiones.py, un agregado
+# o el cache de notificaciones), no del cuerpo: si coincide con If-None-Match
+# se responde 304 sin correr la consulta completa ni serializar.
+from fastapi import Request, Response
+
+
+def etag(*partes) -> str:
+    return 'W/"' + "-".join(str(p) for p in partes) + '"'
+
+
+def coincide(request: Request, valor: str) -> bool:
+    """Comparación débil contra If-None-Match (lista separada por comas o "*")."""
+    encabezado = request.headers.get("if-none-match")
+    if not encabezado:
+        return False
+    if encabezado.strip() == "*":
+        return True
+    propio = valor.removeprefix("W/")
+    return any(e.strip().removeprefix("W/") == propio for e in encabezado.split(","))
+
+
+def no_modificado(valor: str) -> Response:
+    return Response(status_code=304, headers={"ETag": valor, "Cache-Control": "no-cache"})
+
+
+def marcar(response: Response, valor: str):
+    # no-cache: el navegador guarda la respuesta pero revalida en cada poll
+    response.headers["ETag"] = valor
+    response.headers["Cache-Control"] = "no-cache"
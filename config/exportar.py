@@ -0,0 +1,75 @@
+# Exportaciones en streaming (NDJSON o CSV) para los listados sin límite.
+#
+# La sesión del request (get_db) se cierra antes de que se mande el cuerpo, así
+# que el generador abre su propia conexión contra el engine de lectura y
+# recorre el resultado con un cursor del lado del servidor (stream_results:
+# un cursor con nombre en psycopg2), de a EXPORT_LOTE filas. Cada lote se
+# codifica y se manda como un chunk: la memoria no depende del tamaño de la tabla.
+import csv
+import io
+import json
+import os
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from config.db import get_read_engine
+
+EXPORT_LOTE = int(os.getenv("EXPORT_LOTE", "1000"))
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _lotes(stmt, lote):
+    with get_read_engine().connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=lote).execute(stmt)
+        for filas in resultado.partitions(lote):
+            yield filas
+
+
+def _ndjson(stmt, a_dict, lote):
+    for filas in _lotes(stmt, lote):
+        yield "".join(json.dumps(a_dict(f), ensure_ascii=False, default=str) + "\n" for f in filas)
+
+
+def _csv(stmt, columnas, a_fila, lote):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for filas in _lotes(stmt, lote):
+        escritor.writerows(a_fila(f) for f in filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _con_log(chunks, nombre):
+    # Con el 200 ya enviado no se puede cambiar el status: se corta el cuerpo y se loguea
+    try:
+        yield from chunks
+    except Exception as e:
+        print(f"Error exportando {nombre}:", e)
+
+
+def exportar(stmt, nombre, formato, a_dict, columnas, a_fila, lote=EXPORT_LOTE):
+    """StreamingResponse con el resultado de `stmt`.
+
+    `a_dict(fila)` arma cada línea NDJSON; para CSV se usan `columnas` como
+    encabezado y `a_fila(fila)` como valores.
+    """
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {formato}")
+    if formato == "ndjson":
+        chunks = _ndjson(stmt, a_dict, lote)
+    else:
+        chunks = _csv(stmt, columnas, a_fila, lote)
+    return StreamingResponse(
+        _con_log(chunks, nombre),
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'},
+    )
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class PubSubBackend:
+    """Reparte eventos por usuario entre las conexiones suscriptas.
+
+    suscribir/desuscribir se llaman desde el event loop (WebSocket/SSE);
+    publicar puede llamarse desde cualquier hilo (handlers sync, threadpool).
+    """
+
+    def suscribir(self, user_id: int) -> asyncio.Queue:
+        raise NotImplementedError
+
+    def desuscribir(self, user_id: int, cola: asyncio.Queue):
+        raise NotImplementedError
+
+    def publicar(self, user_id: int, evento: dict):
+        raise NotImplementedError
+
+
+class MemoriaPubSub(PubSubBackend):
+    """Backend en proceso: sirve con un solo worker de uvicorn."""
+
+    def __init__(self, max_eventos: int = 100):
+        self.max_eventos = max_eventos
+        self._colas = {}
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def suscribir(self, user_id):
+        self._loop = asyncio.get_running_loop()
+        cola = asyncio.Queue(maxsize=self.max_eventos)
+        with self._lock:
+            self._colas.setdefault(user_id, set()).add(cola)
+        return cola
+
+    def desuscribir(self, user_id, cola):
+        with self._lock:
+            colas = self._colas.get(user_id)
+            if colas:
+                colas.discard(cola)
+                if not colas:
+                    del self._colas[user_id]
+
+    def publicar(self, user_id, evento):
+        with self._lock:
+            colas = list(self._colas.get(user_id, ()))
+        if colas and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._entregar, colas, evento)
+
+    @staticmethod
+    def _entregar(colas, evento):
+        for cola in colas:
+            if cola.full():
+                cola.get_nowait()  # cliente lento: pierde el evento más viejo
+            cola.put_nowait(evento)
+
+
+BACKENDS = {"memory": MemoriaPubSub}
+
+# PUBSUB_BACKEND elige la implementación; con varios workers hace falta una
+# compartida (p. ej. Redis) registrada acá o instalada con usar_backend()
+backend = BACKENDS[os.getenv("PUBSUB_BACKEND", "memory")]()
+
+
+def usar_backend(nuevo: PubSubBackend):
+    global backend
+    backend = nuevo
+
+
+def suscribir(user_id: int) -> asyncio.Queue:
+    return backend.suscribir(user_id)
+
+
+def desuscribir(user_id: int, cola: asyncio.Queue):
+    backend.desuscribir(user_id, cola)
+
+
+# Los eventos se encolan en la sesión y salen recién cuando la transacción hace
+# commit: nunca se avisa algo que después se deshizo con un rollback
+_PENDIENTES = "eventos_pendientes"
+
+
+def publicar_al_commit(session: Session, user_ids, evento: dict):
+    session.info.setdefault(_PENDIENTES, []).append(
+        (set(user_ids), jsonable_encoder(evento))
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_pendientes(session):
+    for user_ids, evento in session.info.pop(_PENDIENTES, []):
+        for user_id in user_ids:
+            backend.publicar(user_id, evento)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_pendientes(session, previous_transaction):
+    session.info.pop(_PENDIENTES, None)
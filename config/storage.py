@@ -0,0 +1,269 @@
+import datetime
+import hashlib
+import os
+import re
+import uuid
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Dónde se guardan los adjuntos de los mensajes: "cloudinary" (default) o "local"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+# Tamaño máximo de un adjunto; se controla mientras se copia, no al final
+ADJUNTO_MAX_BYTES = int(os.getenv("ADJUNTO_MAX_BYTES", str(20 * 1024 * 1024)))
+# De a cuánto se lee el archivo subido (local) y cuánto se manda por parte a Cloudinary
+CHUNK_BYTES = 1024 * 1024
+CLOUDINARY_CHUNK_BYTES = int(os.getenv("CLOUDINARY_CHUNK_BYTES", str(6 * 1024 * 1024)))
+
+UPLOAD_DIR = "uploads"
+BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")
+
+
+class AdjuntoDemasiadoGrande(Exception):
+    pass
+
+
+class _LectorLimitado:
+    """Envuelve el archivo subido y corta apenas se pasa de max_bytes."""
+
+    def __init__(self, origen, max_bytes):
+        self._origen = origen
+        self._max = max_bytes
+        self._leidos = 0
+        self.name = getattr(origen, "name", None)
+
+    def read(self, n=-1):
+        chunk = self._origen.read(n)
+        self._leidos += len(chunk)
+        if self._leidos > self._max:
+            raise AdjuntoDemasiadoGrande(f"El archivo supera {self._max} bytes")
+        return chunk
+
+    def seek(self, *args):
+        return self._origen.seek(*args)
+
+    def tell(self):
+        return self._origen.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# Lo que puede ocupar el resto del formulario (campos y encabezados multipart)
+CUERPO_MARGEN_BYTES = 1024 * 1024
+
+
+class LimiteCuerpo:
+    """Middleware ASGI: corta los requests a `rutas` cuyo cuerpo supera `max_bytes`.
+
+    Starlette vuelca el multipart entero a un temporal antes de llegar al
+    handler, así que el límite de copiar_a_disco llega tarde. Acá se rechaza
+    por Content-Length sin leer nada y, si no viene o miente, se corta el
+    stream apenas se pasa: en los dos casos responde 413.
+    """
+
+    def __init__(self, app, rutas, max_bytes):
+        self.app = app
+        self.rutas = set(rutas)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.rutas:
+            return await self.app(scope, receive, send)
+
+        detalle = f"El archivo supera {ADJUNTO_MAX_BYTES} bytes"
+        for nombre, valor in scope["headers"]:
+            if nombre == b"content-length" and valor.isdigit() and int(valor) > self.max_bytes:
+                respuesta = JSONResponse(status_code=413, content={"detail": detalle})
+                return await respuesta(scope, receive, send)
+
+        leidos = 0
+
+        async def receive_limitado():
+            nonlocal leidos
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                leidos += len(mensaje.get("body", b""))
+                if leidos > self.max_bytes:
+                    # FastAPI deja pasar las HTTPException del parseo del cuerpo
+                    raise HTTPException(status_code=413, detail=detalle)
+            return mensaje
+
+        await self.app(scope, receive_limitado, send)
+
+
+def nombre_seguro(filename):
+    base = os.path.basename(filename or "archivo")
+    return re.sub(r"[^A-Za-z0-9._-]", "_", base) or "archivo"
+
+
+def copiar_a_disco(origen, destino) -> str:
+    """Copia `origen` a `destino` de a CHUNK_BYTES, respetando ADJUNTO_MAX_BYTES.
+
+    Escribe en un .part y lo renombra al final: nunca queda un archivo a medias.
+    Devuelve el sha256 del contenido, calculado durante la copia.
+    """
+    temporal = destino + ".part"
+    lector = _LectorLimitado(origen, ADJUNTO_MAX_BYTES)
+    digest = hashlib.sha256()
+    try:
+        with open(temporal, "wb") as f:
+            while True:
+                chunk = lector.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return digest.hexdigest()
+
+
+class StorageBackend:
+    """Destino de los adjuntos. Los métodos son bloqueantes: llamarlos fuera del event loop."""
+
+    def guardar(self, filename: str, origen) -> str:
+        """Copia `origen` (archivo binario abierto) por partes y devuelve la URL pública."""
+        raise NotImplementedError
+
+    def borrar(self, url: str):
+        raise NotImplementedError
+
+    def contiene(self, url: str) -> bool:
+        """Si la URL apunta a un objeto de este backend."""
+        return False
+
+
+# Nombre que LocalStorage.guardar le pone a cada archivo: uuid4 en hex + "_"
+NOMBRE_LOCAL = re.compile(r"[0-9a-f]{32}_")
+
+
+class LocalStorage(StorageBackend):
+    """Guarda en uploads/ (servido por el StaticFiles de app.py)."""
+
+    def __init__(self, directorio=UPLOAD_DIR, base_url=BASE_URL):
+        self.directorio = directorio
+        self.base_url = base_url
+
+    def guardar(self, filename, origen):
+        os.makedirs(self.directorio, exist_ok=True)
+        nombre = f"{uuid.uuid4().hex}_{nombre_seguro(filename)}"
+        copiar_a_disco(origen, os.path.join(self.directorio, nombre))
+        return f"{self.base_url}/{self.directorio}/{nombre}"
+
+    def borrar(self, url):
+        filepath = os.path.join(self.directorio, url.split("/")[-1])
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+    def contiene(self, url):
+        return f"/{self.directorio}/" in url
+
+
+class CloudinaryStorage(StorageBackend):
+    """Sube por partes con upload_large: en memoria queda una parte, no el archivo."""
+
+    def guardar(self, filename, origen):
+        import cloudinary.uploader
+
+        # Obtener extensión del archivo
+        file_extension = filename.split('.')[-1].lower()
+        timestamp = int(datetime.datetime.now().timestamp())
+
+        # SIEMPRE usar resource_type="raw" para documentos (PDFs, DOC, XLS, etc.)
+        # Solo usar "auto" o "image" para imágenes reales
+        if file_extension in ['pdf', 'doc', 'docx', 'txt', 'xls', 'xlsx', 'zip', 'rar', 'ppt', 'pptx']:
+            resource_type = "raw"
+        elif file_extension in ['mp4', 'avi', 'mov', 'mkv', 'webm']:
+            resource_type = "video"
+        elif file_extension in ['mp3', 'wav', 'ogg']:
+            resource_type = "video"  # Cloudinary usa "video" para audio también
+        else:
+            # Imágenes y otros
+            resource_type = "auto"
+
+        # Crear public_id único
+        filename_sin_ext = filename.rsplit('.', 1)[0]
+        public_id = f"mensajes_adjuntos/{timestamp}_{filename_sin_ext}"
+
+        result = cloudinary.uploader.upload_large(
+            _LectorLimitado(origen, ADJUNTO_MAX_BYTES),
+            filename=filename,
+            public_id=public_id,
+            resource_type=resource_type,
+            chunk_size=CLOUDINARY_CHUNK_BYTES,
+        )
+        return result.get("secure_url")
+
+    def borrar(self, url):
+        import cloudinary.uploader
+
+        # .../<resource_type>/upload/v123/<public_id>[.ext]
+        m = re.search(r"/(image|video|raw)/upload/(?:v\d+/)?(.+)$", url)
+        if not m:
+            return
+        resource_type, public_id = m.groups()
+        if resource_type != "raw":
+            public_id = public_id.rsplit(".", 1)[0]
+        cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+
+    def contiene(self, url):
+        return "res.cloudinary.com/" in url
+
+
+class MemoriaStorage(StorageBackend):
+    """Backend falso para pruebas: guarda en un dict y puede fallar las primeras `fallas` veces."""
+
+    def __init__(self, fallas=0):
+        self.fallas = fallas
+        self.archivos = {}
+
+    def guardar(self, filename, origen):
+        if self.fallas > 0:
+            self.fallas -= 1
+            raise ConnectionError("falla simulada del storage")
+        lector = _LectorLimitado(origen, ADJUNTO_MAX_BYTES)
+        partes = []
+        while True:
+            chunk = lector.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            partes.append(chunk)
+        url = f"memory://{uuid.uuid4().hex}/{nombre_seguro(filename)}"
+        self.archivos[url] = b"".join(partes)
+        return url
+
+    def borrar(self, url):
+        self.archivos.pop(url, None)
+
+    def contiene(self, url):
+        return url.startswith("memory://")
+
+
+BACKENDS = {"local": LocalStorage, "cloudinary": CloudinaryStorage, "memory": MemoriaStorage}
+
+backend = BACKENDS[STORAGE_BACKEND]()
+
+
+def usar_backend(nuevo: StorageBackend):
+    global backend
+    backend = nuevo
+
+
+def guardar(filename: str, origen) -> str:
+    return backend.guardar(filename, origen)
+
+
+def borrar(url: str):
+    """Borra el objeto del backend que lo tiene, aunque no sea el configurado ahora
+    (p. ej. archivos locales viejos después de pasar a Cloudinary)."""
+    for b in (backend, LocalStorage(), CloudinaryStorage()):
+        if b.contiene(url):
+            b.borrar(url)
+            return
@@ -0,0 +1,33 @@
+"""Migraciones del esquema y mantenimiento.
+
+Uso:
+    python -m migrations                    # aplica las pendientes (igual que "upgrade")
+    python -m migrations status             # lista aplicadas y pendientes
+    python -m migrations particiones        # crea las particiones de messages de los próximos meses
+    python -m migrations archivar MESES [--sin-borrar]
+                                            # vuelca a .csv.gz y desengancha las particiones
+                                            # de messages con más de MESES meses
+    python -m migrations ingresos           # recalcula ingresos_mensuales desde payments
+"""
+import sys
+
+from migrations.runner import status, upgrade
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if comando == "upgrade":
+        upgrade()
+    elif comando == "status":
+        status()
+    elif comando == "particiones":
+        from models import particiones
+        particiones.mantener()
+    elif comando == "archivar" and len(sys.argv) > 2:
+        from models import particiones
+        particiones.archivar(int(sys.argv[2]), borrar="--sin-borrar" not in sys.argv)
+    elif comando == "ingresos":
+        from models import ingresos
+        ingresos.reconstruir()
+    else:
+        print(__doc__)
+        sys.exit(1)
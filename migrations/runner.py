@@ -0,0 +1,64 @@
+import datetime
+import importlib
+import pkgutil
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+
+from config.db import get_engine
+
+# Cada migración es un módulo vNNNN_nombre.py en migrations/versions con una
+# función upgrade(conn). Se aplican en orden, cada una en su transacción, y se
+# registran en schema_version. Tienen que ser idempotentes: en una base nueva la
+# v0001 ya crea las tablas con los índices que declaran los modelos.
+_meta = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, default=datetime.datetime.utcnow),
+)
+
+
+def migraciones():
+    """Devuelve [(version, nombre, modulo)] ordenado por versión."""
+    import migrations.versions as versions
+
+    encontradas = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        if not info.name.startswith("v"):
+            continue
+        numero, _, nombre = info.name[1:].partition("_")
+        modulo = importlib.import_module(f"migrations.versions.{info.name}")
+        encontradas.append((int(numero), nombre, modulo))
+    return sorted(encontradas, key=lambda m: m[0])
+
+
+def aplicadas(conn):
+    schema_version.create(conn, checkfirst=True)
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def upgrade(engine=None):
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        hechas = aplicadas(conn)
+
+    for version, nombre, modulo in migraciones():
+        if version in hechas:
+            continue
+        print(f"Aplicando migración {version:04d} ({nombre})...")
+        with engine.begin() as conn:
+            modulo.upgrade(conn)
+            conn.execute(schema_version.insert().values(version=version, name=nombre))
+
+
+def status(engine=None):
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        hechas = aplicadas(conn)
+
+    for version, nombre, _ in migraciones():
+        estado = "aplicada" if version in hechas else "pendiente"
+        print(f"{version:04d} {nombre}: {estado}")
@@ -0,0 +1,20 @@
+"""Esquema inicial: lo que antes hacía create_all() al importar models.modelo."""
+from config.db import Base
+import models.modelo  # noqa: F401 (registra los modelos en Base.metadata)
+
+TABLAS = [
+    "carer",
+    "userdetails",
+    "usuarios",
+    "materia",
+    "alumno_materia",
+    "profesor_materia",
+    "payments",
+    "messages",
+]
+
+
+def upgrade(conn):
+    Base.metadata.create_all(
+        bind=conn, tables=[Base.metadata.tables[t] for t in TABLAS]
+    )
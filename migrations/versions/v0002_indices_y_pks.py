@@ -0,0 +1,50 @@
+"""Índices para las consultas de routes/ y PK compuesta en las tablas intermedias."""
+from sqlalchemy import inspect, text
+
+from models.modelo import Message, Payment, UserDetails, alumno_materia, profesor_materia
+
+# Antes de agregar la PK hay que sacar filas con NULL y duplicados. En
+# alumno_materia se conserva la fila que tiene nota cargada.
+DEDUP = {
+    "alumno_materia": """
+        DELETE FROM alumno_materia a USING alumno_materia b
+        WHERE a.user_id = b.user_id AND a.materia_id = b.materia_id
+          AND ((a.nota IS NULL AND b.nota IS NOT NULL)
+               OR ((a.nota IS NULL) = (b.nota IS NULL) AND a.ctid > b.ctid))
+    """,
+    "profesor_materia": """
+        DELETE FROM profesor_materia a USING profesor_materia b
+        WHERE a.user_id = b.user_id AND a.materia_id = b.materia_id
+          AND a.ctid > b.ctid
+    """,
+}
+
+TABLAS = [
+    alumno_materia,
+    profesor_materia,
+    UserDetails.__table__,
+    Payment.__table__,
+    Message.__table__,
+]
+
+
+def upgrade(conn):
+    insp = inspect(conn)
+
+    if conn.dialect.name == "postgresql":
+        for tabla in (alumno_materia, profesor_materia):
+            if insp.get_pk_constraint(tabla.name)["constrained_columns"]:
+                continue
+            conn.execute(text(
+                f"DELETE FROM {tabla.name} WHERE user_id IS NULL OR materia_id IS NULL"
+            ))
+            conn.execute(text(DEDUP[tabla.name]))
+            conn.execute(text(
+                f"ALTER TABLE {tabla.name} ADD PRIMARY KEY (user_id, materia_id)"
+            ))
+
+    for tabla in TABLAS:
+        existentes = {i["name"] for i in insp.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in existentes:
+                indice.create(conn)
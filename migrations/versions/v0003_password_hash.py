@@ -0,0 +1,8 @@
+"""usuarios.password pasa a VARCHAR(255): un hash bcrypt ocupa 60 caracteres."""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    # SQLite no tiene ALTER COLUMN y tampoco respeta el largo de VARCHAR
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE usuarios ALTER COLUMN password TYPE VARCHAR(255)"))
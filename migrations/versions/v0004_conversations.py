@@ -0,0 +1,47 @@
+"""Tabla conversations (resumen por par de usuarios) y carga inicial desde messages."""
+from sqlalchemy import case, func, select
+
+from models.modelo import Conversation, Message
+
+tabla = Conversation.__table__
+
+
+def upgrade(conn):
+    tabla.create(conn, checkfirst=True)
+    if conn.execute(select(func.count()).select_from(tabla)).scalar():
+        return
+
+    # Los no leídos históricos no se conocen: arrancan en cero
+    a = case((Message.sender_id <= Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+    b = case((Message.sender_id <= Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+    pares = (
+        select(a.label("a"), b.label("b"), func.max(Message.id).label("last_id"))
+        .group_by(a, b)
+        .subquery()
+    )
+    ultimos = select(
+        pares.c.a,
+        pares.c.b,
+        pares.c.last_id,
+        Message.timestamp,
+        0,
+        0,
+        pares.c.last_id,
+        pares.c.last_id,
+    ).join(Message, Message.id == pares.c.last_id)
+
+    conn.execute(
+        tabla.insert().from_select(
+            [
+                "user_a_id",
+                "user_b_id",
+                "last_message_id",
+                "last_timestamp",
+                "unread_a",
+                "unread_b",
+                "read_a_id",
+                "read_b_id",
+            ],
+            ultimos,
+        )
+    )
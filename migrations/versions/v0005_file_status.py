@@ -0,0 +1,11 @@
+"""messages.file_status: estado del adjunto mientras se sube en segundo plano."""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    columnas = {c["name"] for c in inspect(conn).get_columns("messages")}
+    if "file_status" in columnas:
+        return
+    conn.execute(text("ALTER TABLE messages ADD COLUMN file_status VARCHAR(20)"))
+    # Los adjuntos que ya existen se subieron en el momento
+    conn.execute(text("UPDATE messages SET file_status = 'listo' WHERE file_url IS NOT NULL"))
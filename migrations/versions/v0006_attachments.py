@@ -0,0 +1,15 @@
+"""Tabla attachments y messages.file_hash para deduplicar adjuntos por contenido.
+
+Los adjuntos que ya existen quedan sin hash: no se deduplican, y se borran
+del storage como antes cuando se borra su mensaje.
+"""
+from sqlalchemy import inspect, text
+
+from models.modelo import Attachment
+
+
+def upgrade(conn):
+    Attachment.__table__.create(conn, checkfirst=True)
+    columnas = {c["name"] for c in inspect(conn).get_columns("messages")}
+    if "file_hash" not in columnas:
+        conn.execute(text("ALTER TABLE messages ADD COLUMN file_hash VARCHAR(64)"))
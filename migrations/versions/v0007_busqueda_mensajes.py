@@ -0,0 +1,19 @@
+"""messages.content_tsv (tsvector en español) con índice GIN para la búsqueda.
+
+Es una columna generada: PostgreSQL la mantiene en cada INSERT/UPDATE sin
+tocar el código que escribe mensajes. En SQLite no hay tsvector y la búsqueda
+usa LIKE (ver buscar_mensajes en routes/message.py).
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text(
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('spanish', coalesce(content, ''))) STORED"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING GIN (content_tsv)"
+    ))
@@ -0,0 +1,57 @@
+"""messages pasa a estar particionada por mes sobre timestamp (solo PostgreSQL).
+
+Se crea la tabla particionada con las mismas columnas, se copian los datos y se
+borra la vieja. La PK pasa a ser (id, timestamp), como exige PostgreSQL; la
+secuencia de id se conserva. Corre en una sola transacción y bloquea messages
+mientras copia.
+"""
+from sqlalchemy import inspect, text
+
+from models import particiones
+from models.modelo import Message
+
+VIEJA = "messages_sin_particionar"
+
+
+def upgrade(conn):
+    if conn.dialect.name != "postgresql" or particiones.es_particionada(conn):
+        return
+
+    secuencia = conn.execute(text("SELECT pg_get_serial_sequence('messages', 'id')")).scalar()
+    columnas = [
+        c["name"] for c in inspect(conn).get_columns("messages") if c["name"] != "content_tsv"
+    ]
+    lista = ", ".join(f'"{c}"' for c in columnas)
+
+    conn.execute(text(f"ALTER TABLE messages RENAME TO {VIEJA}"))
+    conn.execute(text(f"ALTER INDEX IF EXISTS messages_pkey RENAME TO {VIEJA}_pkey"))
+    conn.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY NONE"))
+    # Los nombres de índice se reusan en la tabla nueva
+    for indice in [i.name for i in Message.__table__.indexes] + ["ix_messages_content_tsv"]:
+        conn.execute(text(f"DROP INDEX IF EXISTS {indice}"))
+    conn.execute(text(f'UPDATE {VIEJA} SET "timestamp" = now() WHERE "timestamp" IS NULL'))
+
+    conn.execute(text(
+        f"CREATE TABLE messages (LIKE {VIEJA} INCLUDING DEFAULTS INCLUDING GENERATED) "
+        'PARTITION BY RANGE ("timestamp")'
+    ))
+    conn.execute(text('ALTER TABLE messages ALTER COLUMN "timestamp" SET NOT NULL'))
+    conn.execute(text('ALTER TABLE messages ADD PRIMARY KEY (id, "timestamp")'))
+    conn.execute(text("ALTER TABLE messages ADD FOREIGN KEY (sender_id) REFERENCES usuarios (id)"))
+    conn.execute(text("ALTER TABLE messages ADD FOREIGN KEY (receiver_id) REFERENCES usuarios (id)"))
+    conn.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY messages.id"))
+    # Red de seguridad si se llega a un mes sin partición creada
+    conn.execute(text("CREATE TABLE messages_default PARTITION OF messages DEFAULT"))
+
+    desde = conn.execute(text(f'SELECT min("timestamp") FROM {VIEJA}')).scalar()
+    particiones.asegurar_particiones(conn, desde=desde)
+
+    conn.execute(text(f"INSERT INTO messages ({lista}) SELECT {lista} FROM {VIEJA}"))
+    conn.execute(text(f"DROP TABLE {VIEJA}"))
+
+    # Índices particionados: cada partición tiene el suyo
+    for indice in Message.__table__.indexes:
+        indice.create(conn)
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING GIN (content_tsv)"
+    ))
@@ -0,0 +1,8 @@
+"""Tabla notificaciones_leidas: el estado de leída deja de vivir en memoria de
+cada proceso. Lo marcado antes de esta versión se pierde (estaba en RAM).
+"""
+from models.modelo import NotificacionLeida
+
+
+def upgrade(conn):
+    NotificacionLeida.__table__.create(conn, checkfirst=True)
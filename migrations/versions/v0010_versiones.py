@@ -0,0 +1,8 @@
+"""Tabla versiones: contadores de cambios para los ETag de /carer/all y
+/materia/{career_id}/all.
+"""
+from models.modelo import Version
+
+
+def upgrade(conn):
+    Version.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,17 @@
+"""Índices para el reporte de pagos pendientes: payments (user_id, affected_month)
+para que el NOT EXISTS sea una búsqueda exacta por estudiante, y
+usuarios.id_userdetail para llegar al usuario desde userdetails filtrado por
+tipo y carrera.
+"""
+from sqlalchemy import inspect
+
+from models.modelo import Payment, User
+
+
+def upgrade(conn):
+    insp = inspect(conn)
+    for tabla in (Payment.__table__, User.__table__):
+        existentes = {i["name"] for i in insp.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in existentes:
+                indice.create(conn)
@@ -0,0 +1,10 @@
+"""Tabla ingresos_mensuales (total y cantidad de pagos por carrera y mes),
+cargada desde los pagos existentes.
+"""
+from models import ingresos
+from models.modelo import IngresoMensual
+
+
+def upgrade(conn):
+    IngresoMensual.__table__.create(conn, checkfirst=True)
+    ingresos.reconstruir_en(conn)
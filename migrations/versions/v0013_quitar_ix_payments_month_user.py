@@ -0,0 +1,11 @@
+"""Quita ix_payments_month_user (affected_month, user_id), que creaba la v0002.
+
+El reporte de pendientes busca por estudiante y rango de meses con
+ix_payments_user_month (v0011); el otro solo encarecía cada alta de pagos,
+incluida la importación masiva.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("DROP INDEX IF EXISTS ix_payments_month_user"))
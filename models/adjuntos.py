@@ -0,0 +1,352 @@
+# Cola de subida de adjuntos. send_message deja el archivo en disco, guarda el
+# mensaje con file_status="pendiente" y responde; un pool acotado de hilos lo
+# sube al storage con reintentos y completa file_url cuando termina.
+# El mismo pool borra los adjuntos de mensajes eliminados (GC). Los adjuntos
+# se deduplican por sha256: el mismo archivo se sube una sola vez.
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import pubsub, storage
+from config.db import SessionLocal, get_engine
+from models.modelo import Attachment, Message
+
+_attachments = Attachment.__table__
+
+# Fuera de uploads/: lo que está en cola no se sirve por /uploads
+ADJUNTOS_PENDIENTES_DIR = os.getenv("ADJUNTOS_PENDIENTES_DIR", "uploads_pendientes")
+ADJUNTOS_WORKERS = int(os.getenv("ADJUNTOS_WORKERS", "4"))
+ADJUNTOS_REINTENTOS = int(os.getenv("ADJUNTOS_REINTENTOS", "5"))
+# Espera antes del reintento n: ADJUNTOS_ESPERA * 2**n segundos
+ADJUNTOS_ESPERA = float(os.getenv("ADJUNTOS_ESPERA", "1"))
+# Cada cuánto se barren los huérfanos de uploads/, y qué antigüedad mínima
+# tiene que tener un archivo para considerarlo huérfano
+ADJUNTOS_GC_INTERVALO = float(os.getenv("ADJUNTOS_GC_INTERVALO", "3600"))
+ADJUNTOS_GC_GRACIA = float(os.getenv("ADJUNTOS_GC_GRACIA", "3600"))
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=ADJUNTOS_WORKERS, thread_name_prefix="adjuntos")
+    return _pool
+
+
+def preparar(file):
+    """Copia el UploadFile a la carpeta de pendientes (bloqueante).
+
+    Devuelve (ruta, sha256 del contenido), calculado mientras se copia.
+    """
+    os.makedirs(ADJUNTOS_PENDIENTES_DIR, exist_ok=True)
+    ruta = os.path.join(ADJUNTOS_PENDIENTES_DIR, f"{uuid.uuid4().hex}.tmp")
+    file_hash = storage.copiar_a_disco(file.file, ruta)
+    return ruta, file_hash
+
+
+def asignar(ruta: str, msg_id: int, filename: str) -> str:
+    """Renombra el archivo preparado a <msg_id>__<nombre>, que es lo que lee el worker."""
+    destino = os.path.join(
+        ADJUNTOS_PENDIENTES_DIR, f"{msg_id}__{storage.nombre_seguro(filename)}"
+    )
+    os.replace(ruta, destino)
+    return destino
+
+
+def descartar(ruta):
+    if ruta and os.path.exists(ruta):
+        os.remove(ruta)
+
+
+def encolar(ruta: str):
+    _get_pool().submit(_procesar, ruta)
+
+
+# Deduplicación: un objeto del storage por contenido, con contador de
+# referencias en attachments. Ninguna de estas funciones hace commit.
+
+def _insert(session):
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(_attachments)
+    return postgresql.insert(_attachments)
+
+
+def reutilizar(session, file_hash: str):
+    """Si ya hay un objeto con ese contenido, suma una referencia y devuelve su URL."""
+    return session.execute(
+        update(_attachments)
+        .where(_attachments.c.hash == file_hash)
+        .values(ref_count=_attachments.c.ref_count + 1)
+        .returning(_attachments.c.file_url)
+    ).scalar()
+
+
+def _registrar(session, file_hash, url, size):
+    """Alta del objeto recién subido (o una referencia más si otro lo subió antes).
+
+    Devuelve la URL con la que quedó registrado ese contenido.
+    """
+    stmt = _insert(session).values(hash=file_hash, file_url=url, size=size, ref_count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_attachments.c.hash],
+        set_={"ref_count": _attachments.c.ref_count + 1},
+    ).returning(_attachments.c.file_url)
+    return session.execute(stmt).scalar()
+
+
+def liberar(session, adjuntos):
+    """Resta las referencias de los mensajes borrados.
+
+    `adjuntos` son pares (file_url, file_hash). Devuelve las URLs que ya nadie
+    usa, para pasarlas a borrar_en_segundo_plano() después del commit.
+    """
+    huerfanas = []
+    por_hash = Counter()
+    for file_url, file_hash in adjuntos:
+        if not file_url:
+            # todavía pendiente: la referencia la suma el worker, si el mensaje sigue
+            continue
+        if file_hash:
+            por_hash[file_hash] += 1
+        else:
+            # adjuntos anteriores a la deduplicación: uno por mensaje
+            huerfanas.append(file_url)
+
+    for file_hash, cantidad in por_hash.items():
+        fila = session.execute(
+            update(_attachments)
+            .where(_attachments.c.hash == file_hash)
+            .values(ref_count=_attachments.c.ref_count - cantidad)
+            .returning(_attachments.c.ref_count, _attachments.c.file_url)
+        ).first()
+        if fila is not None and fila.ref_count <= 0:
+            session.execute(delete(_attachments).where(_attachments.c.hash == file_hash))
+            huerfanas.append(fila.file_url)
+    return huerfanas
+
+
+# Dos envíos del mismo archivo casi al mismo tiempo (el profe que le manda el
+# PDF a todo el curso) no lo suben dos veces: el segundo espera y lo reutiliza
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _tomar_lock(file_hash):
+    with _locks_lock:
+        lock, usos = _locks.get(file_hash, (threading.Lock(), 0))
+        _locks[file_hash] = (lock, usos + 1)
+    lock.acquire()
+
+
+def _soltar_lock(file_hash):
+    with _locks_lock:
+        lock, usos = _locks[file_hash]
+        if usos == 1:
+            del _locks[file_hash]
+        else:
+            _locks[file_hash] = (lock, usos - 1)
+    lock.release()
+
+
+def _procesar(ruta):
+    msg_id, _, filename = os.path.basename(ruta).partition("__")
+    msg_id = int(msg_id)
+
+    estado = _estado_del_mensaje(msg_id)
+    if estado is None or estado.file_status != "pendiente":
+        # Se borró antes de que el worker lo tomara, o ya lo completó otra pasada
+        descartar(ruta)
+        return
+
+    file_hash = estado.file_hash
+    _tomar_lock(file_hash)
+    try:
+        size = os.path.getsize(ruta)
+        try:
+            # Primero se intenta reutilizar lo que ya está en el storage
+            if not _finalizar(msg_id, file_hash, None, size, subido=False):
+                url = _subir(msg_id, ruta, filename)
+                _finalizar(msg_id, file_hash, url, size, subido=True)
+        except Exception as e:
+            # El archivo queda en pendientes y se reintenta en el próximo arranque
+            print(f"❌ Error guardando el adjunto del mensaje {msg_id}: {e}")
+            return
+    finally:
+        _soltar_lock(file_hash)
+    descartar(ruta)
+
+
+def _subir(msg_id, ruta, filename):
+    """Sube el archivo con reintentos. Devuelve la URL, o None si no se pudo."""
+    for intento in range(ADJUNTOS_REINTENTOS):
+        try:
+            with open(ruta, "rb") as f:
+                return storage.guardar(filename, f)
+        except Exception as e:
+            print(f"❌ Error subiendo adjunto del mensaje {msg_id} (intento {intento + 1}): {e}")
+            if intento + 1 < ADJUNTOS_REINTENTOS:
+                time.sleep(ADJUNTOS_ESPERA * 2 ** intento)
+    return None
+
+
+def _estado_del_mensaje(msg_id):
+    session = SessionLocal(bind=get_engine())
+    try:
+        return session.execute(
+            select(Message.file_hash, Message.file_status).where(Message.id == msg_id)
+        ).first()
+    finally:
+        session.close()
+
+
+def _finalizar(msg_id, file_hash, url, size, subido):
+    """Completa el adjunto del mensaje. Devuelve False si hay que subirlo.
+
+    Bloquea la fila del mensaje y no hace nada si ya no está "pendiente": volver
+    a procesar el mismo archivo (un corte antes de descartarlo, dos workers en
+    reanudar_pendientes) no suma otra referencia ni pisa un "listo". Buscar el
+    contenido y sumarle la referencia es un solo UPDATE (reutilizar), que
+    bloquea la fila de attachments frente a un liberar() concurrente.
+    """
+    session = SessionLocal(bind=get_engine())
+    try:
+        msg = session.get(Message, msg_id, with_for_update=True)
+        if msg is None or msg.file_status != "pendiente":
+            # Se borró mientras subía, o lo completó otra pasada
+            if url:
+                storage.borrar(url)
+            return True
+        existente = reutilizar(session, file_hash)
+        if existente:
+            if url and url != existente:
+                storage.borrar(url)
+            url = existente
+        elif url:
+            registrada = _registrar(session, file_hash, url, size)
+            if registrada != url:
+                # Otro proceso lo registró recién: nos quedamos con ese
+                storage.borrar(url)
+                url = registrada
+        elif not subido:
+            session.rollback()
+            return False
+        msg.file_url = url
+        msg.file_status = "listo" if url else "error"
+        pubsub.publicar_al_commit(session, (msg.sender_id, msg.receiver_id), {
+            "tipo": "adjunto",
+            "id": msg.id,
+            "file_url": msg.file_url,
+            "file_status": msg.file_status,
+        })
+        session.commit()
+        return True
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def reanudar_pendientes():
+    """Vuelve a encolar lo que quedó sin subir (se llama en el startup de la app)."""
+    if not os.path.isdir(ADJUNTOS_PENDIENTES_DIR):
+        return
+    for nombre in os.listdir(ADJUNTOS_PENDIENTES_DIR):
+        ruta = os.path.join(ADJUNTOS_PENDIENTES_DIR, nombre)
+        if "__" in nombre and not nombre.endswith(".part"):
+            encolar(ruta)
+        else:
+            # copias a medias o de requests que nunca llegaron a hacer commit
+            descartar(ruta)
+
+
+def borrar_en_segundo_plano(urls):
+    """Borra del storage los adjuntos de mensajes ya eliminados (llamar después del commit)."""
+    urls = [u for u in urls if u]
+    if urls:
+        _get_pool().submit(borrar, urls)
+
+
+def borrar(urls):
+    """Borra del storage en este hilo (bloqueante), logueando los errores."""
+    for url in urls:
+        try:
+            storage.borrar(url)
+        except Exception as e:
+            # Si era local, el barrido de huérfanos lo vuelve a intentar
+            print(f"❌ Error borrando adjunto {url}: {e}")
+
+
+def barrer_huerfanos(directorio=storage.UPLOAD_DIR) -> int:
+    """Borra los archivos de uploads/ que ni un mensaje ni attachments referencian. Devuelve cuántos.
+
+    Sólo considera los nombres que genera LocalStorage.guardar: lo que se copió
+    a uploads/ a mano (o vino con el repo) no se toca.
+    """
+    if not os.path.isdir(directorio):
+        return 0
+    limite = time.time() - ADJUNTOS_GC_GRACIA
+    candidatos = set()
+    for entrada in os.scandir(directorio):
+        if not storage.NOMBRE_LOCAL.match(entrada.name):
+            continue
+        if entrada.is_file() and entrada.stat().st_mtime < limite:
+            candidatos.add(entrada.name)
+    if not candidatos:
+        return 0
+
+    session = SessionLocal(bind=get_engine())
+    try:
+        urls = session.execute(
+            select(Message.file_url)
+            .where(Message.file_url.like(f"%/{directorio}/%"))
+            .execution_options(yield_per=1000)
+        ).scalars()
+        for url in urls:
+            candidatos.discard(url.rsplit("/", 1)[-1])
+        # Un objeto registrado sigue vivo aunque sus mensajes ya no estén en
+        # messages (archivados): lo libera liberar(), no el barrido
+        urls = session.execute(
+            select(_attachments.c.file_url)
+            .where(_attachments.c.file_url.like(f"%/{directorio}/%"))
+            .execution_options(yield_per=1000)
+        ).scalars()
+        for url in urls:
+            candidatos.discard(url.rsplit("/", 1)[-1])
+    finally:
+        session.close()
+
+    for nombre in candidatos:
+        try:
+            os.remove(os.path.join(directorio, nombre))
+        except FileNotFoundError:
+            pass
+    if candidatos:
+        print(f"GC de adjuntos: {len(candidatos)} archivos huérfanos borrados")
+    return len(candidatos)
+
+
+async def gc_periodico():
+    """Tarea del lifespan: barre huérfanos cada ADJUNTOS_GC_INTERVALO segundos."""
+    while True:
+        await asyncio.sleep(ADJUNTOS_GC_INTERVALO)
+        try:
+            await run_in_threadpool(barrer_huerfanos)
+        except Exception as e:
+            print("Error en el GC de adjuntos:", e)
+
+
+def detener():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
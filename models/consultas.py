@@ -0,0 +1,66 @@
+# Consultas calientes como lambda statements. SQLAlchemy cachea la construcción
+# del statement y su SQL compilado por el código de la lambda; en cada llamada
+# solo liga los parámetros en lugar de rearmar y recompilar la consulta ORM.
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import joinedload
+
+from models.modelo import Carer, User, UserDetails
+
+
+def usuario_por_id(user_id: int):
+    return lambda_stmt(lambda: select(User).where(User.id == user_id))
+
+
+def usuario_con_detalle_por_id(user_id: int):
+    return lambda_stmt(
+        lambda: select(User)
+        .options(joinedload(User.userdetail))
+        .where(User.id == user_id)
+    )
+
+
+def usuario_con_detalle_por_username(username: str):
+    return lambda_stmt(
+        lambda: select(User)
+        .options(joinedload(User.userdetail))
+        .where(User.username == username)
+    )
+
+
+def id_por_username(username: str):
+    return lambda_stmt(
+        lambda: select(User.id).where(User.username == username).limit(1)
+    )
+
+
+def id_por_email(email: str):
+    return lambda_stmt(
+        lambda: select(UserDetails.id).where(UserDetails.email == email).limit(1)
+    )
+
+
+def id_por_dni(dni: int):
+    return lambda_stmt(
+        lambda: select(UserDetails.id).where(UserDetails.dni == dni).limit(1)
+    )
+
+
+def nombre_de_usuario(user_id: int):
+    """(firstName, lastName) de un usuario, sin cargar las entidades."""
+    return lambda_stmt(
+        lambda: select(UserDetails.firstName, UserDetails.lastName)
+        .join(User, User.id_userdetail == UserDetails.id)
+        .where(User.id == user_id)
+    )
+
+
+def carrera_por_id(carer_id: int):
+    return lambda_stmt(lambda: select(Carer).where(Carer.id == carer_id))
+
+
+def tipo_de_usuario(user_id: int):
+    return lambda_stmt(
+        lambda: select(UserDetails.type)
+        .join(User, User.id_userdetail == UserDetails.id)
+        .where(User.id == user_id)
+    )
@@ -0,0 +1,122 @@
+# Mantenimiento de la tabla conversations. Todas las funciones trabajan sobre la
+# sesión del request y no hacen commit: el resumen queda en la misma
+# transacción que el mensaje que lo cambia.
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.modelo import Conversation, Message
+
+_tabla = Conversation.__table__
+
+
+def par(user_id: int, otro_id: int):
+    """Clave de la conversación: (menor, mayor)."""
+    return (user_id, otro_id) if user_id <= otro_id else (otro_id, user_id)
+
+
+def _insert(session):
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(_tabla)
+    return postgresql.insert(_tabla)
+
+
+def _del_par(a: int, b: int):
+    return or_(
+        and_(Message.sender_id == a, Message.receiver_id == b),
+        and_(Message.sender_id == b, Message.receiver_id == a),
+    )
+
+
+def registrar_mensaje(session, msg: Message):
+    """Suma un mensaje nuevo (ya con id) al resumen. Upsert atómico."""
+    a, b = par(msg.sender_id, msg.receiver_id)
+    para_a = 1 if msg.receiver_id == a else 0
+    stmt = _insert(session).values(
+        user_a_id=a,
+        user_b_id=b,
+        last_message_id=msg.id,
+        last_timestamp=msg.timestamp,
+        unread_a=para_a,
+        unread_b=1 - para_a,
+        read_a_id=0,
+        read_b_id=0,
+    )
+    es_ultimo = stmt.excluded.last_message_id > func.coalesce(_tabla.c.last_message_id, 0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_tabla.c.user_a_id, _tabla.c.user_b_id],
+        set_={
+            "last_message_id": case(
+                (es_ultimo, stmt.excluded.last_message_id), else_=_tabla.c.last_message_id
+            ),
+            "last_timestamp": case(
+                (es_ultimo, stmt.excluded.last_timestamp), else_=_tabla.c.last_timestamp
+            ),
+            "unread_a": _tabla.c.unread_a + stmt.excluded.unread_a,
+            "unread_b": _tabla.c.unread_b + stmt.excluded.unread_b,
+        },
+    )
+    session.execute(stmt)
+
+
+def quitar_mensaje(session, msg: Message):
+    """Actualiza el resumen antes de borrar msg."""
+    a, b = par(msg.sender_id, msg.receiver_id)
+    conv = session.get(Conversation, (a, b), with_for_update=True)
+    if conv is None:
+        return
+
+    # Si el receptor todavía no lo había leído, baja su contador
+    if msg.receiver_id == a and msg.id > conv.read_a_id:
+        conv.unread_a = max(conv.unread_a - 1, 0)
+    elif msg.receiver_id == b and msg.id > conv.read_b_id:
+        conv.unread_b = max(conv.unread_b - 1, 0)
+
+    if conv.last_message_id == msg.id:
+        anterior = session.execute(
+            select(Message.id, Message.timestamp)
+            .where(_del_par(a, b), Message.id != msg.id)
+            .order_by(Message.id.desc())
+            .limit(1)
+        ).first()
+        if anterior is None:
+            session.delete(conv)
+            return
+        conv.last_message_id, conv.last_timestamp = anterior
+
+
+def borrar_conversacion(session, user_id: int, otro_id: int):
+    a, b = par(user_id, otro_id)
+    session.execute(
+        _tabla.delete().where(_tabla.c.user_a_id == a, _tabla.c.user_b_id == b)
+    )
+
+
+def marcar_leida(session, user_id: int, otro_id: int):
+    """Pone en cero los no leídos de user_id en el chat con otro_id."""
+    a, b = par(user_id, otro_id)
+    lado = "a" if user_id == a else "b"
+    session.execute(
+        update(_tabla)
+        .where(_tabla.c.user_a_id == a, _tabla.c.user_b_id == b)
+        .values({
+            f"unread_{lado}": 0,
+            f"read_{lado}_id": func.coalesce(_tabla.c.last_message_id, 0),
+        })
+    )
+
+
+def no_leidos(session, user_id: int) -> int:
+    total = session.execute(
+        select(
+            func.coalesce(
+                func.sum(
+                    case(
+                        (_tabla.c.user_a_id == user_id, _tabla.c.unread_a),
+                        else_=_tabla.c.unread_b,
+                    )
+                ),
+                0,
+            )
+        ).where(or_(_tabla.c.user_a_id == user_id, _tabla.c.user_b_id == user_id))
+    ).scalar()
+    return int(total)
@@ -0,0 +1,256 @@
+# Directorio de usuarios en memoria para la búsqueda de contactos y el
+# autocompletado (get_available_users, /users/available/{id}).
+#
+# Guarda id/nombre/tipo en arrays compactos ordenados por id y un índice de
+# n-gramas (2 y 3 letras) sobre el nombre normalizado. Una búsqueda recorre la
+# lista de posiciones del n-grama más raro del texto y confirma cada candidato
+# con `texto in nombre`, cortando apenas junta `limit` resultados.
+#
+# Se carga al arrancar, se actualiza con los commits que crean o modifican
+# usuarios en este proceso y se recarga entero cada DIRECTORIO_RECARGA segundos
+# (para ver lo que escribieron otros workers).
+import asyncio
+import bisect
+import os
+import threading
+import unicodedata
+from array import array
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from config.db import SessionLocal, get_engine
+from models.modelo import User, UserDetails
+
+DIRECTORIO_RECARGA = float(os.getenv("DIRECTORIO_RECARGA", "300"))
+
+_NGRAMAS = (2, 3)
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos: "José" y "jose" encuentran lo mismo."""
+    texto = texto or ""
+    if texto.isascii():
+        return texto.lower()
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def _ngramas(texto):
+    return {texto[i:i + n] for n in _NGRAMAS for i in range(len(texto) - n + 1)}
+
+
+def _nombre(first_name, last_name):
+    if first_name is None:
+        return "Usuario desconocido"
+    return f"{first_name} {last_name}"
+
+
+class _Indice:
+    def __init__(self):
+        self.ids = array("i")
+        self.tipos = array("b")
+        self.nombres = []
+        self.normalizados = []
+        self.codigos = {}
+        self.nombres_tipo = []
+        self.posiciones = {}
+        self.ngramas = {}
+
+    def _codigo(self, tipo):
+        if tipo not in self.codigos:
+            self.codigos[tipo] = len(self.nombres_tipo)
+            self.nombres_tipo.append(tipo)
+        return self.codigos[tipo]
+
+    def _indexar(self, pos, normalizado, ordenado=True):
+        ngramas = self.ngramas
+        if ordenado:
+            for ng in _ngramas(normalizado):
+                lista = ngramas.get(ng)
+                if lista is None:
+                    ngramas[ng] = array("i", (pos,))
+                else:
+                    lista.append(pos)
+            return
+        for ng in _ngramas(normalizado):
+            lista = ngramas.get(ng)
+            if lista is None:
+                lista = ngramas[ng] = array("i")
+            if not lista or lista[-1] < pos:
+                lista.append(pos)
+            else:
+                i = bisect.bisect_left(lista, pos)
+                if i == len(lista) or lista[i] != pos:
+                    lista.insert(i, pos)
+
+    def agregar(self, user_id, nombre, tipo):
+        """Agrega al final; devuelve False si user_id no es mayor que el último."""
+        if self.ids and user_id <= self.ids[-1]:
+            return False
+        normalizado = normalizar(nombre)
+        pos = len(self.ids)
+        self.nombres.append(nombre)
+        self.normalizados.append(normalizado)
+        self.tipos.append(self._codigo(tipo))
+        self.posiciones[user_id] = pos
+        self.ids.append(user_id)
+        self._indexar(pos, normalizado)
+        return True
+
+    def actualizar(self, pos, nombre, tipo):
+        normalizado = normalizar(nombre)
+        self.nombres[pos] = nombre
+        self.normalizados[pos] = normalizado
+        self.tipos[pos] = self._codigo(tipo)
+        # Los n-gramas viejos quedan: sobran candidatos, pero se descartan al verificar
+        self._indexar(pos, normalizado, ordenado=False)
+
+    def buscar(self, texto, tipos, excluir, limit, despues_de):
+        codigos = None
+        if tipos is not None:
+            codigos = {self.codigos[t] for t in tipos if t in self.codigos}
+        n = len(self.ids)
+        inicio = 0 if despues_de is None else bisect.bisect_right(self.ids, despues_de)
+
+        texto = normalizar(texto.strip())
+        candidatos = range(inicio, n)
+        if len(texto) >= _NGRAMAS[0]:
+            # la lista más corta entre los n-gramas más largos que entran en el texto
+            k = min(len(texto), _NGRAMAS[-1])
+            listas = [self.ngramas.get(texto[i:i + k], ()) for i in range(len(texto) - k + 1)]
+            candidatos = min(listas, key=len)
+            candidatos = candidatos[bisect.bisect_left(candidatos, inicio):]
+
+        resultado = []
+        for pos in candidatos:
+            if pos >= n:
+                break
+            if codigos is not None and self.tipos[pos] not in codigos:
+                continue
+            if self.ids[pos] == excluir:
+                continue
+            if texto and texto not in self.normalizados[pos]:
+                continue
+            resultado.append((self.ids[pos], self.nombres[pos], self.nombres_tipo[self.tipos[pos]]))
+            if len(resultado) >= limit:
+                break
+        return resultado
+
+
+class Directorio:
+    def __init__(self):
+        self._indice = _Indice()
+        self._lock = threading.Lock()
+        self.cargado = False
+
+    def cargar(self, filas):
+        """Reemplaza el contenido con [(id, firstName, lastName, type)]."""
+        nuevo = _Indice()
+        for user_id, first_name, last_name, tipo in sorted(filas, key=lambda f: f[0]):
+            nuevo.agregar(user_id, _nombre(first_name, last_name), tipo or "unknown")
+        with self._lock:
+            self._indice = nuevo
+            self.cargado = True
+
+    def poner(self, user_id, first_name, last_name, tipo):
+        """Alta o modificación de un usuario."""
+        nombre, tipo = _nombre(first_name, last_name), tipo or "unknown"
+        with self._lock:
+            indice = self._indice
+            pos = indice.posiciones.get(user_id)
+            if pos is not None:
+                indice.actualizar(pos, nombre, tipo)
+            elif not indice.agregar(user_id, nombre, tipo):
+                # Llegó un id menor que el último (commits fuera de orden): se rearma
+                filas = [
+                    (indice.ids[i], indice.nombres[i], indice.nombres_tipo[indice.tipos[i]])
+                    for i in range(len(indice.ids))
+                ] + [(user_id, nombre, tipo)]
+                nuevo = _Indice()
+                for fila in sorted(filas):
+                    nuevo.agregar(*fila)
+                self._indice = nuevo
+
+    def buscar(self, texto="", tipos=None, excluir=None, limit=20, despues_de=None):
+        """[(id, nombre, tipo)] en orden de id.
+
+        `tipos` limita a esos tipos de usuario, `excluir` saca un id (el propio)
+        y `despues_de` pagina desde el id siguiente.
+        """
+        return self._indice.buscar(texto, tipos, excluir, limit, despues_de)
+
+    def cargar_desde_db(self, session=None):
+        propia = session is None
+        session = session or SessionLocal(bind=get_engine())
+        try:
+            filas = session.execute(
+                select(User.id, UserDetails.firstName, UserDetails.lastName, UserDetails.type)
+                .outerjoin(UserDetails, UserDetails.id == User.id_userdetail)
+            ).all()
+        finally:
+            if propia:
+                session.close()
+        self.cargar(filas)
+
+    def asegurar_cargado(self, session):
+        """Carga con la sesión del request si todavía no se cargó nunca."""
+        if not self.cargado:
+            self.cargar_desde_db(session)
+
+
+directorio = Directorio()
+
+
+async def recargar_periodico():
+    """Tarea del lifespan: carga el directorio y lo recarga cada DIRECTORIO_RECARGA segundos."""
+    while True:
+        try:
+            await run_in_threadpool(directorio.cargar_desde_db)
+        except Exception as e:
+            print("Error cargando el directorio de usuarios:", e)
+        await asyncio.sleep(DIRECTORIO_RECARGA)
+
+
+# Las altas y cambios de nombre/tipo se aplican al directorio cuando la
+# transacción hace commit (mismo esquema que config/pubsub.py)
+_PENDIENTES = "directorio_pendientes"
+
+
+def _anotar(session, fila):
+    if session is not None:
+        session.info.setdefault(_PENDIENTES, []).append(fila)
+
+
+@event.listens_for(User, "after_insert")
+def _usuario_creado(mapper, connection, target):
+    detalle = target.userdetail
+    if detalle is None:
+        fila = (target.id, None, None, None)
+    else:
+        fila = (target.id, detalle.firstName, detalle.lastName, detalle.type)
+    _anotar(inspect(target).session, fila)
+
+
+@event.listens_for(UserDetails, "after_update")
+def _detalle_modificado(mapper, connection, target):
+    estado = inspect(target)
+    if not any(estado.attrs[c].history.has_changes() for c in ("firstName", "lastName", "type")):
+        return
+    user_ids = connection.execute(
+        select(User.id).where(User.id_userdetail == target.id)
+    ).scalars()
+    for user_id in user_ids:
+        _anotar(estado.session, (user_id, target.firstName, target.lastName, target.type))
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_pendientes(session):
+    for fila in session.info.pop(_PENDIENTES, []):
+        directorio.poner(*fila)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_pendientes(session, previous_transaction):
+    session.info.pop(_PENDIENTES, None)
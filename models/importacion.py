@@ -0,0 +1,173 @@
+# Importación masiva de pagos desde un CSV (POST /payment/import).
+#
+# leer_csv() valida el formato fila por fila sin tocar la base. importar()
+# valida usuarios y carreras con consultas por conjunto (IN de a _LOTE_IN ids),
+# carga las filas válidas con COPY si la conexión es psycopg2 o con un
+# executemany si no, actualiza ingresos_mensuales por (carrera, mes) y deja
+# todo en una sola transacción. Los errores se informan por número de línea.
+import csv
+import datetime
+import io
+import os
+from collections import defaultdict
+
+from sqlalchemy import insert, select
+
+from models import ingresos, notificaciones
+from models.modelo import Carer, Payment, User, UserDetails
+
+IMPORT_MAX_FILAS = int(os.getenv("IMPORT_MAX_FILAS", "200000"))
+# Máximo de errores que se devuelven en la respuesta (se cuentan todos)
+IMPORT_MAX_ERRORES = 1000
+
+COLUMNAS = ("user_id", "carer_id", "amount", "affected_month")
+
+_LOTE_IN = 5000
+
+
+class ImportacionInvalida(Exception):
+    """El archivo no se puede procesar (encabezado, codificación, tamaño)."""
+
+
+def _fecha(valor: str) -> datetime.datetime:
+    valor = valor.strip()
+    for formato in ("%Y-%m-%d", "%Y-%m"):
+        try:
+            return datetime.datetime.strptime(valor, formato)
+        except ValueError:
+            pass
+    raise ValueError(f"affected_month inválido: {valor!r} (YYYY-MM-DD o YYYY-MM)")
+
+
+def leer_csv(archivo):
+    """([(línea, user_id, carer_id, amount, affected_month)], [{"linea", "error"}])."""
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    try:
+        lector = csv.DictReader(texto)
+        faltantes = [c for c in COLUMNAS if c not in (lector.fieldnames or ())]
+        if faltantes:
+            raise ImportacionInvalida(f"Faltan columnas: {', '.join(faltantes)}")
+
+        filas, errores = [], []
+        for fila in lector:
+            linea = lector.line_num
+            if len(filas) + len(errores) >= IMPORT_MAX_FILAS:
+                raise ImportacionInvalida(f"El archivo supera las {IMPORT_MAX_FILAS} filas")
+            try:
+                filas.append((
+                    linea,
+                    int(fila["user_id"]),
+                    int(fila["carer_id"]),
+                    int(fila["amount"]),
+                    _fecha(fila["affected_month"] or ""),
+                ))
+            except (TypeError, ValueError) as e:
+                errores.append({"linea": linea, "error": str(e)})
+        return filas, errores
+    except UnicodeDecodeError:
+        raise ImportacionInvalida("El archivo no está en UTF-8")
+    except csv.Error as e:
+        # campo de más de csv.field_size_limit(), NUL en el archivo, comillas rotas
+        raise ImportacionInvalida(f"CSV inválido (línea {lector.line_num}): {e}")
+    finally:
+        texto.detach()
+
+
+def _existentes(session, stmt_base, columna, ids):
+    ids = list(ids)
+    encontrados = set()
+    for i in range(0, len(ids), _LOTE_IN):
+        encontrados.update(
+            session.execute(stmt_base.where(columna.in_(ids[i:i + _LOTE_IN]))).scalars()
+        )
+    return encontrados
+
+
+def _copy(session, filas, creado):
+    """COPY FROM STDIN sobre la conexión de la sesión (misma transacción).
+    Devuelve False si el driver no es psycopg2."""
+    dbapi = session.connection().connection.dbapi_connection
+    cursor = dbapi.cursor()
+    try:
+        if not hasattr(cursor, "copy_expert"):
+            return False
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for _, user_id, carer_id, amount, mes in filas:
+            escritor.writerow((carer_id, user_id, amount, mes.isoformat(sep=" "), creado.isoformat(sep=" ")))
+        buffer.seek(0)
+        cursor.copy_expert(
+            "COPY payments (carer_id, user_id, amount, affected_month, created_at) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        return True
+    finally:
+        cursor.close()
+
+
+def importar(session, filas, errores, todo_o_nada=False):
+    """Valida contra la base e inserta las filas válidas. Hace commit.
+
+    Devuelve {"insertados", "metodo", "cantidad_errores", "errores"}; con
+    `todo_o_nada` y algún error no inserta nada.
+    """
+    usuarios = _existentes(
+        session,
+        select(User.id).join(UserDetails, UserDetails.id == User.id_userdetail),
+        User.id,
+        {f[1] for f in filas},
+    )
+    carreras = _existentes(session, select(Carer.id), Carer.id, {f[2] for f in filas})
+
+    validas = []
+    for fila in filas:
+        linea, user_id, carer_id = fila[0], fila[1], fila[2]
+        if user_id not in usuarios:
+            errores.append({"linea": linea, "error": f"Usuario no encontrado: {user_id}"})
+        elif carer_id not in carreras:
+            errores.append({"linea": linea, "error": f"Carrera no encontrada: {carer_id}"})
+        else:
+            validas.append(fila)
+    errores.sort(key=lambda e: e["linea"])
+
+    resultado = {
+        "insertados": 0,
+        "metodo": None,
+        "cantidad_errores": len(errores),
+        "errores": errores[:IMPORT_MAX_ERRORES],
+    }
+    if not validas or (todo_o_nada and errores):
+        return resultado
+
+    creado = datetime.datetime.now()
+    if session.get_bind().dialect.name == "postgresql" and _copy(session, validas, creado):
+        resultado["metodo"] = "copy"
+    else:
+        session.execute(
+            insert(Payment.__table__),
+            [
+                {
+                    "carer_id": carer_id,
+                    "user_id": user_id,
+                    "amount": amount,
+                    "affected_month": mes,
+                    "created_at": creado,
+                }
+                for _, user_id, carer_id, amount, mes in validas
+            ],
+        )
+        resultado["metodo"] = "executemany"
+
+    por_mes = defaultdict(lambda: [0, 0])
+    for _, _, carer_id, amount, mes in validas:
+        acumulado = por_mes[(carer_id, ingresos.mes_de(mes))]
+        acumulado[0] += amount
+        acumulado[1] += 1
+    for (carer_id, mes), (total, cantidad) in por_mes.items():
+        ingresos.sumar(session, carer_id, mes, total, cantidad=cantidad)
+
+    notificaciones.invalidar_al_commit(session, {f[1] for f in validas})
+    session.commit()
+    resultado["insertados"] = len(validas)
+    return resultado
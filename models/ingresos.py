@@ -0,0 +1,87 @@
+# Resumen de ingresos por carrera y mes (tabla ingresos_mensuales).
+#
+# create_payment, actualizar_pago y eliminar_pago llaman a sumar/restar en la
+# misma transacción que el pago: el upsert suma sobre la fila existente, así
+# dos pagos concurrentes del mismo mes no se pisan. reconstruir() lo recalcula
+# entero desde payments (`python -m migrations ingresos`).
+import datetime
+
+from sqlalchemy import delete, extract, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config.db import get_engine
+from models.modelo import IngresoMensual, Payment
+
+_tabla = IngresoMensual.__table__
+
+
+def _insert(session):
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(_tabla)
+    return postgresql.insert(_tabla)
+
+
+def mes_de(fecha) -> datetime.datetime:
+    return datetime.datetime(fecha.year, fecha.month, 1)
+
+
+def sumar(session, carer_id: int, affected_month, amount: int, cantidad: int = 1):
+    """Suma un pago (o lo resta con cantidad=-1 y amount negativo). No hace commit."""
+    mes = mes_de(affected_month)
+    stmt = _insert(session).values(carer_id=carer_id, mes=mes, total=amount, cantidad=cantidad)
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[_tabla.c.carer_id, _tabla.c.mes],
+            set_={
+                "total": _tabla.c.total + stmt.excluded.total,
+                "cantidad": _tabla.c.cantidad + stmt.excluded.cantidad,
+            },
+        )
+    )
+    if cantidad < 0:
+        session.execute(
+            delete(_tabla).where(
+                _tabla.c.carer_id == carer_id, _tabla.c.mes == mes, _tabla.c.cantidad <= 0
+            )
+        )
+
+
+def restar(session, carer_id: int, affected_month, amount: int):
+    sumar(session, carer_id, affected_month, -amount, cantidad=-1)
+
+
+def _filas_desde_pagos(conn):
+    anio = extract("year", Payment.affected_month)
+    mes = extract("month", Payment.affected_month)
+    filas = conn.execute(
+        select(Payment.carer_id, anio, mes, func.sum(Payment.amount), func.count())
+        .group_by(Payment.carer_id, anio, mes)
+    ).all()
+    return [
+        {
+            "carer_id": carer_id,
+            "mes": datetime.datetime(int(a), int(m), 1),
+            "total": total or 0,
+            "cantidad": cantidad,
+        }
+        for carer_id, a, m, total, cantidad in filas
+    ]
+
+
+def reconstruir_en(conn):
+    """Recalcula la tabla desde payments sobre una conexión con transacción abierta."""
+    if conn.dialect.name == "postgresql":
+        # Frena altas/bajas de pagos mientras se recalcula; las lecturas siguen
+        conn.execute(text("LOCK TABLE payments IN SHARE MODE"))
+    filas = _filas_desde_pagos(conn)
+    conn.execute(delete(_tabla))
+    if filas:
+        conn.execute(_tabla.insert(), filas)
+    return len(filas)
+
+
+def reconstruir(engine=None):
+    with (engine or get_engine()).begin() as conn:
+        cantidad = reconstruir_en(conn)
+    print(f"ingresos_mensuales reconstruida: {cantidad} filas")
+    return cantidad
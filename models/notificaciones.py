@@ -0,0 +1,355 @@
+# Notificaciones de la campanita (get_notifications) y su estado de leídas.
+#
+# Todo sale de una sola consulta: el último mensaje recibido y el último pago
+# como subconsultas LIMIT 1 unidas con LEFT JOIN ON true, las cantidades de
+# notas y asignaciones como count(), y para cada notificación un EXISTS contra
+# notificaciones_leidas. Un poll es un solo viaje a la base.
+#
+# Cada notificación se identifica con "<tipo>:<versión>" (ver NotificacionLeida):
+# marcar "Se han cargado 3 nota(s)" como leída no oculta la de 4 notas.
+#
+# El resultado se cachea por usuario (LRU, como el de tokens en auth/security.py).
+# Las rutas que cambian algo que se ve acá (mensajes, notas, asignaciones, pagos,
+# leídas) llaman a invalidar_al_commit; el TTL solo acota cuánto tarda en verse
+# lo que escribió otro worker. Lo que entra al cache se lee siempre del
+# primario: una réplica atrasada no puede volver a llenarlo con datos viejos
+# después de una invalidación.
+import datetime
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import String, cast, event, func, inspect, literal, literal_column, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from config.db import SessionLocal, engine_primario
+from config.etag import etag
+from models import particiones
+from models.modelo import (
+    Message,
+    NotificacionLeida,
+    Payment,
+    User,
+    UserDetails,
+    alumno_materia,
+    profesor_materia,
+)
+
+NOTIFICACIONES_CACHE_MAX = int(os.getenv("NOTIFICACIONES_CACHE_MAX", "10000"))
+NOTIFICACIONES_CACHE_TTL = float(os.getenv("NOTIFICACIONES_CACHE_TTL", "60"))
+
+_tabla = NotificacionLeida.__table__
+
+
+def _insert(session):
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(_tabla)
+    return postgresql.insert(_tabla)
+
+
+def _clave(tipo: str, version):
+    return literal(f"{tipo}:", String) + cast(version, String)
+
+
+def _consulta(user_id: int, user_type: str):
+    def leida(tipo, version):
+        return (
+            select(_tabla.c.user_id)
+            .where(_tabla.c.user_id == user_id, _tabla.c.clave == _clave(tipo, version))
+            .exists()
+            .label(f"{tipo}_leida")
+        )
+
+    ultimo_mensaje = (
+        select(
+            Message.id,
+            Message.content,
+            Message.timestamp,
+            UserDetails.firstName,
+            UserDetails.lastName,
+        )
+        .outerjoin(User, User.id == Message.sender_id)
+        .outerjoin(UserDetails, UserDetails.id == User.id_userdetail)
+        .where(Message.receiver_id == user_id)
+    )
+    desde = particiones.desde_reciente()
+    if desde is not None:
+        ultimo_mensaje = ultimo_mensaje.where(Message.timestamp >= desde)
+    ultimo_mensaje = (
+        ultimo_mensaje.order_by(Message.timestamp.desc()).limit(1).subquery("ultimo_mensaje")
+    )
+
+    # Fila base: siempre hay exactamente una, con las cantidades
+    conteos = []
+    if user_type == "profesor":
+        conteos.append(
+            select(func.count())
+            .select_from(profesor_materia)
+            .where(profesor_materia.c.user_id == user_id)
+            .scalar_subquery()
+            .label("asignaciones")
+        )
+    if user_type == "estudiante":
+        conteos.append(
+            select(func.count())
+            .select_from(alumno_materia)
+            .where(alumno_materia.c.user_id == user_id, alumno_materia.c.nota != None)
+            .scalar_subquery()
+            .label("notas")
+        )
+    base = select(literal_column("1").label("uno"), *conteos).subquery("base")
+
+    columnas = [
+        ultimo_mensaje.c.id.label("mensaje_id"),
+        ultimo_mensaje.c.content,
+        ultimo_mensaje.c.timestamp,
+        ultimo_mensaje.c.firstName,
+        ultimo_mensaje.c.lastName,
+        leida("mensaje", ultimo_mensaje.c.id),
+    ]
+    desde_tablas = base.outerjoin(ultimo_mensaje, true())
+
+    if user_type == "profesor":
+        columnas += [base.c.asignaciones, leida("asignacion", base.c.asignaciones)]
+
+    if user_type == "estudiante":
+        ultimo_pago = (
+            select(Payment.id, Payment.amount, Payment.affected_month, Payment.created_at)
+            .where(Payment.user_id == user_id)
+            .order_by(Payment.created_at.desc())
+            .limit(1)
+            .subquery("ultimo_pago")
+        )
+        desde_tablas = desde_tablas.outerjoin(ultimo_pago, true())
+        columnas += [
+            base.c.notas,
+            leida("nota", base.c.notas),
+            ultimo_pago.c.id.label("pago_id"),
+            ultimo_pago.c.amount,
+            ultimo_pago.c.affected_month,
+            ultimo_pago.c.created_at,
+            leida("pago", ultimo_pago.c.id),
+        ]
+
+    return select(*columnas).select_from(desde_tablas)
+
+
+def calcular(session, user_id: int, user_type: str):
+    """Notificaciones del usuario como [{tipo, texto, fecha, clave, leida}]."""
+    fila = session.execute(_consulta(user_id, user_type)).one()._mapping
+    notifs = []
+
+    if fila["mensaje_id"] is not None:
+        if fila["firstName"] is None:
+            nombre = "Usuario desconocido"
+        else:
+            nombre = f"{fila['firstName']} {fila['lastName']}"
+        notifs.append(
+            {
+                "tipo": "mensaje",
+                "texto": f"Mensaje de {nombre}: {fila['content'][:40]}...",
+                "fecha": fila["timestamp"],
+                "clave": f"mensaje:{fila['mensaje_id']}",
+                "leida": fila["mensaje_leida"],
+            }
+        )
+
+    if fila.get("asignaciones"):
+        notifs.append(
+            {
+                "tipo": "asignacion",
+                "texto": f"Se te ha asignado a {fila['asignaciones']} materia(s).",
+                "fecha": datetime.datetime.now(),
+                "clave": f"asignacion:{fila['asignaciones']}",
+                "leida": fila["asignacion_leida"],
+            }
+        )
+
+    if fila.get("notas"):
+        notifs.append(
+            {
+                "tipo": "nota",
+                "texto": f"Se han cargado {fila['notas']} nota(s).",
+                "fecha": datetime.datetime.now(),
+                "clave": f"nota:{fila['notas']}",
+                "leida": fila["nota_leida"],
+            }
+        )
+
+    if fila.get("pago_id") is not None:
+        notifs.append(
+            {
+                "tipo": "pago",
+                "texto": f"Se registró un pago de ${fila['amount']} para {fila['affected_month'].strftime('%B %Y')}.",
+                "fecha": fila["created_at"],
+                "clave": f"pago:{fila['pago_id']}",
+                "leida": fila["pago_leida"],
+            }
+        )
+
+    return notifs
+
+
+def version(notifs) -> str:
+    """ETag de una lista de notificaciones: la clave ya cambia con su contenido;
+    el texto suma el nombre del remitente. La fecha de notas/asignaciones no cuenta."""
+    contenido = "\n".join(f"{n['clave']}\t{n['texto']}" for n in notifs)
+    return etag("notificaciones", hashlib.sha1(contenido.encode()).hexdigest()[:16])
+
+
+def marcar_leidas(session, user_id: int, claves):
+    """Guarda las claves como leídas. Idempotente; no hace commit."""
+    claves = set(claves)
+    if not claves:
+        return
+    stmt = _insert(session).values(
+        [
+            {"user_id": user_id, "clave": clave, "created_at": datetime.datetime.utcnow()}
+            for clave in claves
+        ]
+    )
+    session.execute(stmt.on_conflict_do_nothing(index_elements=[_tabla.c.user_id, _tabla.c.clave]))
+
+
+class _Cache:
+    """user_id -> (user_type, notificaciones, vence).
+
+    Cada invalidación sube la generación de esos usuarios (o la global, si es
+    de todos); un cálculo que empezó antes no se guarda, así una lectura lenta
+    no pisa lo que invalidó un commit que terminó mientras tanto. Que sea por
+    usuario hace que escribir para uno no descarte los cálculos de los demás.
+    """
+
+    def __init__(self, maximo, ttl):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.generacion = 0
+        self._generaciones = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.descartados = 0
+
+    def generacion_de(self, user_id):
+        with self._lock:
+            return (self.generacion, self._generaciones.get(user_id, 0))
+
+    def get(self, user_id, user_type):
+        with self._lock:
+            entrada = self._datos.get(user_id)
+            if entrada is None or entrada[0] != user_type or entrada[2] <= time.monotonic():
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(user_id)
+            self.aciertos += 1
+            return entrada[1]
+
+    def put(self, user_id, user_type, notifs, generacion):
+        with self._lock:
+            if generacion != (self.generacion, self._generaciones.get(user_id, 0)):
+                self.descartados += 1
+                return
+            self._datos[user_id] = (user_type, notifs, time.monotonic() + self.ttl)
+            self._datos.move_to_end(user_id)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, user_ids=None):
+        with self._lock:
+            self.invalidaciones += 1
+            if user_ids is None:
+                self.generacion += 1
+                self._datos.clear()
+                return
+            for user_id in user_ids:
+                self._generaciones[user_id] = self._generaciones.get(user_id, 0) + 1
+                self._datos.pop(user_id, None)
+            if len(self._generaciones) > self.maximo:
+                # Para acotar el dict: se vuelve a la generación global, que
+                # descarta (una vez) los cálculos en curso de todos
+                self._generaciones.clear()
+                self.generacion += 1
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else None,
+                "invalidaciones": self.invalidaciones,
+                "descartados": self.descartados,
+            }
+
+
+cache = _Cache(NOTIFICACIONES_CACHE_MAX, NOTIFICACIONES_CACHE_TTL)
+
+
+def obtener(session, user_id: int, user_type: str):
+    """Como calcular(), pero desde el cache si está. No modificar el resultado.
+
+    Si la sesión es de una réplica, el cálculo que llena el cache se hace
+    en una sesión aparte contra el primario.
+    """
+    notifs = cache.get(user_id, user_type)
+    if notifs is None:
+        generacion = cache.generacion_de(user_id)
+        primario = engine_primario(session.get_bind())
+        if session.get_bind() is primario:
+            notifs = calcular(session, user_id, user_type)
+        else:
+            with SessionLocal(bind=primario) as sesion_primaria:
+                notifs = calcular(sesion_primaria, user_id, user_type)
+        cache.put(user_id, user_type, notifs, generacion)
+    return notifs
+
+
+def estadisticas():
+    return cache.estadisticas()
+
+
+# Invalidación al commit (mismo esquema que config/pubsub.py): si la transacción
+# se revierte no se toca el cache
+_PENDIENTES = "notificaciones_invalidar"
+_TODOS = object()
+
+
+def invalidar_al_commit(session, user_ids=None):
+    """Invalida el cache de esos usuarios (None = de todos) cuando la sesión haga commit."""
+    pendientes = session.info.setdefault(_PENDIENTES, set())
+    if user_ids is None:
+        pendientes.add(_TODOS)
+    else:
+        pendientes.update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_invalidaciones(session):
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+    if _TODOS in pendientes:
+        cache.invalidar()
+    else:
+        cache.invalidar(pendientes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_invalidaciones(session, previous_transaction):
+    session.info.pop(_PENDIENTES, None)
+
+
+# Los textos de mensaje llevan el nombre del remitente
+@event.listens_for(UserDetails, "after_update")
+def _nombre_modificado(mapper, connection, target):
+    estado = inspect(target)
+    if estado.session is None:
+        return
+    if any(estado.attrs[c].history.has_changes() for c in ("firstName", "lastName")):
+        invalidar_al_commit(estado.session)
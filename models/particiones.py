@@ -0,0 +1,168 @@
+# Particionado mensual de messages por timestamp (solo PostgreSQL, ver la
+# migración v0008). Cada mes es una tabla messages_pAAAA_MM; las que ya pasaron
+# MENSAJES_MESES_ARCHIVO se pueden volcar a un .csv.gz y desenganchar.
+#
+# Las rutas de mensajes leen por defecto los últimos MENSAJES_MESES_RECIENTES
+# meses: con el filtro por timestamp PostgreSQL solo recorre esas particiones.
+import asyncio
+import datetime
+import gzip
+import os
+import re
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from config.db import get_engine
+from models import adjuntos
+
+MENSAJES_MESES_RECIENTES = int(os.getenv("MENSAJES_MESES_RECIENTES", "6"))
+# Particiones que se crean por adelantado (además del mes actual)
+PARTICIONES_ADELANTE = int(os.getenv("PARTICIONES_ADELANTE", "3"))
+MENSAJES_ARCHIVO_DIR = os.getenv("MENSAJES_ARCHIVO_DIR", "archivo")
+
+_NOMBRE = re.compile(r"^messages_p(\d{4})_(\d{2})$")
+
+
+def inicio_de_mes(fecha: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(fecha: datetime.datetime, meses: int) -> datetime.datetime:
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    return datetime.datetime(total // 12, total % 12 + 1, 1)
+
+
+def desde_reciente(meses: int = MENSAJES_MESES_RECIENTES):
+    """Primer instante de la ventana de `meses` meses (más el actual). 0 = sin límite."""
+    if meses <= 0:
+        return None
+    return sumar_meses(inicio_de_mes(datetime.datetime.utcnow()), -meses)
+
+
+def nombre_particion(mes: datetime.datetime) -> str:
+    return f"messages_p{mes:%Y_%m}"
+
+
+def es_particionada(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages')"
+    )).scalar())
+
+
+def particiones(conn):
+    """[(nombre, primer día del mes)] de las particiones mensuales, de la más vieja a la más nueva."""
+    nombres = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('messages')"
+    )).scalars()
+    encontradas = []
+    for nombre in nombres:
+        m = _NOMBRE.match(nombre)
+        if m:
+            encontradas.append((nombre, datetime.datetime(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(encontradas, key=lambda p: p[1])
+
+
+def asegurar_particiones(conn, desde=None, adelante=PARTICIONES_ADELANTE):
+    """Crea las particiones mensuales que falten desde `desde` hasta `adelante` meses después del actual."""
+    if not es_particionada(conn):
+        return
+    hasta = sumar_meses(inicio_de_mes(datetime.datetime.utcnow()), adelante)
+    mes = inicio_de_mes(desde) if desde else inicio_de_mes(datetime.datetime.utcnow())
+    while mes <= hasta:
+        siguiente = sumar_meses(mes, 1)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {nombre_particion(mes)} PARTITION OF messages "
+            f"FOR VALUES FROM ('{mes:%Y-%m-%d}') TO ('{siguiente:%Y-%m-%d}')"
+        ))
+        mes = siguiente
+
+
+def _ajustar_conversaciones(conn, nombre):
+    """Rehace el resumen de los chats con mensajes en la partición `nombre`, ya
+    desenganchada: último mensaje y no leídos salen de lo que queda en messages,
+    y los chats que se quedaron sin mensajes se borran."""
+    conn.execute(text(
+        "CREATE TEMP TABLE archivo_pares ON COMMIT DROP AS "
+        "SELECT DISTINCT LEAST(sender_id, receiver_id) AS a, "
+        "GREATEST(sender_id, receiver_id) AS b "
+        f"FROM {nombre}"
+    ))
+    del_par = (
+        "((m.sender_id = p.a AND m.receiver_id = p.b) "
+        "OR (m.sender_id = p.b AND m.receiver_id = p.a))"
+    )
+    conn.execute(text(
+        "DELETE FROM conversations c USING archivo_pares p "
+        "WHERE c.user_a_id = p.a AND c.user_b_id = p.b "
+        f"AND NOT EXISTS (SELECT 1 FROM messages m WHERE {del_par})"
+    ))
+    conn.execute(text(
+        "UPDATE conversations c SET "
+        "last_message_id = u.id, last_timestamp = u.timestamp, "
+        "unread_a = (SELECT count(*) FROM messages m WHERE m.sender_id = c.user_b_id "
+        "AND m.receiver_id = c.user_a_id AND m.id > c.read_a_id), "
+        "unread_b = (SELECT count(*) FROM messages m WHERE m.sender_id = c.user_a_id "
+        "AND m.receiver_id = c.user_b_id AND m.id > c.read_b_id) "
+        "FROM archivo_pares p, LATERAL ("
+        f"SELECT m.id, m.timestamp FROM messages m WHERE {del_par} "
+        "ORDER BY m.id DESC LIMIT 1) u "
+        "WHERE c.user_a_id = p.a AND c.user_b_id = p.b"
+    ))
+
+
+def archivar(meses: int, directorio=MENSAJES_ARCHIVO_DIR, borrar=True, engine=None):
+    """Vuelca a directorio/<particion>.csv.gz las particiones más viejas que `meses`
+    meses, las desengancha de messages y (si `borrar`) las elimina.
+
+    En la misma transacción se rehacen los chats afectados (ver
+    _ajustar_conversaciones) y se liberan las referencias a adjuntos de los
+    mensajes archivados; lo que ya nadie usa se borra del storage al final
+    (el .csv.gz conserva las URLs, no los archivos).
+    """
+    engine = engine or get_engine()
+    limite = sumar_meses(inicio_de_mes(datetime.datetime.utcnow()), -meses)
+    with engine.connect() as conn:
+        viejas = [nombre for nombre, mes in particiones(conn) if mes < limite]
+
+    os.makedirs(directorio, exist_ok=True)
+    archivadas = []
+    for nombre in viejas:
+        destino = os.path.join(directorio, f"{nombre}.csv.gz")
+        with engine.begin() as conn:
+            cur = conn.connection.dbapi_connection.cursor()
+            try:
+                with gzip.open(destino + ".part", "wb") as gz:
+                    cur.copy_expert(f"COPY {nombre} TO STDOUT WITH (FORMAT csv, HEADER)", gz)
+            finally:
+                cur.close()
+            os.replace(destino + ".part", destino)
+            conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {nombre}"))
+            _ajustar_conversaciones(conn, nombre)
+            huerfanas = adjuntos.liberar(conn, conn.execute(text(
+                f"SELECT file_url, file_hash FROM {nombre} WHERE file_url IS NOT NULL"
+            )).all())
+            if borrar:
+                conn.execute(text(f"DROP TABLE {nombre}"))
+        adjuntos.borrar(huerfanas)
+        print(f"Partición {nombre} archivada en {destino}")
+        archivadas.append(nombre)
+    return archivadas
+
+
+def mantener():
+    with get_engine().begin() as conn:
+        asegurar_particiones(conn)
+
+
+async def mantener_periodico():
+    """Tarea del lifespan: crea las particiones de los próximos meses una vez por día."""
+    while True:
+        try:
+            await run_in_threadpool(mantener)
+        except Exception as e:
+            print("Error creando particiones de messages:", e)
+        await asyncio.sleep(24 * 3600)
@@ -0,0 +1,31 @@
+# Contadores de cambios por recurso (tabla versiones). Las rutas que modifican
+# un recurso llaman a incrementar() antes del commit; las que lo listan leen la
+# versión con una búsqueda por PK y la usan como ETag (ver config/etag.py).
+# Al vivir en la base, todos los workers ven la misma versión.
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.modelo import Version
+
+_tabla = Version.__table__
+
+
+def _insert(session):
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(_tabla)
+    return postgresql.insert(_tabla)
+
+
+def incrementar(session, *claves):
+    """Suma 1 a cada clave. No hace commit."""
+    for clave in claves:
+        stmt = _insert(session).values(clave=clave, valor=1)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[_tabla.c.clave], set_={"valor": _tabla.c.valor + 1}
+            )
+        )
+
+
+def leer(session, clave) -> int:
+    return session.execute(select(_tabla.c.valor).where(_tabla.c.clave == clave)).scalar() or 0
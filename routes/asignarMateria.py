@@ -1,11 +1,13 @@
-from fastapi import APIRouter
-from models.modelo import Materia, InputAsignarMateria, session, User, UserDetails, profesor_materia
-from sqlalchemy.orm import joinedload
+from fastapi import APIRouter, Depends
+from config.db import get_db
+from models import notificaciones
+from models.modelo import Materia, InputAsignarMateria, User, UserDetails, profesor_materia
+from sqlalchemy.orm import Session, joinedload
 
 asignar = APIRouter()
 
 @asignar.post("/users/asignar-materia")
-def asignar_materia(data: InputAsignarMateria):
+def asignar_materia(data: InputAsignarMateria, session: Session = Depends(get_db)):
     try:
         usuario = session.query(User).filter(User.id == data.user_id).first()
         materia = session.query(Materia).filter(Materia.id == data.materia_id).first()
@@ -23,6 +25,7 @@ def asignar_materia(data: InputAsignarMateria):
         else:
             return {"status": "error", "message": "Tipo de relación no válido para este usuario"}
         
+        notificaciones.invalidar_al_commit(session, (usuario.id,))
         session.commit()
         return {"status": "success", "message": "Materia asignada correctamente"}
         
@@ -32,7 +35,7 @@ def asignar_materia(data: InputAsignarMateria):
 
 
 @asignar.get("/users/{user_id}/materias")
-def obtener_materias_usuario(user_id: int):
+def obtener_materias_usuario(user_id: int, session: Session = Depends(get_db)):
     try:
         usuario = session.query(User).filter(User.id == user_id).first()
         
@@ -57,7 +60,7 @@ def obtener_materias_usuario(user_id: int):
 
 
 @asignar.get("/materia/{materia_id}/estudiantes")
-def obtener_estudiantes_por_materia(materia_id: int):
+def obtener_estudiantes_por_materia(materia_id: int, session: Session = Depends(get_db)):
     try:
         # Buscar materia
         materia = session.query(Materia).filter(Materia.id == materia_id).first()
@@ -82,7 +85,7 @@ def obtener_estudiantes_por_materia(materia_id: int):
 
 
 @asignar.get("/users/{user_id}/profesor")
-def obtener_materias_con_profesor(user_id: int):
+def obtener_materias_con_profesor(user_id: int, session: Session = Depends(get_db)):
     try:
         usuario = session.query(User).options(joinedload(User.userdetail)).filter(User.id == user_id).first()
 
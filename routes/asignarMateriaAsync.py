@@ -0,0 +1,37 @@
+# Variante async de routes/asignarMateria.py (se monta con DB_ASYNC=true, ver app.py).
+# La lógica se reutiliza vía AsyncSession.run_sync, con el I/O sobre asyncpg.
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import get_async_db
+from models.modelo import InputAsignarMateria
+import routes.asignarMateria as asignar_sync
+
+asignar = APIRouter()
+
+
+@asignar.post("/users/asignar-materia")
+async def asignar_materia(data: InputAsignarMateria, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: asignar_sync.asignar_materia(data, session=s)
+    )
+
+
+@asignar.get("/users/{user_id}/materias")
+async def obtener_materias_usuario(user_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: asignar_sync.obtener_materias_usuario(user_id, session=s)
+    )
+
+
+@asignar.get("/materia/{materia_id}/estudiantes")
+async def obtener_estudiantes_por_materia(materia_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: asignar_sync.obtener_estudiantes_por_materia(materia_id, session=s)
+    )
+
+
+@asignar.get("/users/{user_id}/profesor")
+async def obtener_materias_con_profesor(user_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: asignar_sync.obtener_materias_con_profesor(user_id, session=s)
+    )
@@ -1,19 +1,28 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi.responses import JSONResponse
-from models.modelo import Carer, InputCarer, session, Materia
+from sqlalchemy.orm import Session
+from config.db import get_db
+from config.etag import coincide, etag, marcar, no_modificado
+from models import versiones
+from models.modelo import Carer, InputCarer, Materia
 
 carer = APIRouter()
 
 @carer.get("/carer/all")
-def get_carers():
+def get_carers(request: Request, response: Response, session: Session = Depends(get_db)):
+    version = etag("carreras", versiones.leer(session, "carreras"))
+    if coincide(request, version):
+        return no_modificado(version)
+    marcar(response, version)
     return session.query(Carer).all()
 
 
 @carer.post("/carer/new")
-def new_carer(ca: InputCarer):
+def new_carer(ca: InputCarer, session: Session = Depends(get_db)):
     try:
         newCarer = Carer(ca.name)
         session.add(newCarer)
+        versiones.incrementar(session, "carreras")
         session.commit()
         res = "carrera "+ca.name +" guardada correctamente"
         print(res)
@@ -27,27 +36,29 @@ def new_carer(ca: InputCarer):
 
 
 @carer.put("/career/{career_id}/edit")
-def editar_carrera(career_id: int, payload: dict):
+def editar_carrera(career_id: int, payload: dict, session: Session = Depends(get_db)):
     carrera = session.query(Carer).filter(Carer.id == career_id).first()
     if not carrera:
         return {"status": "error", "message": "Carrera no encontrada"}
     carrera.name = payload.get("name", carrera.name)
+    versiones.incrementar(session, "carreras")
     session.commit()
     return {"status": "success", "message": "Carrera actualizada"}
 
 
 @carer.delete("/career/{career_id}/delete")
-def borrar_carrera(career_id: int):
+def borrar_carrera(career_id: int, session: Session = Depends(get_db)):
     carrera = session.query(Carer).filter(Carer.id == career_id).first()
     if not carrera:
         return {"status": "error", "message": "Carrera no encontrada"}
     session.delete(carrera)
+    versiones.incrementar(session, "carreras", f"materias:{career_id}")
     session.commit()
     return {"status": "success", "message": "Carrera eliminada"}
 
 
 @carer.delete("/career/{career_id}/delete")
-def borrar_carrera(career_id: int):
+def borrar_carrera(career_id: int, session: Session = Depends(get_db)):
     carrera = session.query(Carer).filter(Carer.id == career_id).first()
     if not carrera:
         return {"status": "error", "message": "Carrera no encontrada"}
@@ -59,6 +70,7 @@ def borrar_carrera(career_id: int):
 
     # Eliminar la carrera
     session.delete(carrera)
+    versiones.incrementar(session, "carreras", f"materias:{career_id}")
     session.commit()
 
     return {"status": "success", "message": "Carrera y materias eliminadas correctamente"}
@@ -1,5 +1,10 @@
-from fastapi import APIRouter
-from models.modelo import Materia, Carer, InputMateria, session, User, alumno_materia, profesor_materia
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.orm import Session
+from config import pubsub
+from config.db import get_db
+from config.etag import coincide, etag, marcar, no_modificado
+from models import notificaciones, versiones
+from models.modelo import Materia, Carer, InputMateria, User, alumno_materia, profesor_materia
 from pydantic import BaseModel, conint
 from typing import List, Optional 
  
@@ -11,7 +16,7 @@ class NotaInput(BaseModel):
     nota: Optional[conint(ge=1, le=10)] = None # type: ignore
 
 @materia.post("/materia/new")
-def crear_materia(data: InputMateria):
+def crear_materia(data: InputMateria, session: Session = Depends(get_db)):
     try:
         carer = session.query(Carer).filter_by(id=data.carer_id).first()
         if not carer:
@@ -19,6 +24,7 @@ def crear_materia(data: InputMateria):
 
         nueva_materia = Materia(name=data.name, carer_id=data.carer_id)
         session.add(nueva_materia)
+        versiones.incrementar(session, f"materias:{data.carer_id}")
         session.commit()
 
         return {"mensaje": f"Materia '{data.name}' creada en la carrera '{carer.name}'"}
@@ -30,32 +36,40 @@ def crear_materia(data: InputMateria):
 
 
 @materia.get("/materia/{career_id}/all")
-def all_materia(career_id: int):
+def all_materia(career_id: int, request: Request, response: Response, session: Session = Depends(get_db)):
+    version = etag("materias", career_id, versiones.leer(session, f"materias:{career_id}"))
+    if coincide(request, version):
+        return no_modificado(version)
+    marcar(response, version)
     return session.query(Materia).filter(Materia.carer_id == career_id).all()
 
 
 @materia.put("/materia/{materia_id}/edit")
-def editar_materia(materia_id: int, payload: dict):
+def editar_materia(materia_id: int, payload: dict, session: Session = Depends(get_db)):
     materia = session.query(Materia).filter(Materia.id == materia_id).first()
     if not materia:
         return {"status": "error", "message": "Materia no encontrada"}
     materia.name = payload.get("name", materia.name)
+    versiones.incrementar(session, f"materias:{materia.carer_id}")
     session.commit()
     return {"status": "success", "message": "Materia actualizada"}
 
 
 @materia.delete("/materia/{materia_id}/delete")
-def borrar_materia(materia_id: int):
+def borrar_materia(materia_id: int, session: Session = Depends(get_db)):
     materia = session.query(Materia).filter(Materia.id == materia_id).first()
     if not materia:
         return {"status": "error", "message": "Materia no encontrada"}
     session.delete(materia)
+    versiones.incrementar(session, f"materias:{materia.carer_id}")
+    # Cambian las cantidades de notas y asignaciones de todos sus inscriptos
+    notificaciones.invalidar_al_commit(session)
     session.commit()
     return {"status": "success", "message": "Materia eliminada"}
 
 
 @materia.post("/materia/{materia_id}/notas")
-def guardar_notas(materia_id: int, notas: List[NotaInput]):
+def guardar_notas(materia_id: int, notas: List[NotaInput], session: Session = Depends(get_db)):
     for n in notas:
         if n.nota is not None:  # Evitar nulls
             stmt = (
@@ -66,14 +80,22 @@ def guardar_notas(materia_id: int, notas: List[NotaInput]):
                 )
                 .values(nota=n.nota)
             )
-            session.execute(stmt)
+            if session.execute(stmt).rowcount == 0:
+                # el alumno no está inscripto en la materia: no cambió nada
+                continue
+            pubsub.publicar_al_commit(session, (n.user_id,), {
+                "tipo": "nota",
+                "materia_id": materia_id,
+                "nota": n.nota,
+            })
+            notificaciones.invalidar_al_commit(session, (n.user_id,))
 
     session.commit()
     return {"status": "success", "message": "Notas actualizadas"}
 
 
 @materia.get("/materia/{materia_id}/estudiantes")
-def obtener_estudiantes_por_materia(materia_id: int):
+def obtener_estudiantes_por_materia(materia_id: int, session: Session = Depends(get_db)):
     materia = session.query(Materia).filter(Materia.id == materia_id).first()
     if not materia:
         return {"status": "error", "message": "Materia no encontrada"}
@@ -101,7 +123,7 @@ def obtener_estudiantes_por_materia(materia_id: int):
 
 
 @materia.get("/materia/{materia_id}/{user_id}")
-def obtener_nota_estudiante(materia_id: int, user_id: int):
+def obtener_nota_estudiante(materia_id: int, user_id: int, session: Session = Depends(get_db)):
     try:
         # Buscar la nota del estudiante en la materia
         stmt = (
@@ -128,7 +150,7 @@ def obtener_nota_estudiante(materia_id: int, user_id: int):
     
 
 @materia.get("/asignadas")
-def obtener_materias_con_profesor():
+def obtener_materias_con_profesor(session: Session = Depends(get_db)):
     try:
         result = session.query(profesor_materia).all()
 
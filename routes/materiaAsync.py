@@ -0,0 +1,67 @@
+# Variante async de routes/materia.py (se monta con DB_ASYNC=true, ver app.py).
+# La lógica se reutiliza vía AsyncSession.run_sync, con el I/O sobre asyncpg.
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import get_async_db
+from models.modelo import InputMateria
+from typing import List
+import routes.materia as materia_sync
+from routes.materia import NotaInput
+
+materia = APIRouter()
+
+
+@materia.post("/materia/new")
+async def crear_materia(data: InputMateria, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.crear_materia(data, session=s)
+    )
+
+
+@materia.get("/materia/{career_id}/all")
+async def all_materia(career_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.all_materia(career_id, request, response, session=s)
+    )
+
+
+@materia.put("/materia/{materia_id}/edit")
+async def editar_materia(materia_id: int, payload: dict, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.editar_materia(materia_id, payload, session=s)
+    )
+
+
+@materia.delete("/materia/{materia_id}/delete")
+async def borrar_materia(materia_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.borrar_materia(materia_id, session=s)
+    )
+
+
+@materia.post("/materia/{materia_id}/notas")
+async def guardar_notas(materia_id: int, notas: List[NotaInput], session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.guardar_notas(materia_id, notas, session=s)
+    )
+
+
+@materia.get("/materia/{materia_id}/estudiantes")
+async def obtener_estudiantes_por_materia(materia_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.obtener_estudiantes_por_materia(materia_id, session=s)
+    )
+
+
+@materia.get("/materia/{materia_id}/{user_id}")
+async def obtener_nota_estudiante(materia_id: int, user_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.obtener_nota_estudiante(materia_id, user_id, session=s)
+    )
+
+
+@materia.get("/asignadas")
+async def obtener_materias_con_profesor(session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: materia_sync.obtener_materias_con_profesor(session=s)
+    )
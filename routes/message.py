@@ -1,42 +1,150 @@
-from fastapi import APIRouter, Form, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, Response, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from models.modelo import session, Message, User
-from models.modelo import (
-    UserDetails,
-    alumno_materia,
-    Payment,
-    profesor_materia,
-)
+from sqlalchemy import Numeric, and_, case, cast, delete, func, literal, literal_column, or_, select, tuple_
+from sqlalchemy.orm import Session
+from typing import Optional
+from auth.security import Security
+from config import pubsub, storage
+from config.db import SessionLocal, get_db, get_engine
+from config.etag import coincide, etag, marcar, no_modificado
+from models import adjuntos, consultas, conversaciones, notificaciones, particiones
+from models.directorio import directorio
+from models.modelo import Conversation, Message, User
+from models.modelo import UserDetails
+import asyncio
 import datetime
-import os
-import cloudinary
-import cloudinary.uploader
-from cloudinary.utils import cloudinary_url
-
-# Configuración 
-cloudinary.config(
-    cloud_name="dydhfghau",
-    api_key="231924475335554",
-    api_secret="ZytmRYQuMFnRJHEGDYFjN17QTro",
-    secure=True
-)
+import json
+from decimal import Decimal
 
 message = APIRouter()
 
-BASE_URL = "http://localhost:8000"
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+def preparar_adjunto(file: UploadFile):
+    """Deja el adjunto en la cola de subida (bloqueante). Devuelve (ruta, sha256).
+
+    La subida al storage la hace models/adjuntos.py después del commit.
+    """
+    try:
+        return adjuntos.preparar(file)
+
+    except storage.AdjuntoDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error guardando archivo: {e}")
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Error al subir el archivo: {str(e)}"
+        )
+
+
+def mensaje_a_dict(nuevo: Message) -> dict:
+    return {
+        "id": nuevo.id,
+        "sender_id": nuevo.sender_id,
+        "receiver_id": nuevo.receiver_id,
+        "content": nuevo.content,
+        "timestamp": nuevo.timestamp,
+        "file_url": nuevo.file_url,
+        "file_status": nuevo.file_status
+    }
+
+
+def evento_mensaje(nuevo: Message) -> dict:
+    return {"tipo": "mensaje", **mensaje_a_dict(nuevo)}
+
+
+# PUSH EN TIEMPO REAL: WebSocket, o SSE si el cliente no puede abrir un socket.
+# Llegan mensajes nuevos, notas y pagos, recién cuando se hizo commit.
+SSE_HEARTBEAT = 15
+
+
+def _id_de_usuario(username):
+    with SessionLocal(bind=get_engine()) as session:
+        return session.execute(select(User.id).where(User.username == username)).scalar()
+
+
+async def _verificar_suscriptor(headers, token, user_id):
+    """None si el token es del usuario `user_id`; si no, (status, contenido).
+
+    El token llega en el header Authorization o, para los clientes que no
+    pueden mandar headers (WebSocket y EventSource del navegador), en ?token=.
+    """
+    if token:
+        headers = {"authorization": f"Bearer {token}"}
+    has_access = Security.verify_token(headers)
+    if "iat" not in has_access:
+        return 401, has_access
+    if await run_in_threadpool(_id_de_usuario, has_access.get("username")) != user_id:
+        return 403, {"error": "El token no corresponde a este usuario"}
+    return None
+
+
+@message.websocket("/messages/ws/{user_id}")
+async def eventos_ws(websocket: WebSocket, user_id: int, token: Optional[str] = None):
+    rechazo = await _verificar_suscriptor(websocket.headers, token, user_id)
+    if rechazo is not None:
+        # 1008 = policy violation; antes del accept el cliente recibe un 403
+        await websocket.close(code=1008, reason=rechazo[1]["error"])
+        return
+    await websocket.accept()
+    cola = pubsub.suscribir(user_id)
+
+    async def enviar():
+        while True:
+            await websocket.send_json(await cola.get())
+
+    envio = asyncio.create_task(enviar())
+    try:
+        # El cliente no manda nada útil; leer sirve para enterarse del cierre
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        envio.cancel()
+        pubsub.desuscribir(user_id, cola)
+
+
+@message.get("/messages/stream/{user_id}")
+async def eventos_sse(user_id: int, request: Request, token: Optional[str] = None):
+    rechazo = await _verificar_suscriptor(request.headers, token, user_id)
+    if rechazo is not None:
+        return JSONResponse(status_code=rechazo[0], content=rechazo[1])
+    cola = pubsub.suscribir(user_id)
+
+    async def eventos():
+        try:
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # comentario SSE: mantiene viva la conexión detrás de proxies
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            pubsub.desuscribir(user_id, cola)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ENDPOINT ÚNICO PARA ENVIAR MENSAJES (con o sin archivo)
+# Es sync a propósito: FastAPI lo corre en el threadpool y no frena el event loop
 @message.post("/messages/send")
-async def send_message(
+def send_message(
     sender_id: int = Form(...),
     receiver_id: int = Form(...),
     content: str = Form(""),
-    file: UploadFile = File(None)
+    file: UploadFile = File(None),
+    session: Session = Depends(get_db)
 ):
+    ruta = None
     try:
         # Validar que haya contenido o archivo
         if not content.strip() and not file:
@@ -46,8 +154,8 @@ async def send_message(
             )
         
         # Verificar que los usuarios existan
-        sender = session.query(User).get(sender_id)
-        receiver = session.query(User).get(receiver_id)
+        sender = session.get(User, sender_id)
+        receiver = session.get(User, receiver_id)
         
         if not sender or not receiver:
             raise HTTPException(
@@ -55,54 +163,18 @@ async def send_message(
                 detail="Usuario no encontrado"
             )
 
-        # Manejar archivo adjunto con Cloudinary
-        archivo_url = None
+        # El adjunto se sube en segundo plano: el mensaje se guarda ya como "pendiente".
+        # Si ese mismo contenido ya está en el storage se reutiliza, sin subirlo.
+        file_hash = file_url = file_status = None
         if file and file.filename:
-            try:
-                # Leer el contenido del archivo
-                file_content = await file.read()
-                
-                # Obtener extensión del archivo
-                file_extension = file.filename.split('.')[-1].lower()
-                timestamp = int(datetime.datetime.now().timestamp())
-                
-                # SIEMPRE usar resource_type="raw" para documentos (PDFs, DOC, XLS, etc.)
-                # Solo usar "auto" o "image" para imágenes reales
-                if file_extension in ['pdf', 'doc', 'docx', 'txt', 'xls', 'xlsx', 'zip', 'rar', 'ppt', 'pptx']:
-                    resource_type = "raw"
-                elif file_extension in ['mp4', 'avi', 'mov', 'mkv', 'webm']:
-                    resource_type = "video"
-                elif file_extension in ['mp3', 'wav', 'ogg']:
-                    resource_type = "video"  # Cloudinary usa "video" para audio también
-                else:
-                    # Imágenes y otros
-                    resource_type = "auto"
-                
-                # Crear public_id único
-                filename_sin_ext = file.filename.rsplit('.', 1)[0]
-                public_id = f"mensajes_adjuntos/{timestamp}_{filename_sin_ext}"
-                
-                # Subir a Cloudinary
-                result = cloudinary.uploader.upload(
-                    file_content,
-                    public_id=public_id,
-                    resource_type=resource_type
-                )
-                
-                # Obtener la URL segura del archivo
-                archivo_url = result.get("secure_url")
-                
-                print(f"✅ Archivo subido exitosamente:")
-                print(f"   Nombre: {file.filename}")
-                print(f"   Tipo: {resource_type}")
-                print(f"   URL: {archivo_url}")
-                
-            except Exception as e:
-                print(f"❌ Error subiendo archivo a Cloudinary: {e}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Error al subir el archivo: {str(e)}"
-                )
+            ruta, file_hash = preparar_adjunto(file)
+            file_url = adjuntos.reutilizar(session, file_hash)
+            if file_url:
+                adjuntos.descartar(ruta)
+                ruta = None
+                file_status = "listo"
+            else:
+                file_status = "pendiente"
 
         # Crear mensaje
         nuevo = Message(
@@ -110,48 +182,85 @@ async def send_message(
             receiver_id=receiver_id,
             content=content.strip(),
             timestamp=datetime.datetime.utcnow(),
-            file_url=archivo_url
+            file_url=file_url,
+            file_hash=file_hash,
+            file_status=file_status
         )
         
         session.add(nuevo)
+        session.flush()
+        if ruta:
+            ruta = adjuntos.asignar(ruta, nuevo.id, file.filename)
+        conversaciones.registrar_mensaje(session, nuevo)
+        pubsub.publicar_al_commit(
+            session, (sender_id, receiver_id), evento_mensaje(nuevo)
+        )
+        notificaciones.invalidar_al_commit(session, (receiver_id,))
         session.commit()
+        if ruta:
+            # desde acá el archivo es del worker
+            adjuntos.encolar(ruta)
+            ruta = None
         session.refresh(nuevo)
         
-        return {
-            "id": nuevo.id,
-            "sender_id": nuevo.sender_id,
-            "receiver_id": nuevo.receiver_id,
-            "content": nuevo.content,
-            "timestamp": nuevo.timestamp,
-            "file_url": nuevo.file_url
-        }
+        return mensaje_a_dict(nuevo)
         
     except HTTPException as e:
         session.rollback()
+        adjuntos.descartar(ruta)
         raise e
     except Exception as e:
         session.rollback()
+        adjuntos.descartar(ruta)
         print("Error al enviar mensaje:", e)
         raise HTTPException(status_code=500, detail="Error interno al enviar mensaje")
 
 
 
+def version_mensajes(session: Session, user_id: int, desde) -> str:
+    """ETag del historial: cantidad (bajas), id máximo (altas) y adjuntos todavía
+    pendientes (el worker los pasa a listo/error). Un solo agregado, sin filas."""
+    stmt = select(
+        func.count(Message.id),
+        func.max(Message.id),
+        func.count(case((Message.file_status == "pendiente", 1))),
+    ).where((Message.sender_id == user_id) | (Message.receiver_id == user_id))
+    if desde is not None:
+        stmt = stmt.where(Message.timestamp >= desde)
+    cantidad, ultimo, pendientes = session.execute(stmt).one()
+    return etag("mensajes", user_id, desde.strftime("%Y%m") if desde else 0, cantidad, ultimo or 0, pendientes)
+
+
+# `meses` acota el historial a los últimos meses (0 = todo): con el filtro por
+# timestamp PostgreSQL solo lee esas particiones (ver models/particiones.py)
 @message.get("/messages/{user_id}")
-def get_messages(user_id: int):
+def get_messages(
+    user_id: int,
+    request: Request,
+    response: Response,
+    meses: int = Query(particiones.MENSAJES_MESES_RECIENTES, ge=0),
+    session: Session = Depends(get_db)
+):
     try:
+        desde = particiones.desde_reciente(meses)
+        version = version_mensajes(session, user_id, desde)
+        if coincide(request, version):
+            return no_modificado(version)
+
         mensajes = (
             session.query(Message)
             .filter((Message.sender_id == user_id) | (Message.receiver_id == user_id))
-            .order_by(Message.timestamp.desc())
-            .all()
         )
+        if desde is not None:
+            mensajes = mensajes.filter(Message.timestamp >= desde)
+        mensajes = mensajes.order_by(Message.timestamp.desc()).all()
 
         resultados = []
+        nombres = {}
         for msg in mensajes:
-            sender = session.query(User).filter_by(id=msg.sender_id).first()
-            full_name = "Usuario desconocido"
-            if sender and sender.userdetail:
-                full_name = f"{sender.userdetail.firstName} {sender.userdetail.lastName}"
+            if msg.sender_id not in nombres:
+                nombres[msg.sender_id] = nombre_usuario(session, msg.sender_id)
+            full_name = nombres[msg.sender_id]
 
             resultados.append(
                 {
@@ -161,10 +270,12 @@ def get_messages(user_id: int):
                     "content": msg.content,
                     "timestamp": msg.timestamp,
                     "sender_name": full_name,
-                    "file_url": msg.file_url  # Incluir file_url
+                    "file_url": msg.file_url,  # Incluir file_url
+                    "file_status": msg.file_status
                 }
             )
 
+        marcar(response, version)
         return resultados
 
     except Exception as e:
@@ -172,10 +283,152 @@ def get_messages(user_id: int):
         return []
 
 
+# Bandeja de entrada: una fila por contraparte con el último mensaje, leída de
+# la tabla conversations y paginada por cursor (id del último mensaje)
+@message.get("/messages/conversations/{user_id}")
+def get_conversations(
+    user_id: int,
+    limit: int = Query(20, gt=0, le=100),
+    cursor: Optional[int] = Query(None),
+    session: Session = Depends(get_db)
+):
+    try:
+        es_a = Conversation.user_a_id == user_id
+        otro = case((es_a, Conversation.user_b_id), else_=Conversation.user_a_id)
+        unread = case((es_a, Conversation.unread_a), else_=Conversation.unread_b)
+
+        stmt = (
+            select(Message, otro.label("otro"), unread.label("unread"),
+                   UserDetails.firstName, UserDetails.lastName)
+            .select_from(Conversation)
+            .join(Message, Message.id == Conversation.last_message_id)
+            .outerjoin(User, User.id == otro)
+            .outerjoin(UserDetails, UserDetails.id == User.id_userdetail)
+            .where(or_(es_a, Conversation.user_b_id == user_id))
+            .order_by(Conversation.last_message_id.desc())
+            .limit(limit)
+        )
+        if cursor is not None:
+            stmt = stmt.where(Conversation.last_message_id < cursor)
+
+        resultado = []
+        for msg, otro_id, no_leidos, first_name, last_name in session.execute(stmt):
+            nombre = "Usuario desconocido"
+            if first_name is not None:
+                nombre = f"{first_name} {last_name}"
+            resultado.append(
+                {
+                    "user_id": otro_id,
+                    "nombre": nombre,
+                    "timestamp": msg.timestamp,
+                    "unread": no_leidos,
+                    "last_message": mensaje_a_dict(msg),
+                }
+            )
+
+        next_cursor = (
+            resultado[-1]["last_message"]["id"]
+            if len(resultado) == limit
+            else None
+        )
+
+        return {"conversations": resultado, "next_cursor": next_cursor}
+
+    except Exception as e:
+        print("Error al obtener conversaciones:", e)
+        return JSONResponse(status_code=500, content={"detail": "Error interno"})
+
+
+# Búsqueda en el historial: solo mensajes donde participa user_id (y con
+# `con`, solo el chat con ese usuario), de los últimos `meses` meses (0 = todo).
+# Ordena por relevancia y pagina con el cursor "rank,id" del último resultado.
+@message.get("/messages/search/{user_id}")
+def buscar_mensajes(
+    user_id: int,
+    q: str = Query(..., min_length=1),
+    con: Optional[int] = Query(None),
+    limit: int = Query(20, gt=0, le=100),
+    cursor: Optional[str] = Query(None),
+    meses: int = Query(particiones.MENSAJES_MESES_RECIENTES, ge=0),
+    session: Session = Depends(get_db)
+):
+    try:
+        if session.get_bind().dialect.name == "postgresql":
+            # messages.content_tsv es la columna generada de la migración v0007
+            tsv = literal_column("messages.content_tsv")
+            consulta = func.websearch_to_tsquery("spanish", q)
+            filtro_texto = tsv.op("@@")(consulta)
+            # redondeado a numeric para que el cursor compare exacto
+            rank = func.round(cast(func.ts_rank(tsv, consulta), Numeric), 6)
+        else:
+            filtro_texto = Message.content.ilike(f"%{q}%")
+            rank = literal(0)
+
+        participa = or_(Message.sender_id == user_id, Message.receiver_id == user_id)
+        if con is not None:
+            participa = or_(
+                and_(Message.sender_id == user_id, Message.receiver_id == con),
+                and_(Message.sender_id == con, Message.receiver_id == user_id),
+            )
+
+        stmt = (
+            select(Message, rank.label("rank"))
+            .where(filtro_texto, participa)
+            .order_by(rank.desc(), Message.id.desc())
+            .limit(limit)
+        )
+        desde = particiones.desde_reciente(meses)
+        if desde is not None:
+            stmt = stmt.where(Message.timestamp >= desde)
+        if cursor is not None:
+            try:
+                rank_cursor, id_cursor = cursor.split(",")
+                rank_cursor, id_cursor = Decimal(rank_cursor), int(id_cursor)
+            except (ValueError, ArithmeticError):
+                return JSONResponse(status_code=400, content={"detail": "Cursor inválido"})
+            stmt = stmt.where(tuple_(rank, Message.id) < tuple_(rank_cursor, id_cursor))
+
+        resultados = []
+        next_cursor = None
+        for msg, relevancia in session.execute(stmt):
+            resultados.append({**mensaje_a_dict(msg), "rank": float(relevancia)})
+            next_cursor = f"{relevancia},{msg.id}"
+        if len(resultados) < limit:
+            next_cursor = None
+
+        return {"messages": resultados, "next_cursor": next_cursor}
+
+    except Exception as e:
+        session.rollback()
+        print("Error buscando mensajes:", e)
+        return JSONResponse(status_code=500, content={"detail": "Error interno"})
+
+
+@message.post("/messages/conversations/{user_id}/{otro_user_id}/read")
+def marcar_conversacion_leida(user_id: int, otro_user_id: int, session: Session = Depends(get_db)):
+    try:
+        conversaciones.marcar_leida(session, user_id, otro_user_id)
+        session.commit()
+        return {"status": "ok", "mensaje": "Conversación marcada como leída"}
+    except Exception as e:
+        session.rollback()
+        print("Error marcando conversación como leída:", e)
+        raise HTTPException(status_code=500, detail="Error interno")
+
+
+@message.get("/messages/unread/{user_id}")
+def get_unread_count(user_id: int, session: Session = Depends(get_db)):
+    try:
+        return {"user_id": user_id, "unread": conversaciones.no_leidos(session, user_id)}
+    except Exception as e:
+        print("Error al contar no leídos:", e)
+        return JSONResponse(status_code=500, content={"detail": "Error interno"})
+
+
 @message.get("/messages/available/{user_id}")
-def get_available_users(user_id: int, search: str = ""):
+def get_available_users(user_id: int, search: str = "", session: Session = Depends(get_db)):
     try:
-        user = session.query(User).get(user_id)
+        user = session.get(User, user_id)
         if not user:
             return JSONResponse(
                 status_code=404, content={"detail": "Usuario no encontrado"}
@@ -184,49 +437,29 @@ def get_available_users(user_id: int, search: str = ""):
         tipo = user.userdetail.type.lower()
 
         if tipo == "admin":
-            usuarios = session.query(User).filter(User.id != user_id)
+            tipos = None
         elif tipo == "profesor":
-            usuarios = (
-                session.query(User)
-                .join(UserDetails)
-                .filter(User.id != user_id)
-                .filter(UserDetails.type.in_(["admin", "estudiante"]))
-            )
+            tipos = ["admin", "estudiante"]
         elif tipo == "estudiante":
-            usuarios = (
-                session.query(User)
-                .join(UserDetails)
-                .filter(User.id != user_id)
-                .filter(UserDetails.type.in_(["admin", "profesor"]))
-            )
+            tipos = ["admin", "profesor"]
         else:
             return JSONResponse(
                 status_code=400, content={"detail": "Tipo de usuario desconocido"}
             )
 
-        # Filtrado por nombre si hay término de búsqueda
+        # La búsqueda va contra el directorio en memoria (models/directorio.py)
+        directorio.asegurar_cargado(session)
         if search and len(search.strip()) >= 2:  # Solo buscar con al menos 2 caracteres
-            usuarios = usuarios.join(UserDetails).filter(
-                (UserDetails.firstName + " " + UserDetails.lastName).ilike(
-                    f"%{search.strip()}%"
-                )
-            )
             # Aumentar límite cuando hay búsqueda activa
-            usuarios = usuarios.limit(50).all()
+            usuarios = directorio.buscar(search, tipos=tipos, excluir=user_id, limit=50)
         else:
             # Sin búsqueda, mostrar solo los primeros 20
-            usuarios = usuarios.limit(20).all()
+            usuarios = directorio.buscar(tipos=tipos, excluir=user_id, limit=20)
 
-        resultado = []
-        for u in usuarios:
-            nombre = "Usuario desconocido"
-            if u.userdetail:
-                nombre = f"{u.userdetail.firstName} {u.userdetail.lastName}"
-            resultado.append({
-                "id": u.id, 
-                "nombre": nombre, 
-                "type": u.userdetail.type if u.userdetail else "unknown"
-            })
+        resultado = [
+            {"id": uid, "nombre": nombre, "type": tipo_usuario}
+            for uid, nombre, tipo_usuario in usuarios
+        ]
 
         return resultado
 
@@ -235,117 +468,55 @@ def get_available_users(user_id: int, search: str = ""):
         return JSONResponse(status_code=500, content={"detail": "Error interno"})
 
 
-@message.get("/notifications/{user_id}/{user_type}")
-def get_notifications(user_id: int, user_type: str):
-    try:
-        notifs = []
+# Aciertos/fallos del cache de notificaciones de este proceso
+@message.get("/notifications/cache/stats")
+def estadisticas_notificaciones():
+    return notificaciones.estadisticas()
 
-        # Mensajes (todos los usuarios)
-        mensaje = (
-            session.query(Message)
-            .filter(Message.receiver_id == user_id)
-            .order_by(Message.timestamp.desc())
-            .first()
-        )
-        if mensaje:
-            sender = session.query(User).filter_by(id=mensaje.sender_id).first()
-            nombre = "Usuario desconocido"
-            if sender and sender.userdetail:
-                nombre = f"{sender.userdetail.firstName} {sender.userdetail.lastName}"
 
-            notifs.append(
-                {
-                    "tipo": "mensaje",
-                    "texto": f"Mensaje de {nombre}: {mensaje.content[:40]}...",
-                    "fecha": mensaje.timestamp,
-                }
-            )
-
-        # Si es profesor: asignaciones
-        if user_type == "profesor":
-            asignaciones = (
-                session.query(profesor_materia)
-                .filter(profesor_materia.c.user_id == user_id)
-                .all()
-            )
-
-            if asignaciones:
-                cantidad = len(asignaciones)
-                notifs.append(
-                    {
-                        "tipo": "asignacion",
-                        "texto": f"Se te ha asignado a {cantidad} materia(s).",
-                        "fecha": datetime.datetime.now(),
-                    }
-                )
-
-        # Si es estudiante: notas y pagos
-        if user_type == "estudiante":
-            # Notas
-            notas = (
-                session.query(alumno_materia)
-                .filter(
-                    alumno_materia.c.user_id == user_id, 
-                    alumno_materia.c.nota != None
-                )
-                .all()
-            )
-
-            if notas:
-                notifs.append(
-                    {
-                        "tipo": "nota",
-                        "texto": f"Se han cargado {len(notas)} nota(s).",
-                        "fecha": datetime.datetime.now(),
-                    }
-                )
-
-            # Pagos
-            pagos = (
-                session.query(Payment)
-                .filter(Payment.user_id == user_id)
-                .order_by(Payment.created_at.desc())
-                .all()
-            )
-
-            if pagos:
-                pago = pagos[0]  # último
-                notifs.append(
-                    {
-                        "tipo": "pago",
-                        "texto": f"Se registró un pago de ${pago.amount} para {pago.affected_month.strftime('%B %Y')}.",
-                        "fecha": pago.created_at,
-                    }
-                )
-        
-        leidas = notificaciones_leidas.get(user_id, [])
-        notifs_filtradas = [n for n in notifs if n["texto"] not in leidas]
-
-        return notifs_filtradas
+@message.get("/notifications/{user_id}/{user_type}")
+def get_notifications(
+    user_id: int,
+    user_type: str,
+    request: Request,
+    response: Response,
+    session: Session = Depends(get_db)
+):
+    try:
+        # Una sola consulta, o ninguna si está en cache; ver models/notificaciones.py
+        pendientes = [n for n in notificaciones.obtener(session, user_id, user_type) if not n["leida"]]
+        version = notificaciones.version(pendientes)
+        if coincide(request, version):
+            return no_modificado(version)
+        marcar(response, version)
+        return [{k: v for k, v in n.items() if k != "leida"} for n in pendientes]
 
     except Exception as e:
         print("Error en get_notifications:", e)
         return []
 
 
-notificaciones_leidas = {}  # { user_id: [texto1, texto2, ...] }
-
-
 class NotificacionLeidaInput(BaseModel):
     user_id: int
-    texto: str
+    texto: Optional[str] = None
+    clave: Optional[str] = None  # la que devuelve get_notifications; preferida sobre texto
 
 
 @message.post("/notifications/marcar-leida")
-def marcar_notificacion_leida(data: NotificacionLeidaInput):
-    user_id = data.user_id
-    texto = data.texto
+def marcar_notificacion_leida(data: NotificacionLeidaInput, session: Session = Depends(get_db)):
+    if data.clave is None and data.texto is None:
+        raise HTTPException(status_code=400, detail="Falta clave o texto")
 
-    if user_id not in notificaciones_leidas:
-        notificaciones_leidas[user_id] = []
+    if data.clave is not None:
+        claves = [data.clave]
+    else:
+        # Clientes viejos mandan el texto: se busca entre las notificaciones actuales
+        notifs = notificaciones.obtener(session, data.user_id, tipo_usuario(data.user_id, session))
+        claves = [n["clave"] for n in notifs if n["texto"] == data.texto]
 
-    if texto not in notificaciones_leidas[user_id]:
-        notificaciones_leidas[user_id].append(texto)
+    notificaciones.marcar_leidas(session, data.user_id, claves)
+    notificaciones.invalidar_al_commit(session, (data.user_id,))
+    session.commit()
 
     return {"status": "ok", "mensaje": "Notificación marcada como leída"}
 
@@ -356,18 +527,17 @@ class NotificacionTipoInput(BaseModel):
 
 
 @message.post("/notifications/marcar-tipo-leido")
-def marcar_notificaciones_tipo(data: NotificacionTipoInput):
+def marcar_notificaciones_tipo(data: NotificacionTipoInput, session: Session = Depends(get_db)):
     user_id = data.user_id
     tipo = data.tipo
 
-    if user_id not in notificaciones_leidas:
-        notificaciones_leidas[user_id] = []
-
     # Recalcular las notificaciones actuales
-    notifs = get_notifications(user_id, tipo_usuario(user_id))
-    for n in notifs:
-        if n["tipo"] == tipo and n["texto"] not in notificaciones_leidas[user_id]:
-            notificaciones_leidas[user_id].append(n["texto"])
+    notifs = notificaciones.obtener(session, user_id, tipo_usuario(user_id, session))
+    notificaciones.marcar_leidas(
+        session, user_id, [n["clave"] for n in notifs if n["tipo"] == tipo and not n["leida"]]
+    )
+    notificaciones.invalidar_al_commit(session, (user_id,))
+    session.commit()
 
     return {
         "status": "ok",
@@ -375,18 +545,23 @@ def marcar_notificaciones_tipo(data: NotificacionTipoInput):
     }
 
 
-def tipo_usuario(user_id: int) -> str:
-    user = session.query(User).filter(User.id == user_id).first()
-    if user and user.userdetail:
-        return user.userdetail.type
-    return "estudiante"  # fallback
+def tipo_usuario(user_id: int, session: Session) -> str:
+    tipo = session.execute(consultas.tipo_de_usuario(user_id)).scalar()
+    return tipo or "estudiante"  # fallback
+
+
+def nombre_usuario(session: Session, user_id: int) -> str:
+    fila = session.execute(consultas.nombre_de_usuario(user_id)).first()
+    if fila:
+        return f"{fila.firstName} {fila.lastName}"
+    return "Usuario desconocido"
 
 
 # Eliminar mensaje individual
 @message.delete("/messages/{msg_id}")
-def delete_message(msg_id: int):
+def delete_message(msg_id: int, session: Session = Depends(get_db)):
     try:
-        msg = session.query(Message).get(msg_id)
+        msg = session.get(Message, msg_id)
         if not msg:
             raise HTTPException(status_code=404, detail="Mensaje no encontrado")
 
@@ -397,16 +572,13 @@ def delete_message(msg_id: int):
                 detail="Solo se pueden eliminar mensajes de los últimos 10 minutos",
             )
 
-        # Borrar archivo si existe
-        if msg.file_url:
-            # Extraer el path del archivo desde la URL
-            filename = msg.file_url.split('/')[-1]  # Obtener solo el nombre del archivo
-            filepath = os.path.join(UPLOAD_DIR, filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-
+        conversaciones.quitar_mensaje(session, msg)
+        huerfanas = adjuntos.liberar(session, [(msg.file_url, msg.file_hash)])
         session.delete(msg)
+        notificaciones.invalidar_al_commit(session, (msg.receiver_id,))
         session.commit()
+        # El archivo se borra del storage en segundo plano, si nadie más lo usa
+        adjuntos.borrar_en_segundo_plano(huerfanas)
         return {"status": "ok", "mensaje": "Mensaje eliminado"}
         
     except HTTPException as e:
@@ -419,30 +591,27 @@ def delete_message(msg_id: int):
 
 # Eliminar chat completo
 @message.delete("/messages/chat/{user_id}/{otro_user_id}")
-def delete_chat(user_id: int, otro_user_id: int):
+def delete_chat(user_id: int, otro_user_id: int, session: Session = Depends(get_db)):
     try:
-        mensajes = (
-            session.query(Message)
-            .filter(
+        # Un solo DELETE; devuelve los adjuntos para liberarlos después
+        borrados = session.execute(
+            delete(Message)
+            .where(
                 ((Message.sender_id == user_id) & (Message.receiver_id == otro_user_id))
                 | (
                     (Message.sender_id == otro_user_id)
                     & (Message.receiver_id == user_id)
                 )
             )
-            .all()
-        )
-
-        for msg in mensajes:
-            if msg.file_url:
-                # Extraer el path del archivo desde la URL
-                filename = msg.file_url.split('/')[-1]
-                filepath = os.path.join(UPLOAD_DIR, filename)
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            session.delete(msg)
+            .returning(Message.file_url, Message.file_hash)
+            .execution_options(synchronize_session=False)
+        ).all()
 
+        conversaciones.borrar_conversacion(session, user_id, otro_user_id)
+        notificaciones.invalidar_al_commit(session, (user_id, otro_user_id))
+        huerfanas = adjuntos.liberar(session, borrados)
         session.commit()
+        adjuntos.borrar_en_segundo_plano(huerfanas)
         return {"status": "ok", "mensaje": "Chat eliminado"}
         
     except Exception as e:
@@ -0,0 +1,209 @@
+# Variante async de routes/message.py (se monta con DB_ASYNC=true, ver app.py).
+# La lógica se reutiliza vía AsyncSession.run_sync, con el I/O sobre asyncpg.
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import pubsub
+from config.db import get_async_db
+from models.modelo import Message, User
+from models import adjuntos, conversaciones, notificaciones, particiones
+import routes.message as message_sync
+from routes.message import NotificacionLeidaInput, NotificacionTipoInput
+from typing import Optional
+import datetime
+
+message = APIRouter()
+
+
+@message.post("/messages/send")
+async def send_message(
+    sender_id: int = Form(...),
+    receiver_id: int = Form(...),
+    content: str = Form(""),
+    file: UploadFile = File(None),
+    session: AsyncSession = Depends(get_async_db)
+):
+    ruta = None
+    try:
+        # Validar que haya contenido o archivo
+        if not content.strip() and not file:
+            raise HTTPException(
+                status_code=422,
+                detail="Debe proporcionar contenido del mensaje o un archivo"
+            )
+
+        # Verificar que los usuarios existan
+        sender = await session.get(User, sender_id)
+        receiver = await session.get(User, receiver_id)
+
+        if not sender or not receiver:
+            raise HTTPException(
+                status_code=404,
+                detail="Usuario no encontrado"
+            )
+
+        # Copiar el adjunto a la cola es bloqueante: va al threadpool.
+        # La subida al storage la hace el worker después del commit, salvo que
+        # ese mismo contenido ya esté en el storage.
+        file_hash = file_url = file_status = None
+        if file and file.filename:
+            ruta, file_hash = await run_in_threadpool(message_sync.preparar_adjunto, file)
+            file_url = await session.run_sync(lambda s: adjuntos.reutilizar(s, file_hash))
+            if file_url:
+                adjuntos.descartar(ruta)
+                ruta = None
+                file_status = "listo"
+            else:
+                file_status = "pendiente"
+
+        nuevo = Message(
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+            content=content.strip(),
+            timestamp=datetime.datetime.utcnow(),
+            file_url=file_url,
+            file_hash=file_hash,
+            file_status=file_status
+        )
+
+        session.add(nuevo)
+        await session.flush()
+        if ruta:
+            ruta = adjuntos.asignar(ruta, nuevo.id, file.filename)
+        await session.run_sync(lambda s: conversaciones.registrar_mensaje(s, nuevo))
+        pubsub.publicar_al_commit(
+            session.sync_session, (sender_id, receiver_id), message_sync.evento_mensaje(nuevo)
+        )
+        notificaciones.invalidar_al_commit(session.sync_session, (receiver_id,))
+        await session.commit()
+        if ruta:
+            # desde acá el archivo es del worker
+            adjuntos.encolar(ruta)
+            ruta = None
+        await session.refresh(nuevo)
+
+        return message_sync.mensaje_a_dict(nuevo)
+
+    except HTTPException as e:
+        await session.rollback()
+        adjuntos.descartar(ruta)
+        raise e
+    except Exception as e:
+        await session.rollback()
+        adjuntos.descartar(ruta)
+        print("Error al enviar mensaje:", e)
+        raise HTTPException(status_code=500, detail="Error interno al enviar mensaje")
+
+
+@message.get("/messages/{user_id}")
+async def get_messages(
+    user_id: int,
+    request: Request,
+    response: Response,
+    meses: int = Query(particiones.MENSAJES_MESES_RECIENTES, ge=0),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: message_sync.get_messages(user_id, request, response, meses=meses, session=s)
+    )
+
+
+@message.get("/messages/conversations/{user_id}")
+async def get_conversations(
+    user_id: int,
+    limit: int = Query(20, gt=0, le=100),
+    cursor: Optional[int] = Query(None),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: message_sync.get_conversations(
+            user_id, limit=limit, cursor=cursor, session=s
+        )
+    )
+
+
+@message.get("/messages/search/{user_id}")
+async def buscar_mensajes(
+    user_id: int,
+    q: str = Query(..., min_length=1),
+    con: Optional[int] = Query(None),
+    limit: int = Query(20, gt=0, le=100),
+    cursor: Optional[str] = Query(None),
+    meses: int = Query(particiones.MENSAJES_MESES_RECIENTES, ge=0),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: message_sync.buscar_mensajes(
+            user_id, q=q, con=con, limit=limit, cursor=cursor, meses=meses, session=s
+        )
+    )
+
+
+@message.post("/messages/conversations/{user_id}/{otro_user_id}/read")
+async def marcar_conversacion_leida(user_id: int, otro_user_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: message_sync.marcar_conversacion_leida(user_id, otro_user_id, session=s)
+    )
+
+
+@message.get("/messages/unread/{user_id}")
+async def get_unread_count(user_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: message_sync.get_unread_count(user_id, session=s)
+    )
+
+
+@message.get("/messages/available/{user_id}")
+async def get_available_users(user_id: int, search: str = "", session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: message_sync.get_available_users(user_id, search, session=s)
+    )
+
+
+message.get("/notifications/cache/stats")(message_sync.estadisticas_notificaciones)
+
+
+@message.get("/notifications/{user_id}/{user_type}")
+async def get_notifications(
+    user_id: int,
+    user_type: str,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: message_sync.get_notifications(user_id, user_type, request, response, session=s)
+    )
+
+
+@message.post("/notifications/marcar-leida")
+async def marcar_notificacion_leida(data: NotificacionLeidaInput, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: message_sync.marcar_notificacion_leida(data, session=s)
+    )
+
+
+# No tocan la base
+message.websocket("/messages/ws/{user_id}")(message_sync.eventos_ws)
+message.get("/messages/stream/{user_id}")(message_sync.eventos_sse)
+
+
+@message.post("/notifications/marcar-tipo-leido")
+async def marcar_notificaciones_tipo(data: NotificacionTipoInput, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: message_sync.marcar_notificaciones_tipo(data, session=s)
+    )
+
+
+@message.delete("/messages/{msg_id}")
+async def delete_message(msg_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: message_sync.delete_message(msg_id, session=s)
+    )
+
+
+@message.delete("/messages/chat/{user_id}/{otro_user_id}")
+async def delete_chat(user_id: int, otro_user_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: message_sync.delete_chat(user_id, otro_user_id, session=s)
+    )
@@ -1,17 +1,22 @@
 from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from auth.security import Security
-from models.modelo import Payment, InputPayment, UserDetails, session, User, Carer, UpdatePayment, InputPaginatedRequest
-from sqlalchemy.orm import joinedload
+from auth.security import verificar_token
+from config import pubsub
+from config.db import get_db
+from config.exportar import exportar
+from models import consultas, importacion, ingresos, notificaciones
+from models.modelo import Payment, InputPayment, UserDetails, User, Carer, UpdatePayment, InputPaginatedRequest, IngresoMensual
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
 
 payment = APIRouter()
 
 
 @payment.get("/payment/all")
-def get_all_payments():
+def get_all_payments(session: Session = Depends(get_db)):
     try:
         pagos = session.query(Payment).options(joinedload(Payment.user).joinedload(User.userdetail)).all()
         resultados = []
@@ -37,13 +42,58 @@ def get_all_payments():
         return JSONResponse(status_code=500, content={"detail": "Error al obtener pagos"})
 
 
+COLUMNAS_EXPORT_PAGOS = [
+    "id", "amount", "affected_month", "carer_id", "carer",
+    "user_id", "username", "firstName", "lastName",
+]
+
+
+def _pago_exportado(f):
+    # Misma forma que cada elemento de /payment/all
+    return {
+        "id": f.id,
+        "amount": f.amount,
+        "affected_month": str(f.affected_month),
+        "carer": f.carer,
+        "carer_id": f.carer_id,
+        "username": f.username,
+        "user": {
+            "id": f.user_id,
+            "userdetail": {
+                "firstName": f.firstName,
+                "lastName": f.lastName,
+            } if f.firstName is not None else None,
+        },
+    }
+
+
+# /payment/all en streaming, para tablas grandes (ver config/exportar.py)
+@payment.get("/payment/export")
+def exportar_pagos(formato: str = Query("ndjson", regex="^(ndjson|csv)$")):
+    stmt = (
+        select(
+            Payment.id, Payment.amount, Payment.affected_month, Payment.carer_id,
+            Carer.name.label("carer"), Payment.user_id, User.username,
+            UserDetails.firstName, UserDetails.lastName,
+        )
+        .join(User, User.id == Payment.user_id)
+        .outerjoin(UserDetails, UserDetails.id == User.id_userdetail)
+        .outerjoin(Carer, Carer.id == Payment.carer_id)
+        .order_by(Payment.id)
+    )
+    return exportar(
+        stmt, "pagos", formato, _pago_exportado, COLUMNAS_EXPORT_PAGOS,
+        lambda f: [getattr(f, c) for c in COLUMNAS_EXPORT_PAGOS],
+    )
+
+
 @payment.post("/payment/new")
-def create_payment(data: InputPayment):
+def create_payment(data: InputPayment, session: Session = Depends(get_db)):
     try:
-        user = session.query(User).options(
-            joinedload(User.userdetail)
-        ).filter(User.id == data.user_id).first()
-        carer = session.query(Carer).filter(Carer.id == data.carer_id).first()
+        user = session.execute(
+            consultas.usuario_con_detalle_por_id(data.user_id)
+        ).scalars().first()
+        carer = session.execute(consultas.carrera_por_id(data.carer_id)).scalars().first()
 
         if not user:
             return JSONResponse(status_code=404, content={"detail": "Usuario no encontrado"})
@@ -59,6 +109,17 @@ def create_payment(data: InputPayment):
             affected_month=data.affected_month
         )
         session.add(nuevo)
+        session.flush()
+        pubsub.publicar_al_commit(session, (user.id,), {
+            "tipo": "pago",
+            "id": nuevo.id,
+            "carer_id": carer.id,
+            "carer": carer.name,
+            "amount": nuevo.amount,
+            "affected_month": str(nuevo.affected_month),
+        })
+        ingresos.sumar(session, nuevo.carer_id, nuevo.affected_month, nuevo.amount)
+        notificaciones.invalidar_al_commit(session, (user.id,))
         session.commit()
         session.refresh(nuevo)
 
@@ -84,10 +145,43 @@ def create_payment(data: InputPayment):
         session.close()
 
     
+# Alta masiva desde un CSV con columnas user_id, carer_id, amount y
+# affected_month (ver models/importacion.py). Con todo_o_nada=true un solo
+# error cancela la importación entera (422).
+@payment.post("/payment/import")
+def importar_pagos(
+    file: UploadFile = File(...),
+    todo_o_nada: bool = Query(False),
+    has_access: dict = Depends(verificar_token),
+    session: Session = Depends(get_db)
+):
+    if "iat" not in has_access:
+        return JSONResponse(status_code=401, content=has_access)
+    try:
+        filas, errores = importacion.leer_csv(file.file)
+    except importacion.ImportacionInvalida as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    return resultado_importacion(session, filas, errores, todo_o_nada)
+
+
+def resultado_importacion(session: Session, filas, errores, todo_o_nada: bool):
+    try:
+        resultado = importacion.importar(session, filas, errores, todo_o_nada)
+    except Exception as e:
+        session.rollback()
+        print("Error al importar pagos:", e)
+        return JSONResponse(status_code=500, content={"detail": "Error al importar pagos"})
+    if todo_o_nada and resultado["cantidad_errores"]:
+        return JSONResponse(status_code=422, content=resultado)
+    return JSONResponse(status_code=200, content=resultado)
+
+
 @payment.get("/payment/user/{username}")
-def payment_user(username: str):
+def payment_user(username: str, session: Session = Depends(get_db)):
     try:
-        user = session.query(User).options(joinedload(User.userdetail)).filter(User.username == username).first()
+        user = session.execute(
+            consultas.usuario_con_detalle_por_username(username)
+        ).scalars().first()
 
         if not user:
             return JSONResponse(status_code=404, content={"detail": "Usuario no encontrado"})
@@ -118,69 +212,173 @@ def payment_user(username: str):
         session.close()
 
 
+# Los dos bloquean la fila del pago: dos requests concurrentes sobre el mismo
+# pago no pueden restar dos veces el monto viejo de ingresos_mensuales
 @payment.put("/payment/{payment_id}")
-def actualizar_pago(payment_id: int, data: UpdatePayment):
-    pago = session.query(Payment).get(payment_id)
+def actualizar_pago(payment_id: int, data: UpdatePayment, session: Session = Depends(get_db)):
+    pago = session.get(Payment, payment_id, with_for_update=True)
     if not pago:
         raise HTTPException(status_code=404, detail="Pago no encontrado")
 
+    ingresos.restar(session, pago.carer_id, pago.affected_month, pago.amount)
     pago.carer_id = data.carer_id
     pago.amount = data.amount
     pago.affected_month = data.affected_month
+    ingresos.sumar(session, pago.carer_id, pago.affected_month, pago.amount)
 
+    notificaciones.invalidar_al_commit(session, (pago.user_id,))
     session.commit()
     return {"message": "Pago actualizado correctamente"}
 
 
 @payment.delete("/payment/{payment_id}")
-def eliminar_pago(payment_id: int):
-    pago = session.query(Payment).get(payment_id)
+def eliminar_pago(payment_id: int, session: Session = Depends(get_db)):
+    pago = session.get(Payment, payment_id, with_for_update=True)
     if not pago:
         raise HTTPException(status_code=404, detail="Pago no encontrado")
     
     session.delete(pago)
+    ingresos.restar(session, pago.carer_id, pago.affected_month, pago.amount)
+    notificaciones.invalidar_al_commit(session, (pago.user_id,))
     session.commit()
     return {"message": "Pago eliminado correctamente"}  
 
 
-@payment.get("/payment/pending")
-def get_usuarios_con_pagos_pendientes():
-    try:
-        usuarios = session.query(User).options(joinedload(User.userdetail)).all()
-        pagos = session.query(Payment).all()
+# Reporte de estudiantes sin pago en un mes (por defecto el actual), opcionalmente
+# de una carrera. Todo en la base: NOT EXISTS contra payments por estudiante y
+# rango de affected_month (índice ix_payments_user_month), cantidades por carrera con
+# GROUP BY y la lista paginada por id (cursor = último id de la página anterior).
+# Formato de los parámetros de mes: YYYY-MM
+MES = r"^\d{4}-(0[1-9]|1[0-2])$"
 
-        from datetime import datetime
-        mes_actual = datetime.now().strftime("%Y-%m")
 
-        usuarios_con_pago = set()
-        for pago in pagos:
-            if pago.affected_month.strftime("%Y-%m") == mes_actual:
-                usuarios_con_pago.add(pago.user_id)
+@payment.get("/payment/pending")
+def get_usuarios_con_pagos_pendientes(
+    mes: Optional[str] = Query(None, regex=MES),
+    carer_id: Optional[int] = None,
+    limit: int = Query(50, gt=0, le=500),
+    cursor: Optional[int] = None,
+    session: Session = Depends(get_db)
+):
+    try:
+        if mes is None:
+            inicio = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            inicio = datetime.strptime(mes, "%Y-%m")
+        fin = inicio.replace(year=inicio.year + 1, month=1) if inicio.month == 12 else inicio.replace(month=inicio.month + 1)
+
+        pago_del_mes = (
+            select(Payment.id)
+            .where(
+                Payment.user_id == User.id,
+                Payment.affected_month >= inicio,
+                Payment.affected_month < fin,
+            )
+            .exists()
+        )
+        condiciones = [UserDetails.type == "estudiante", ~pago_del_mes]
+        if carer_id is not None:
+            condiciones.append(UserDetails.carer_id == carer_id)
+
+        por_carrera = session.execute(
+            select(UserDetails.carer_id, Carer.name, func.count())
+            .select_from(User)
+            .join(UserDetails, UserDetails.id == User.id_userdetail)
+            .outerjoin(Carer, Carer.id == UserDetails.carer_id)
+            .where(*condiciones)
+            .group_by(UserDetails.carer_id, Carer.name)
+            .order_by(UserDetails.carer_id)
+        ).all()
+
+        pagina = (
+            select(User.id, UserDetails.firstName, UserDetails.lastName, UserDetails.carer_id)
+            .join(UserDetails, UserDetails.id == User.id_userdetail)
+            .where(*condiciones)
+            .order_by(User.id)
+            .limit(limit)
+        )
+        if cursor is not None:
+            pagina = pagina.where(User.id > cursor)
+        filas = session.execute(pagina).all()
 
         usuarios_pendientes = [
             {
-                "id": u.id,
-                "fullname": f"{u.userdetail.firstName} {u.userdetail.lastName}"
+                "id": f.id,
+                "fullname": f"{f.firstName} {f.lastName}",
+                "carer_id": f.carer_id,
             }
-            for u in usuarios
-            if u.userdetail and u.userdetail.type == "estudiante" and u.id not in usuarios_con_pago
+            for f in filas
         ]
 
-        return usuarios_pendientes
+        return {
+            "mes": inicio.strftime("%Y-%m"),
+            "total": sum(c for _, _, c in por_carrera),
+            "por_carrera": [
+                {"carer_id": cid, "carer": nombre, "pendientes": c}
+                for cid, nombre, c in por_carrera
+            ],
+            "usuarios": usuarios_pendientes,
+            "next_cursor": usuarios_pendientes[-1]["id"] if len(usuarios_pendientes) == limit else None,
+        }
     except Exception as e:
         print("Error:", e)
         return JSONResponse(status_code=500, content={"detail": "Error interno"})
 
 
+# Ingresos por carrera y mes para los tableros de administración: lee
+# ingresos_mensuales (unas cientos de filas) en lugar de sumar payments
+@payment.get("/payment/ingresos")
+def get_ingresos(
+    desde: Optional[str] = Query(None, regex=MES),
+    hasta: Optional[str] = Query(None, regex=MES),
+    carer_id: Optional[int] = None,
+    has_access: dict = Depends(verificar_token),
+    session: Session = Depends(get_db)
+):
+    try:
+        if "iat" not in has_access:
+            return JSONResponse(status_code=401, content=has_access)
+
+        stmt = (
+            select(IngresoMensual, Carer.name)
+            .outerjoin(Carer, Carer.id == IngresoMensual.carer_id)
+            .order_by(IngresoMensual.mes, IngresoMensual.carer_id)
+        )
+        if desde:
+            stmt = stmt.where(IngresoMensual.mes >= datetime.strptime(desde, "%Y-%m"))
+        if hasta:
+            stmt = stmt.where(IngresoMensual.mes <= datetime.strptime(hasta, "%Y-%m"))
+        if carer_id is not None:
+            stmt = stmt.where(IngresoMensual.carer_id == carer_id)
+
+        filas = [
+            {
+                "carer_id": ingreso.carer_id,
+                "carer": nombre,
+                "mes": ingreso.mes.strftime("%Y-%m"),
+                "total": ingreso.total,
+                "cantidad": ingreso.cantidad,
+            }
+            for ingreso, nombre in session.execute(stmt).all()
+        ]
+        return {
+            "ingresos": filas,
+            "total": sum(f["total"] for f in filas),
+            "cantidad": sum(f["cantidad"] for f in filas),
+        }
+    except Exception as e:
+        print("Error al obtener ingresos:", e)
+        return JSONResponse(status_code=500, content={"detail": "Error al obtener ingresos"})
+
 
 @payment.post("/payment/paginated")
-async def get_payments_paginated(
-    req: Request,
-    body: InputPaginatedRequest
+def get_payments_paginated(
+    body: InputPaginatedRequest,
+    has_access: dict = Depends(verificar_token),
+    session: Session = Depends(get_db)
 ):
     try:
         # Verificar token
-        has_access = Security.verify_token(req.headers)
         if "iat" not in has_access:
             return JSONResponse(status_code=401, content=has_access)
 
@@ -253,11 +451,11 @@ def search_payments(
     limit: int = 20, 
     offset: int = 0, 
     user_id: Optional[int] = None,  # ← AGREGAR ESTE PARÁMETRO
-    req: Request = None
+    has_access: dict = Depends(verificar_token),
+    session: Session = Depends(get_db)
 ):
     try:
         # Verificar token
-        has_access = Security.verify_token(req.headers)
         if "iat" not in has_access:
             return JSONResponse(status_code=401, content=has_access)
 
@@ -0,0 +1,133 @@
+# Variante async de routes/payment.py (se monta con DB_ASYNC=true, ver app.py).
+# La lógica se reutiliza vía AsyncSession.run_sync, con el I/O sobre asyncpg.
+from typing import Optional
+from fastapi import APIRouter, Depends, File, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import get_async_db
+from models.modelo import InputPayment, UpdatePayment, InputPaginatedRequest
+from auth.security import verificar_token
+from models import importacion
+import routes.payment as payment_sync
+from routes.payment import MES
+
+payment = APIRouter()
+
+
+@payment.get("/payment/all")
+async def get_all_payments(session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: payment_sync.get_all_payments(session=s)
+    )
+
+
+# Abre su propia conexión para el streaming: no usa la sesión del request
+payment.get("/payment/export")(payment_sync.exportar_pagos)
+
+
+@payment.post("/payment/new")
+async def create_payment(data: InputPayment, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: payment_sync.create_payment(data, session=s)
+    )
+
+
+@payment.post("/payment/import")
+async def importar_pagos(
+    file: UploadFile = File(...),
+    todo_o_nada: bool = Query(False),
+    has_access: dict = Depends(verificar_token),
+    session: AsyncSession = Depends(get_async_db)
+):
+    if "iat" not in has_access:
+        return JSONResponse(status_code=401, content=has_access)
+    # El parseo del CSV es CPU: fuera del event loop
+    try:
+        filas, errores = await run_in_threadpool(importacion.leer_csv, file.file)
+    except importacion.ImportacionInvalida as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    return await session.run_sync(
+        lambda s: payment_sync.resultado_importacion(s, filas, errores, todo_o_nada)
+    )
+
+
+@payment.get("/payment/user/{username}")
+async def payment_user(username: str, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: payment_sync.payment_user(username, session=s)
+    )
+
+
+@payment.put("/payment/{payment_id}")
+async def actualizar_pago(payment_id: int, data: UpdatePayment, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: payment_sync.actualizar_pago(payment_id, data, session=s)
+    )
+
+
+@payment.delete("/payment/{payment_id}")
+async def eliminar_pago(payment_id: int, session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: payment_sync.eliminar_pago(payment_id, session=s)
+    )
+
+
+@payment.get("/payment/pending")
+async def get_usuarios_con_pagos_pendientes(
+    mes: Optional[str] = Query(None, regex=MES),
+    carer_id: Optional[int] = None,
+    limit: int = Query(50, gt=0, le=500),
+    cursor: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: payment_sync.get_usuarios_con_pagos_pendientes(
+            mes=mes, carer_id=carer_id, limit=limit, cursor=cursor, session=s
+        )
+    )
+
+
+@payment.get("/payment/ingresos")
+async def get_ingresos(
+    desde: Optional[str] = Query(None, regex=MES),
+    hasta: Optional[str] = Query(None, regex=MES),
+    carer_id: Optional[int] = None,
+    has_access: dict = Depends(verificar_token),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: payment_sync.get_ingresos(
+            desde=desde, hasta=hasta, carer_id=carer_id, has_access=has_access, session=s
+        )
+    )
+
+
+@payment.post("/payment/paginated")
+async def get_payments_paginated(
+    body: InputPaginatedRequest,
+    has_access: dict = Depends(verificar_token),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: payment_sync.get_payments_paginated(
+            body, has_access=has_access, session=s
+        )
+    )
+
+
+@payment.get("/payment/search")
+async def search_payments(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    user_id: Optional[int] = None,
+    has_access: dict = Depends(verificar_token),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: payment_sync.search_payments(
+            q, limit=limit, offset=offset, user_id=user_id,
+            has_access=has_access, session=s
+        )
+    )
@@ -1,15 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from models.modelo import User, session, UpdateUserInput
-from passlib.context import CryptContext
+from sqlalchemy.orm import Session
+from config.db import get_db
+from models.modelo import User, UpdateUserInput
+from auth.passwords import hash_password
 
 updateUser = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
 @updateUser.put("/update-profile")
-def update_user(data: UpdateUserInput):
+def update_user(data: UpdateUserInput, session: Session = Depends(get_db)):
     try:
         user_db = session.query(User).filter(User.id == data.id).first()
 
@@ -21,7 +20,7 @@ def update_user(data: UpdateUserInput):
             raise HTTPException(status_code=400, detail="El nombre de usuario ya está en uso")
 
         user_db.username = data.username
-        user_db.password = data.password
+        user_db.password = hash_password(data.password)
 
         session.commit()
 
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException, Request, Query
-from models.modelo import AsyncSessionLocal, InputPaginatedRequestFilter, session, User, InputUser, InputLogin, UserDetails, InputPaginatedRequest
-from sqlalchemy.orm import joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query
+from config.db import AsyncSessionLocal, get_async_engine, get_db
+from config.exportar import exportar
+from models import consultas
+from models.directorio import directorio
+from models.modelo import InputPaginatedRequestFilter, User, InputUser, InputLogin, UserDetails, InputPaginatedRequest
+from sqlalchemy.orm import Session, joinedload
 from fastapi.responses import JSONResponse
 from psycopg2 import IntegrityError
-from auth.security import Security
+from auth.security import Security, verificar_token
+from auth.passwords import hash_password, verificar_password
 from typing import Optional
 from sqlalchemy import or_, select
 
@@ -16,29 +21,33 @@ def helloUser():
 
 
 @user.post("/users/new")
-def crear_usuario(user: InputUser):
+def crear_usuario(user: InputUser, session: Session = Depends(get_db)):
+    return registrar_usuario(session, user, hash_password(user.password))
+
+
+def registrar_usuario(session: Session, user: InputUser, password_hash: str):
     try:
         # Verifica si el username ya existe
-        if not validate_user(user.username):
+        if not validate_user(user.username, session):
             return JSONResponse(
                 status_code=400, content={"detail": "El usuario ya existe"}
             )
 
         # Verifica si el email ya existe
-        if not validate_email(user.email):
+        if not validate_email(user.email, session):
             return JSONResponse(
                 status_code=400, content={"detail": "El email ya existe"}
             )
 
         # Verifica si el DNI ya existe
-        dni_existente = session.query(UserDetails).filter_by(dni=user.dni).first()
+        dni_existente = session.execute(consultas.id_por_dni(user.dni)).first()
         if dni_existente:
             return JSONResponse(
                 status_code=400, content={"detail": "El DNI ya está registrado"}
             )
 
         # Crear usuario
-        newUser = User(user.username, user.password)
+        newUser = User(user.username, password_hash)
         newUserDetail = UserDetails(
             dni=user.dni,
             firstName=user.firstName,
@@ -88,45 +97,28 @@ def crear_usuario(user: InputUser):
 
 
 @user.post("/users/loginUser")
-def login_post(usu: InputLogin):
+def login_post(usu: InputLogin, session: Session = Depends(get_db)):
     try:
-        res = (
-            session.query(User)
-            .options(joinedload(User.userdetail))
-            .filter(User.username == usu.username)
-            .first()
-        )
+        res = session.execute(
+            consultas.usuario_con_detalle_por_username(usu.username)
+        ).scalars().first()
 
         if not res:
             return {"status": "error", "message": "Usuario no encontrado"}
 
-        if res.password != usu.password:
+        ok, nuevo_hash = verificar_password(usu.password, res.password)
+        if not ok:
             return {"status": "error", "message": "Contraseña incorrecta"}
 
-        token = Security.generate_token(res)
-
-        if not token:
-            return {"status": "error", "message": "Error en la generación del token"}
-
-        user_data = {
-            "id": res.id,
-            "username": res.username,
-            "email": res.userdetail.email,
-            "dni": res.userdetail.dni,
-            "firstName": res.userdetail.firstName,
-            "lastName": res.userdetail.lastName,
-            "type": res.userdetail.type,
-            "carer_id": res.userdetail.carer_id,
-        }
-
-        return {
-            "status": "success",
-            "token": token,
-            "user": user_data,
-            "message": "Accedido",
-        }
+        # Contraseña en texto plano o con un costo viejo: se regraba hasheada
+        if nuevo_hash:
+            res.password = nuevo_hash
+            session.commit()
+
+        return respuesta_login(res)
 
     except Exception as e:
+        session.rollback()
         print("Error en login:", e)
         return JSONResponse(
             status_code=500,
@@ -134,8 +126,33 @@ def login_post(usu: InputLogin):
         )
 
 
+def respuesta_login(res: User):
+    token = Security.generate_token(res)
+
+    if not token:
+        return {"status": "error", "message": "Error en la generación del token"}
+
+    user_data = {
+        "id": res.id,
+        "username": res.username,
+        "email": res.userdetail.email,
+        "dni": res.userdetail.dni,
+        "firstName": res.userdetail.firstName,
+        "lastName": res.userdetail.lastName,
+        "type": res.userdetail.type,
+        "carer_id": res.userdetail.carer_id,
+    }
+
+    return {
+        "status": "success",
+        "token": token,
+        "user": user_data,
+        "message": "Accedido",
+    }
+
+
 @user.get("/users/alls")
-def obtener_usuario_detalle():
+def obtener_usuario_detalle(session: Session = Depends(get_db)):
     try:
         usuarios = session.query(User).options(joinedload(User.userdetail)).all()
         usuarios_con_detalles = []
@@ -159,54 +176,75 @@ def obtener_usuario_detalle():
         )
 
 
+COLUMNAS_EXPORT_USUARIOS = ["id", "username", "email", "dni", "firstName", "lastName", "type"]
+
+
+# /users/alls en streaming, para tablas grandes (ver config/exportar.py)
+@user.get("/users/export")
+def exportar_usuarios(formato: str = Query("ndjson", regex="^(ndjson|csv)$")):
+    stmt = (
+        select(
+            User.id, User.username, UserDetails.email, UserDetails.dni,
+            UserDetails.firstName, UserDetails.lastName, UserDetails.type,
+        )
+        .join(UserDetails, UserDetails.id == User.id_userdetail)
+        .order_by(User.id)
+    )
+    return exportar(
+        stmt, "usuarios", formato,
+        lambda f: dict(f._mapping),
+        COLUMNAS_EXPORT_USUARIOS,
+        lambda f: list(f),
+    )
+
+
+# Contactos para mensajes: los profesores ven estudiantes y viceversa. Sale del
+# directorio en memoria, paginado: `after` es el último id de la página anterior.
 @user.get("/users/available/{id}")
-def obtener_usuarios_para_mensajes(id: int):
-    usuario = session.query(User).filter(User.id == id).first()
+def obtener_usuarios_para_mensajes(
+    id: int,
+    search: str = "",
+    limit: int = Query(50, gt=0, le=500),
+    after: Optional[int] = None,
+    session: Session = Depends(get_db)
+):
+    usuario = session.execute(consultas.usuario_con_detalle_por_id(id)).scalars().first()
     if not usuario or not usuario.userdetail:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
     tipo = usuario.userdetail.type
 
     if tipo == "profesor":
-        usuarios = (
-            session.query(User)
-            .join(User.userdetail)
-            .filter(UserDetails.type == "estudiante")
-            .all()
-        )
-
+        tipos = ["estudiante"]
     elif tipo == "estudiante":
-        usuarios = (
-            session.query(User)
-            .join(User.userdetail)
-            .filter(UserDetails.type == "profesor")
-            .all()
-        )
+        tipos = ["profesor"]
     else:
-        usuarios = []
+        return []
 
-    return [
-        {
-            "id": u.id,
-            "nombre": f"{u.userdetail.firstName} {u.userdetail.lastName}",
-        }
-        for u in usuarios
-    ]
+    directorio.asegurar_cargado(session)
+    usuarios = directorio.buscar(search, tipos=tipos, limit=limit, despues_de=after)
+    return [{"id": uid, "nombre": nombre} for uid, nombre, _ in usuarios]
 
 
 @user.put("/users/{user_id}")
-def update_user_password(user_id: int, data: dict):
-    usuario = session.query(User).filter(User.id == user_id).first()
+def update_user_password(user_id: int, data: dict, session: Session = Depends(get_db)):
+    if not data.get("password"):
+        raise HTTPException(status_code=400, detail="Falta la contraseña")
+    return guardar_password(session, user_id, hash_password(data["password"]))
+
+
+def guardar_password(session: Session, user_id: int, password_hash: str):
+    usuario = session.execute(consultas.usuario_por_id(user_id)).scalars().first()
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    usuario.password = data.get("password")
+    usuario.password = password_hash
     session.commit()
     return {"message": "Contraseña actualizada"}
 
 
 @user.get("/users/profesores/all")
-def get_profesores():
+def get_profesores(session: Session = Depends(get_db)):
     try:
         # session = SessionLocal()  # Si usás SQLAlchemy puro
         profesores = (
@@ -222,23 +260,23 @@ def get_profesores():
         session.close()
 
 
-def validate_user(username: str) -> bool:
-    return session.query(User).filter_by(username=username).first() is None
+def validate_user(username: str, session: Session) -> bool:
+    return session.execute(consultas.id_por_username(username)).first() is None
 
 
-def validate_email(email: str) -> bool:
-    return session.query(UserDetails).filter_by(email=email).first() is None
+def validate_email(email: str, session: Session) -> bool:
+    return session.execute(consultas.id_por_email(email)).first() is None
 
 
 @user.get("/users/paginated-by-type")
 def getUsersPaginatedByType(
-    req: Request, 
     user_type: str = Query(..., regex="^(profesor|estudiante)$"),
     limit: int = Query(20, gt=0, le=100), 
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    has_access: dict = Depends(verificar_token),
+    session: Session = Depends(get_db)
 ):
     try:
-        has_access = Security.verify_token(req.headers)
         if "iat" in has_access:
             query = (
                 session.query(User)
@@ -280,12 +318,12 @@ def getUsersPaginatedByType(
     
 
 @user.post("/users/paginated")
-async def get_users_paginated(
-    req: Request,
-    body: InputPaginatedRequest
+def get_users_paginated(
+    body: InputPaginatedRequest,
+    has_access: dict = Depends(verificar_token),
+    session: Session = Depends(get_db)
 ):
     try:
-        has_access = Security.verify_token(req.headers)
         if "iat" not in has_access:
             return JSONResponse(status_code=401,
             content=has_access)
@@ -336,14 +374,14 @@ async def get_users_paginated(
 
 @user.get("/users/search-by-type")
 def search_users_by_type(
-    req: Request,
     user_type: str = Query(..., regex="^(profesor|estudiante)$"),
     q: Optional[str] = Query(None),
     limit: int = Query(20, gt=0, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    has_access: dict = Depends(verificar_token),
+    session: Session = Depends(get_db)
 ):
     try:
-        has_access = Security.verify_token(req.headers)
         if "iat" not in has_access:
             return JSONResponse(status_code=401, content=has_access)
 
@@ -394,9 +432,8 @@ def search_users_by_type(
 
 # ***********lo hicimos con el profe*************
 @user.post("/users/paginated/filtered-dict-sync")
-def get_users_paginated_filtered_syng(req: Request, body: InputPaginatedRequest):
+def get_users_paginated_filtered_syng(body: InputPaginatedRequest, has_access: dict = Depends(verificar_token), session: Session = Depends(get_db)):
     try:
-        has_access = Security.verify_token(req.headers)
         if "iat" not in has_access:
             return JSONResponse(status_code=401, content=has_access)
         limit = body.limit
@@ -465,31 +502,30 @@ def get_users_paginated_filtered_syng(req: Request, body: InputPaginatedRequest)
 
 @user.post("/users/paginated/filtered-async")
 async def get_users_paginated_filtered_async(
-    req: Request, body: InputPaginatedRequestFilter
+    body: InputPaginatedRequestFilter, has_access: dict = Depends(verificar_token)
 ):
     try:
-        has_access = Security.verify_token[req.headers]
         if "iat" not in has_access:
             return JSONResponse(status_code=401, content=has_access)
         
         limit = body.limit
         last_seen_id = body.last_seen_id
 
-        async with AsyncSessionLocal() as session:
+        async with AsyncSessionLocal(bind=get_async_engine()) as session:
             #construimos la colsulta
             stmt = (select(User).join(User.userdetail).options(joinedload(User.userdetail)).order_by(User.id))
 
             #Filtros agregados a la consulta 
             if hasattr(body, "filters") and body.filters:
                 if "username" in body.filters:
-                    str_buscado = f"%{body.filters["username"]}%"
+                    str_buscado = f"%{body.filters['username']}%"
                     stmt = stmt.filter(User.username.ilike(str_buscado)) 
             
                 if "type" in body.filters:
                     stmt = stmt.filter(UserDetails.type == body.filters["type"]) 
 
                 if "email" in body.filters:
-                    str_buscado = f"%{body.filters["email"]}%"
+                    str_buscado = f"%{body.filters['email']}%"
                     stmt = stmt.filter(UserDetails.email.ilike(str_buscado)) 
             
             #Agrego filtro del cursor a la consulta
@@ -540,7 +576,7 @@ async def get_users_paginated_filtered_async(
         print("Error al obtener pagina de usuarios", error)
         return JSONResponse(
             status_code=500,
-            countent={
+            content={
                 "message":"Error al obtener pagina de usuarios"
             }
         )
@@ -0,0 +1,153 @@
+# Variante async de routes/user.py (se monta con DB_ASYNC=true, ver app.py).
+# Cada endpoint reutiliza la lógica sync vía AsyncSession.run_sync: el I/O va por
+# asyncpg y el event loop nunca queda bloqueado esperando a la base.
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import get_async_db
+from models.modelo import InputUser, InputLogin, InputPaginatedRequest
+from fastapi.responses import JSONResponse
+from typing import Optional
+from auth.security import verificar_token
+from auth.passwords import hash_password_async, verificar_password_async
+from models import consultas
+import routes.user as user_sync
+
+user = APIRouter()
+
+user.get("/")(user_sync.helloUser)
+
+
+@user.post("/users/new")
+async def crear_usuario(user: InputUser, session: AsyncSession = Depends(get_async_db)):
+    # bcrypt corre en el pool de hashing, fuera del event loop
+    password_hash = await hash_password_async(user.password)
+    return await session.run_sync(
+        lambda s: user_sync.registrar_usuario(s, user, password_hash)
+    )
+
+
+@user.post("/users/loginUser")
+async def login_post(usu: InputLogin, session: AsyncSession = Depends(get_async_db)):
+    try:
+        res = (await session.execute(
+            consultas.usuario_con_detalle_por_username(usu.username)
+        )).scalars().first()
+
+        if not res:
+            return {"status": "error", "message": "Usuario no encontrado"}
+
+        ok, nuevo_hash = await verificar_password_async(usu.password, res.password)
+        if not ok:
+            return {"status": "error", "message": "Contraseña incorrecta"}
+
+        if nuevo_hash:
+            res.password = nuevo_hash
+            await session.commit()
+
+        return user_sync.respuesta_login(res)
+
+    except Exception as e:
+        await session.rollback()
+        print("Error en login:", e)
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "message": "Error interno del servidor"},
+        )
+
+
+@user.get("/users/alls")
+async def obtener_usuario_detalle(session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: user_sync.obtener_usuario_detalle(session=s)
+    )
+
+
+# Abre su propia conexión para el streaming: no usa la sesión del request
+user.get("/users/export")(user_sync.exportar_usuarios)
+
+
+@user.get("/users/available/{id}")
+async def obtener_usuarios_para_mensajes(
+    id: int,
+    search: str = "",
+    limit: int = Query(50, gt=0, le=500),
+    after: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_db),
+):
+    return await session.run_sync(
+        lambda s: user_sync.obtener_usuarios_para_mensajes(
+            id, search=search, limit=limit, after=after, session=s
+        )
+    )
+
+
+@user.put("/users/{user_id}")
+async def update_user_password(user_id: int, data: dict, session: AsyncSession = Depends(get_async_db)):
+    if not data.get("password"):
+        raise HTTPException(status_code=400, detail="Falta la contraseña")
+    password_hash = await hash_password_async(data["password"])
+    return await session.run_sync(
+        lambda s: user_sync.guardar_password(s, user_id, password_hash)
+    )
+
+
+@user.get("/users/profesores/all")
+async def get_profesores(session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(lambda s: user_sync.get_profesores(session=s))
+
+
+@user.get("/users/paginated-by-type")
+async def getUsersPaginatedByType(
+    user_type: str = Query(..., regex="^(profesor|estudiante)$"),
+    limit: int = Query(20, gt=0, le=100),
+    offset: int = Query(0, ge=0),
+    has_access: dict = Depends(verificar_token),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: user_sync.getUsersPaginatedByType(
+            user_type=user_type, limit=limit, offset=offset,
+            has_access=has_access, session=s
+        )
+    )
+
+
+@user.post("/users/paginated")
+async def get_users_paginated(
+    body: InputPaginatedRequest,
+    has_access: dict = Depends(verificar_token),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: user_sync.get_users_paginated(body, has_access=has_access, session=s)
+    )
+
+
+@user.get("/users/search-by-type")
+async def search_users_by_type(
+    user_type: str = Query(..., regex="^(profesor|estudiante)$"),
+    q: Optional[str] = Query(None),
+    limit: int = Query(20, gt=0, le=100),
+    offset: int = Query(0, ge=0),
+    has_access: dict = Depends(verificar_token),
+    session: AsyncSession = Depends(get_async_db)
+):
+    return await session.run_sync(
+        lambda s: user_sync.search_users_by_type(
+            user_type=user_type, q=q, limit=limit, offset=offset,
+            has_access=has_access, session=s
+        )
+    )
+
+
+@user.post("/users/paginated/filtered-dict-sync")
+async def get_users_paginated_filtered_syng(body: InputPaginatedRequest, has_access: dict = Depends(verificar_token), session: AsyncSession = Depends(get_async_db)):
+    return await session.run_sync(
+        lambda s: user_sync.get_users_paginated_filtered_syng(
+            body, has_access=has_access, session=s
+        )
+    )
+
+
+# Este ya era async nativo
+user.post("/users/paginated/filtered-async")(user_sync.get_users_paginated_filtered_async)
@@ -0,0 +1,101 @@
+# Los tests corren contra un SQLite temporal con el esquema de `python -m
+# migrations`, sin réplicas ni Cloudinary (dependencias: requirements-dev.txt).
+# Las variables de entorno se fijan antes de importar la app: config/db.py las
+# lee al importarse. Los benchmarks (test_bench_*.py) sólo corren con
+# TEST_BENCH=1 y reportan con print: `TEST_BENCH=1 pytest -s tests/test_bench_...`.
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="proyecto-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_TMP}/test.db"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["ASYNC_DATABASE_REPLICA_URLS"] = ""
+os.environ["DB_ASYNC"] = "false"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["ADJUNTOS_PENDIENTES_DIR"] = os.path.join(_TMP, "pendientes")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from config.db import get_engine  # noqa: E402
+from migrations.runner import upgrade  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def engine():
+    upgrade()
+    return get_engine()
+
+
+@pytest.fixture(scope="session")
+def client(engine):
+    from app import api_escu
+
+    with TestClient(api_escu) as c:
+        yield c
+
+
+@pytest.fixture
+def capturar(engine):
+    """Context manager que junta los (sql, parámetros) ejecutados dentro del with."""
+
+    @contextmanager
+    def _capturar():
+        consultas = []
+
+        def antes(conn, cursor, statement, parameters, context, executemany):
+            consultas.append((statement, parameters))
+
+        event.listen(engine, "before_cursor_execute", antes)
+        try:
+            yield consultas
+        finally:
+            event.remove(engine, "before_cursor_execute", antes)
+
+    return _capturar
+
+
+@pytest.fixture
+def medir_carga(engine):
+    """Función que corre `clientes` clientes concurrentes contra la app durante
+    `segundos` y devuelve (requests por segundo, latencias en segundos).
+
+    Va por ASGI sin red (httpx.ASGITransport): mide la app, el threadpool y el
+    pool de conexiones, no uvicorn. `pedir(cliente, n)` hace el request n-ésimo
+    de un cliente; cualquier status que no sea 200 hace fallar la medición.
+    """
+    from app import api_escu
+
+    def _medir(pedir, clientes, segundos):
+        async def correr():
+            transporte = httpx.ASGITransport(app=api_escu)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as http:
+                latencias = []
+                fin = time.perf_counter() + segundos
+
+                async def cliente(numero):
+                    n = numero
+                    while time.perf_counter() < fin:
+                        inicio = time.perf_counter()
+                        respuesta = await pedir(http, n)
+                        latencias.append(time.perf_counter() - inicio)
+                        assert respuesta.status_code == 200, respuesta.text
+                        n += clientes
+
+                inicio = time.perf_counter()
+                await asyncio.gather(*(cliente(i) for i in range(clientes)))
+                return len(latencias) / (time.perf_counter() - inicio), latencias
+
+        return asyncio.run(correr())
+
+    return _medir
@@ -0,0 +1,40 @@
+# GC de adjuntos (user-014): el barrido sólo borra archivos huérfanos con el
+# nombre que genera LocalStorage; lo que no creó la app queda en uploads/.
+import os
+import time
+import uuid
+
+import config.db as db
+from models import adjuntos
+from models.modelo import Attachment
+
+
+def _viejo(directorio, nombre):
+    ruta = directorio / nombre
+    ruta.write_bytes(b"x")
+    antes = time.time() - adjuntos.ADJUNTOS_GC_GRACIA - 60
+    os.utime(ruta, (antes, antes))
+    return nombre
+
+
+def test_barrido_solo_borra_huerfanos_generados_por_la_app(engine, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    huerfano = _viejo(uploads, f"{uuid.uuid4().hex}_huerfano.txt")
+    referenciado = _viejo(uploads, f"{uuid.uuid4().hex}_referenciado.txt")
+    ajenos = [
+        _viejo(uploads, "1756335493_448da7c03473943903287e9e01314fd5.jpg"),
+        _viejo(uploads, "logo.png"),
+    ]
+    with db.SessionLocal(bind=engine) as session:
+        session.add(Attachment(
+            hash=uuid.uuid4().hex * 2, size=1, ref_count=1,
+            file_url=f"http://localhost:8000/uploads/{referenciado}",
+        ))
+        session.commit()
+
+    assert adjuntos.barrer_huerfanos("uploads") == 1
+
+    assert sorted(os.listdir(uploads)) == sorted([referenciado, *ajenos])
+    assert huerfano not in os.listdir(uploads)
@@ -0,0 +1,65 @@
+# Benchmark (user-003): tiempo de import de app.py y tiempo hasta el primer
+# request, cada uno en un intérprete nuevo (arranque en frío).
+#
+#   TEST_BENCH=1 BENCH_ARRANQUES=5 pytest -s tests/test_bench_arranque.py
+#
+# Importar la app no abre conexiones: también se mide con una base inalcanzable.
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_BENCH"), reason="benchmark: correr con TEST_BENCH=1")
+
+ARRANQUES = int(os.getenv("BENCH_ARRANQUES", "5"))
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# El import de TestClient (httpx) queda fuera de la medición
+_ARRANCAR = """
+import json, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+if {pedir}:
+    from fastapi.testclient import TestClient
+    antes_cliente = time.perf_counter()
+    with TestClient(app.api_escu) as cliente:
+        listo = time.perf_counter()
+        assert cliente.get("/carer/all").status_code == 200
+        primero = time.perf_counter()
+    fuera = antes_cliente - importado
+    print(json.dumps({{"import": importado - inicio, "arranque": listo - inicio - fuera,
+                      "primer_request": primero - inicio - fuera}}))
+else:
+    print(json.dumps({{"import": importado - inicio}}))
+"""
+
+
+def _arrancar(env, pedir=True):
+    salida = subprocess.run(
+        [sys.executable, "-c", _ARRANCAR.format(pedir=pedir)],
+        cwd=RAIZ, env=env, capture_output=True, text=True, timeout=120, check=True,
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def _mediana(muestras, clave):
+    return statistics.median(m[clave] for m in muestras) * 1000
+
+
+def test_import_y_primer_request(engine):
+    muestras = [_arrancar(dict(os.environ)) for _ in range(ARRANQUES)]
+
+    sin_base = dict(os.environ)
+    sin_base["DATABASE_URL"] = "postgresql://bench@127.0.0.1:1/inalcanzable"
+    sin_base["ASYNC_DATABASE_URL"] = "postgresql+asyncpg://bench@127.0.0.1:1/inalcanzable"
+    muestras_sin_base = [_arrancar(sin_base, pedir=False) for _ in range(ARRANQUES)]
+
+    print(f"\n{ARRANQUES} arranques en frío (mediana, ms)")
+    print(f"  import app.py:                {_mediana(muestras, 'import'):8.1f}")
+    print(f"  import con base inalcanzable: {_mediana(muestras_sin_base, 'import'):8.1f}")
+    print(f"  lifespan listo:               {_mediana(muestras, 'arranque'):8.1f}")
+    print(f"  primer request respondido:    {_mediana(muestras, 'primer_request'):8.1f}")
@@ -0,0 +1,65 @@
+# Benchmark (user-007): costo de autenticar un request con el cache de tokens
+# verificados de Security y sin él (decode HS256 en cada llamada).
+#
+#   TEST_BENCH=1 BENCH_LLAMADAS=20000 BENCH_SEGUNDOS=3 pytest -s tests/test_bench_auth.py
+import os
+import statistics
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from auth.security import Security
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_BENCH"), reason="benchmark: correr con TEST_BENCH=1")
+
+LLAMADAS = int(os.getenv("BENCH_LLAMADAS", "20000"))
+SEGUNDOS = float(os.getenv("BENCH_SEGUNDOS", "3"))
+
+
+@pytest.fixture
+def sin_cache(monkeypatch):
+    """Deshabilita el cache: cada verify_token vuelve a decodificar el JWT."""
+
+    def aplicar():
+        monkeypatch.setattr(Security, "_cache_get", classmethod(lambda cls, token: None))
+        monkeypatch.setattr(Security, "_cache_put", classmethod(lambda cls, token, payload: None))
+
+    return aplicar
+
+
+def _headers():
+    token = Security.generate_token(SimpleNamespace(username="bench_auth"))
+    return {"authorization": f"Bearer {token}"}
+
+
+def _por_llamada(headers):
+    assert "iat" in Security.verify_token(headers)
+    inicio = time.perf_counter()
+    for _ in range(LLAMADAS):
+        Security.verify_token(headers)
+    return (time.perf_counter() - inicio) / LLAMADAS * 1e6
+
+
+def _por_request(medir_carga, headers):
+    async def pedir(http, n):
+        return await http.get("/payment/search", params={"q": "bench"}, headers=headers)
+
+    _, latencias = medir_carga(pedir, 1, SEGUNDOS)
+    return statistics.median(latencias) * 1e6
+
+
+def test_overhead_de_autenticacion(medir_carga, sin_cache):
+    headers = _headers()
+    con_cache = _por_llamada(headers)
+    request_con_cache = _por_request(medir_carga, headers)
+    sin_cache()
+    decode = _por_llamada(headers)
+    request_sin_cache = _por_request(medir_carga, headers)
+
+    print(f"\nverify_token, {LLAMADAS} llamadas (µs por llamada)")
+    print(f"  con cache: {con_cache:8.1f}")
+    print(f"  sin cache: {decode:8.1f}")
+    print("GET /payment/search autenticado, 1 cliente (mediana, µs por request)")
+    print(f"  con cache: {request_con_cache:8.1f}")
+    print(f"  sin cache: {request_sin_cache:8.1f}")
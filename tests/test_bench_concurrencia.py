@@ -0,0 +1,69 @@
+# Benchmark (user-001): throughput con clientes concurrentes. Cada request abre
+# su propia sesión del pool (DB_POOL_SIZE + DB_MAX_OVERFLOW conexiones), así que
+# las lecturas no se serializan detrás de una sesión global.
+#
+#   TEST_BENCH=1 BENCH_CLIENTES=1,4,16 BENCH_SEGUNDOS=3 pytest -s tests/test_bench_concurrencia.py
+#
+# Contra SQLite el resultado está acotado por el GIL; el número que importa es
+# el de PostgreSQL (DATABASE_URL), donde la espera de la base libera el hilo.
+import os
+import statistics
+
+import pytest
+from sqlalchemy import insert
+
+import config.db as db
+from models.modelo import Conversation, Message, User, UserDetails
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_BENCH"), reason="benchmark: correr con TEST_BENCH=1")
+
+CLIENTES = [int(c) for c in os.getenv("BENCH_CLIENTES", "1,2,4,8,16").split(",")]
+SEGUNDOS = float(os.getenv("BENCH_SEGUNDOS", "3"))
+USUARIOS = 200
+# ids altos para no chocar con los usuarios que crean los otros tests
+BASE_ID = 300000
+
+
+@pytest.fixture(scope="module")
+def usuarios(engine):
+    ids = list(range(BASE_ID, BASE_ID + USUARIOS))
+    with engine.begin() as conn:
+        conn.execute(insert(UserDetails), [
+            {"id": i, "dni": i, "firstName": f"B{i}", "lastName": "Bench",
+             "type": "estudiante", "email": f"{i}@bench"}
+            for i in ids
+        ])
+        conn.execute(insert(User), [
+            {"id": i, "username": f"bench{i}", "password": "x", "id_userdetail": i}
+            for i in ids
+        ])
+        conn.execute(insert(Message), [
+            {"id": BASE_ID + n, "sender_id": ids[n], "receiver_id": ids[n - 1], "content": "hola"}
+            for n in range(USUARIOS)
+        ])
+        conn.execute(insert(Conversation), [
+            {"user_a_id": min(ids[n], ids[n - 1]), "user_b_id": max(ids[n], ids[n - 1]),
+             "last_message_id": BASE_ID + n, "unread_a": 1, "unread_b": 0,
+             "read_a_id": 0, "read_b_id": 0}
+            for n in range(USUARIOS)
+        ])
+    return ids
+
+
+def test_throughput_escala_con_clientes_concurrentes(usuarios, medir_carga):
+    async def pedir(http, n):
+        user_id = usuarios[n % len(usuarios)]
+        if n % 2:
+            return await http.get(f"/messages/unread/{user_id}")
+        return await http.get(f"/messages/conversations/{user_id}")
+
+    print(f"\npool: {db.DB_POOL_SIZE} + {db.DB_MAX_OVERFLOW} conexiones, {db.get_engine().url.drivername}")
+    print(f"{'clientes':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'vs 1':>6}")
+    base = None
+    for clientes in CLIENTES:
+        por_segundo, latencias = medir_carga(pedir, clientes, SEGUNDOS)
+        base = base or por_segundo
+        p50 = statistics.median(latencias) * 1000
+        p95 = statistics.quantiles(latencias, n=20)[-1] * 1000
+        print(f"{clientes:>8} {por_segundo:>9.0f} {p50:>8.2f} {p95:>8.2f} {por_segundo / base:>5.2f}x")
+        assert por_segundo > 0
@@ -0,0 +1,76 @@
+# Benchmark (user-006): costo por llamada de las consultas calientes armadas
+# con session.query() en cada request (antes) contra los lambda statements de
+# models/consultas.py (después). La parte de la base es la misma en los dos
+# casos: la diferencia es el armado y la compilación en Python.
+#
+#   TEST_BENCH=1 BENCH_LLAMADAS=5000 pytest -s tests/test_bench_consultas.py
+import os
+import time
+
+import pytest
+from sqlalchemy.orm import joinedload
+
+import config.db as db
+from models import consultas
+from models.modelo import User, UserDetails
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_BENCH"), reason="benchmark: correr con TEST_BENCH=1")
+
+LLAMADAS = int(os.getenv("BENCH_LLAMADAS", "5000"))
+
+
+@pytest.fixture(scope="module")
+def usuario(engine):
+    with db.SessionLocal(bind=engine) as session:
+        nuevo = User("bench_consultas", "x")
+        nuevo.userdetail = UserDetails(
+            dni=390001, firstName="Bench", lastName="Consultas",
+            type="estudiante", email="bench@consultas",
+        )
+        session.add(nuevo)
+        session.commit()
+        return nuevo.id, nuevo.username
+
+
+def _por_llamada(session, consulta):
+    consulta()  # calienta caches de compilación
+    inicio = time.perf_counter()
+    for _ in range(LLAMADAS):
+        consulta()
+        # sin identity map compartido entre llamadas, como en requests distintos
+        session.expunge_all()
+    return (time.perf_counter() - inicio) / LLAMADAS * 1e6
+
+
+def test_overhead_por_llamada(engine, usuario):
+    user_id, username = usuario
+    with db.SessionLocal(bind=engine) as s:
+        casos = {
+            "login (usuario + detalle por username)": (
+                lambda: s.query(User).options(joinedload(User.userdetail))
+                .filter(User.username == username).first(),
+                lambda: s.execute(consultas.usuario_con_detalle_por_username(username)).scalars().first(),
+            ),
+            "usuario por id": (
+                lambda: s.query(User).filter(User.id == user_id).first(),
+                lambda: s.execute(consultas.usuario_por_id(user_id)).scalars().first(),
+            ),
+            "validate_user (id por username)": (
+                lambda: s.query(User.id).filter(User.username == username).first(),
+                lambda: s.execute(consultas.id_por_username(username)).first(),
+            ),
+            "nombre del remitente": (
+                lambda: s.query(UserDetails.firstName, UserDetails.lastName)
+                .join(User, User.id_userdetail == UserDetails.id)
+                .filter(User.id == user_id).first(),
+                lambda: s.execute(consultas.nombre_de_usuario(user_id)).first(),
+            ),
+        }
+
+        print(f"\n{LLAMADAS} llamadas por consulta (µs por llamada)")
+        print(f"{'consulta':<40} {'antes':>8} {'después':>8} {'ahorro':>8}")
+        for nombre, (antes, despues) in casos.items():
+            assert antes() == despues()
+            t_antes = _por_llamada(s, antes)
+            t_despues = _por_llamada(s, despues)
+            print(f"{nombre:<40} {t_antes:>8.1f} {t_despues:>8.1f} {1 - t_despues / t_antes:>7.0%}")
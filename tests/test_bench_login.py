@@ -0,0 +1,51 @@
+# Benchmark (user-008): logins por segundo con bcrypt a un costo configurable.
+# El hash corre en el pool de auth/passwords.py (HASH_WORKERS hilos), así que
+# el throughput lo fija ese pool y no la cantidad de clientes.
+#
+#   TEST_BENCH=1 BENCH_BCRYPT_ROUNDS=10 BENCH_CLIENTES=1,4,16 pytest -s tests/test_bench_login.py
+import os
+import statistics
+
+import pytest
+from passlib.context import CryptContext
+
+import config.db as db
+from auth import passwords
+from models.modelo import User, UserDetails
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_BENCH"), reason="benchmark: correr con TEST_BENCH=1")
+
+ROUNDS = int(os.getenv("BENCH_BCRYPT_ROUNDS", str(passwords.BCRYPT_ROUNDS)))
+CLIENTES = [int(c) for c in os.getenv("BENCH_CLIENTES", "1,4,16").split(",")]
+SEGUNDOS = float(os.getenv("BENCH_SEGUNDOS", "5"))
+PASSWORD = "clave-de-bench"
+
+
+@pytest.fixture
+def usuario(engine, monkeypatch):
+    contexto = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=ROUNDS)
+    monkeypatch.setattr(passwords, "pwd_context", contexto)
+    with db.SessionLocal(bind=engine) as session:
+        nuevo = User(f"bench_login_{ROUNDS}", contexto.hash(PASSWORD))
+        nuevo.userdetail = UserDetails(
+            dni=390100 + ROUNDS, firstName="Bench", lastName="Login",
+            type="estudiante", email=f"bench{ROUNDS}@login",
+        )
+        session.add(nuevo)
+        session.commit()
+        return nuevo.username
+
+
+def test_logins_por_segundo(usuario, medir_carga):
+    async def pedir(http, n):
+        respuesta = await http.post("/users/loginUser", json={"username": usuario, "password": PASSWORD})
+        assert respuesta.json().get("status") != "error", respuesta.text
+        return respuesta
+
+    print(f"\nbcrypt rounds={ROUNDS}, HASH_WORKERS={passwords.HASH_WORKERS}")
+    print(f"{'clientes':>8} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for clientes in CLIENTES:
+        por_segundo, latencias = medir_carga(pedir, clientes, SEGUNDOS)
+        p50 = statistics.median(latencias) * 1000
+        p95 = statistics.quantiles(latencias, n=20)[-1] * 1000 if len(latencias) > 1 else p50
+        print(f"{clientes:>8} {por_segundo:>9.1f} {p50:>8.1f} {p95:>8.1f}")
@@ -0,0 +1,110 @@
+# Push en tiempo real (user-011): sólo el dueño del token se suscribe a sus
+# eventos, y una nota que no cambió ninguna fila no se publica.
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import config.db as db
+from auth.security import Security
+from config import pubsub
+from models.modelo import Carer, Materia, User, UserDetails, alumno_materia
+
+_numero = itertools.count(1)
+
+
+def _crear_usuario(session, tipo):
+    n = next(_numero)
+    usuario = User(f"eventos_{tipo}_{n}", "x")
+    usuario.userdetail = UserDetails(
+        dni=700000 + n, firstName=f"{tipo.capitalize()}{n}", lastName="Test",
+        type=tipo, email=f"{tipo}{n}@eventos",
+    )
+    session.add(usuario)
+    session.flush()
+    return usuario
+
+
+@pytest.fixture
+def escenario(engine):
+    sufijo = next(_numero)
+    with db.SessionLocal(bind=engine) as session:
+        carrera = Carer(f"Carrera eventos {sufijo}")
+        session.add(carrera)
+        session.flush()
+        materia = Materia(name=f"Materia eventos {sufijo}", carer_id=carrera.id)
+        session.add(materia)
+        inscripto = _crear_usuario(session, "estudiante")
+        otro = _crear_usuario(session, "estudiante")
+        session.flush()
+        session.execute(alumno_materia.insert().values(user_id=inscripto.id, materia_id=materia.id))
+        datos = {
+            "materia_id": materia.id,
+            "inscripto": (inscripto.id, Security.generate_token(inscripto)),
+            "otro": (otro.id, Security.generate_token(otro)),
+        }
+        session.commit()
+    return datos
+
+
+def test_ws_sin_token_se_rechaza(client, escenario):
+    user_id, _ = escenario["inscripto"]
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect(f"/messages/ws/{user_id}"):
+            pass
+    assert e.value.code == 1008
+
+
+def test_ws_con_token_de_otro_usuario_se_rechaza(client, escenario):
+    user_id, _ = escenario["inscripto"]
+    _, token_otro = escenario["otro"]
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect(f"/messages/ws/{user_id}?token={token_otro}"):
+            pass
+    assert e.value.code == 1008
+
+
+def test_sse_valida_el_token(client, escenario):
+    user_id, _ = escenario["inscripto"]
+    _, token_otro = escenario["otro"]
+    assert client.get(f"/messages/stream/{user_id}").status_code == 401
+    token_invalido = Security.generate_token(SimpleNamespace(username="no_existe"))
+    assert client.get(f"/messages/stream/{user_id}?token={token_invalido}").status_code == 403
+    respuesta = client.get(
+        f"/messages/stream/{user_id}", headers={"Authorization": f"Bearer {token_otro}"}
+    )
+    assert respuesta.status_code == 403
+
+
+def test_ws_recibe_eventos_con_token_propio(client, escenario):
+    user_id, token = escenario["inscripto"]
+    materia_id = escenario["materia_id"]
+    with client.websocket_connect(
+        f"/messages/ws/{user_id}", headers={"Authorization": f"Bearer {token}"}
+    ) as ws:
+        client.post(f"/materia/{materia_id}/notas", json=[{"user_id": user_id, "nota": 9}])
+        assert ws.receive_json() == {"tipo": "nota", "materia_id": materia_id, "nota": 9}
+
+
+class _Registro(pubsub.PubSubBackend):
+    def __init__(self):
+        self.publicados = []
+
+    def publicar(self, user_id, evento):
+        self.publicados.append((user_id, evento))
+
+
+def test_nota_sin_filas_actualizadas_no_se_publica(client, escenario, monkeypatch):
+    user_id, _ = escenario["inscripto"]
+    otro_id, _ = escenario["otro"]
+    registro = _Registro()
+    monkeypatch.setattr(pubsub, "backend", registro)
+
+    # `otro` no está inscripto en la materia: el UPDATE no toca ninguna fila
+    client.post(f"/materia/{escenario['materia_id']}/notas", json=[
+        {"user_id": otro_id, "nota": 4},
+        {"user_id": user_id, "nota": 9},
+    ])
+
+    assert [u for u, _ in registro.publicados] == [user_id]
@@ -0,0 +1,92 @@
+# Exportación en streaming (user-023): exportar muchos pagos no puede juntar el
+# resultado en memoria. Se llama a la app ASGI directamente (el TestClient
+# guarda el cuerpo entero) y se descarta cada chunk al recibirlo.
+#
+# Por defecto exporta 50.000 pagos: materializarlos ya pasaría el tope. La
+# corrida con un millón (unos minutos, por tracemalloc) es a pedido:
+#     TEST_EXPORT_PAGOS=1000000 python -m pytest tests/test_exportar.py
+import asyncio
+import datetime
+import os
+import tracemalloc
+
+import pytest
+from sqlalchemy import delete, func, insert, select
+
+from models.modelo import Carer, Payment, User, UserDetails
+
+PAGOS = int(os.getenv("TEST_EXPORT_PAGOS", "50000"))
+# El pico medido es ~1,6 MiB con 50.000 pagos y con un millón (~220 MB de NDJSON)
+MAX_PICO_BYTES = 8 * 1024 * 1024
+USUARIO_ID = 900000
+
+
+@pytest.fixture(scope="module")
+def pagos(engine):
+    mes = datetime.datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        carer_id = conn.execute(insert(Carer).values(name="Exportación")).inserted_primary_key[0]
+        conn.execute(insert(UserDetails).values(
+            id=USUARIO_ID, dni=USUARIO_ID, firstName="Export", lastName="Test",
+            type="estudiante", email="export@test", carer_id=carer_id,
+        ))
+        conn.execute(insert(User).values(
+            id=USUARIO_ID, username="export", password="x", id_userdetail=USUARIO_ID,
+        ))
+        lote = 50000
+        for inicio in range(0, PAGOS, lote):
+            conn.execute(insert(Payment), [
+                {"carer_id": carer_id, "user_id": USUARIO_ID, "amount": i,
+                 "affected_month": mes, "created_at": mes}
+                for i in range(inicio, min(inicio + lote, PAGOS))
+            ])
+        total = conn.execute(select(func.count()).select_from(Payment)).scalar()
+    yield total
+    with engine.begin() as conn:
+        conn.execute(delete(Payment).where(Payment.user_id == USUARIO_ID))
+
+
+def _exportar(path, query):
+    """(status, bytes, líneas, pico de memoria) de un GET sin guardar el cuerpo."""
+    from app import api_escu
+
+    resultado = {"status": None, "bytes": 0, "lineas": 0}
+
+    pedido = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if pedido:
+            return pedido.pop()
+        # StreamingResponse escucha la desconexión mientras manda: nunca llega
+        await asyncio.Event().wait()
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.start":
+            resultado["status"] = mensaje["status"]
+        elif mensaje["type"] == "http.response.body":
+            cuerpo = mensaje.get("body", b"")
+            resultado["bytes"] += len(cuerpo)
+            resultado["lineas"] += cuerpo.count(b"\n")
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "headers": [(b"host", b"test")],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    tracemalloc.start()
+    try:
+        asyncio.run(api_escu(scope, receive, send))
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado["status"], resultado["bytes"], resultado["lineas"], pico
+
+
+@pytest.mark.parametrize("formato,encabezado", [("ndjson", 0), ("csv", 1)])
+def test_exportar_pagos_con_memoria_acotada(pagos, formato, encabezado):
+    status, enviados, lineas, pico = _exportar("/payment/export", f"formato={formato}")
+
+    assert status == 200
+    assert lineas == pagos + encabezado
+    assert pico < MAX_PICO_BYTES, f"pico de {pico} bytes exportando {enviados}"
@@ -0,0 +1,38 @@
+# Importación masiva de pagos (user-025): un CSV que no se puede leer es un 400,
+# nunca un 500.
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from auth.security import Security
+
+
+@pytest.fixture(scope="module")
+def auth():
+    token = Security.generate_token(SimpleNamespace(username="importador"))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _importar(client, auth, contenido: bytes):
+    return client.post(
+        "/payment/import", headers=auth,
+        files={"file": ("pagos.csv", io.BytesIO(contenido), "text/csv")},
+    )
+
+
+def test_campo_mas_largo_que_el_limite_de_csv_es_400(client, auth):
+    contenido = b"user_id,carer_id,amount,affected_month\n1,1,\"" + b"9" * 200000 + b"\",2024-03\n"
+    respuesta = _importar(client, auth, contenido)
+    assert respuesta.status_code == 400
+    assert "CSV inválido" in respuesta.json()["detail"]
+
+
+def test_no_utf8_es_400(client, auth):
+    respuesta = _importar(client, auth, "user_id,carer_id,amount,affected_month\n1,1,5,2024-03 ñ\n".encode("latin-1"))
+    assert respuesta.status_code == 400
+
+
+def test_sin_token_es_401(client):
+    respuesta = client.post("/payment/import", files={"file": ("p.csv", b"x", "text/csv")})
+    assert respuesta.status_code == 401
@@ -0,0 +1,216 @@
+# Regresión de planes (user-004): con un dataset grande, las consultas calientes
+# de mensajes (bandeja, chat, no leídos, historial), de pagos (pendientes,
+# paginado por fecha) y de notificaciones tienen que buscar por índice y no
+# recorrer las tablas enteras.
+import datetime
+import random
+import re
+
+import pytest
+from sqlalchemy import insert, text
+
+from auth.security import Security
+from models.modelo import Carer, Conversation, Message, Payment, User, UserDetails
+
+USUARIOS = 2000
+# Tipos repartidos por igual: así las estadísticas de userdetails.type se
+# parecen a las de producción (varios tipos, no sólo estudiantes)
+TIPOS = ("estudiante", "profesor", "preceptor", "administrativo")
+MENSAJES = 60000
+PAGOS = 40000
+# ids altos para no chocar con los usuarios que crean los otros tests
+BASE_ID = 100000
+
+
+@pytest.fixture(scope="module")
+def dataset(engine):
+    azar = random.Random(4)
+    ahora = datetime.datetime.utcnow()
+    ids = list(range(BASE_ID, BASE_ID + USUARIOS))
+    mensajes, resumen = [], {}
+    for i in range(MENSAJES):
+        sender, receiver = azar.sample(ids, 2)
+        msg_id = BASE_ID + i
+        mensajes.append({
+            "id": msg_id,
+            "sender_id": sender,
+            "receiver_id": receiver,
+            "content": f"mensaje {i}",
+            "timestamp": ahora - datetime.timedelta(seconds=MENSAJES - i),
+        })
+        a, b = min(sender, receiver), max(sender, receiver)
+        conv = resumen.setdefault((a, b), {
+            "user_a_id": a, "user_b_id": b, "unread_a": 0, "unread_b": 0,
+            "read_a_id": 0, "read_b_id": 0,
+        })
+        conv["last_message_id"] = msg_id
+        conv["last_timestamp"] = mensajes[-1]["timestamp"]
+        conv["unread_a" if receiver == a else "unread_b"] += 1
+
+    # Un pago por mes para cada estudiante, salvo algunos que quedan pendientes
+    mes = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    estudiantes = ids[::len(TIPOS)]
+    pagos = []
+    for i in range(PAGOS):
+        user_id = estudiantes[i % len(estudiantes)]
+        atras = i // len(estudiantes)
+        pagos.append({
+            "id": BASE_ID + i,
+            "carer_id": BASE_ID,
+            "user_id": user_id,
+            "amount": 1000,
+            "affected_month": (mes - datetime.timedelta(days=31 * atras)).replace(day=1),
+            "created_at": ahora - datetime.timedelta(days=31 * atras, seconds=i),
+        })
+    pagos = [p for p in pagos if not (p["user_id"] % 10 == 0 and p["affected_month"] == mes)]
+
+    with engine.begin() as conn:
+        conn.execute(insert(Carer), [{"id": BASE_ID, "name": "Carrera índices"}])
+        conn.execute(insert(UserDetails), [
+            {"id": i, "dni": i, "firstName": f"N{i}", "lastName": "Test",
+             "type": TIPOS[n % len(TIPOS)], "email": f"{i}@indices", "carer_id": BASE_ID}
+            for n, i in enumerate(ids)
+        ])
+        conn.execute(insert(User), [
+            {"id": i, "username": f"indices{i}", "password": "x", "id_userdetail": i}
+            for i in ids
+        ])
+        conn.execute(insert(Message), mensajes)
+        conn.execute(insert(Conversation), list(resumen.values()))
+        conn.execute(insert(Payment), pagos)
+        # con estadísticas SQLite elige el plan como lo haría en producción
+        conn.execute(text("ANALYZE"))
+    return ids[0], ids[1]
+
+
+def _planes(engine, consultas, tabla, sentencia="SELECT"):
+    """Plan (EXPLAIN QUERY PLAN) de cada consulta capturada que lee `tabla`."""
+    planes = []
+    with engine.connect() as conn:
+        for sql, parametros in consultas:
+            if not sql.lstrip().upper().startswith(sentencia):
+                continue
+            if not re.search(rf"\bFROM {tabla}\b|\bJOIN {tabla}\b", sql):
+                continue
+            filas = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parametros).all()
+            planes.append("\n".join(f[-1] for f in filas))
+    assert planes, f"no se ejecutó ninguna consulta sobre {tabla}"
+    return planes
+
+
+def _sin_scan(plan, tabla):
+    # SQLite: "SCAN t" recorre la tabla; "SEARCH t USING INDEX" busca por índice
+    return not re.search(rf"^SCAN {tabla}\b", plan, re.MULTILINE)
+
+
+def test_bandeja_usa_indices_de_conversations(client, engine, dataset, capturar):
+    user_id, _ = dataset
+    with capturar() as consultas:
+        respuesta = client.get(f"/messages/conversations/{user_id}")
+    assert respuesta.status_code == 200
+    assert respuesta.json()["conversations"]
+
+    for plan in _planes(engine, consultas, "conversations"):
+        assert _sin_scan(plan, "conversations"), plan
+        assert _sin_scan(plan, "messages"), plan
+        assert "ix_conversations_a_last" in plan or "ix_conversations_b_last" in plan, plan
+
+
+def test_no_leidos_usa_indices_de_conversations(client, engine, dataset, capturar):
+    user_id, _ = dataset
+    with capturar() as consultas:
+        respuesta = client.get(f"/messages/unread/{user_id}")
+    assert respuesta.status_code == 200
+
+    for plan in _planes(engine, consultas, "conversations"):
+        assert _sin_scan(plan, "conversations"), plan
+
+
+def test_chat_usa_indice_sender_receiver(client, engine, dataset, capturar):
+    user_id, otro_id = dataset
+    nuevo = client.post("/messages/send", data={
+        "sender_id": user_id, "receiver_id": otro_id, "content": "para borrar",
+    }).json()
+    # Borrar el último mensaje del chat busca el anterior del mismo par
+    with capturar() as consultas:
+        respuesta = client.delete(f"/messages/{nuevo['id']}")
+    assert respuesta.status_code == 200
+
+    planes = [p for p in _planes(engine, consultas, "messages") if "MULTI-INDEX OR" in p]
+    assert planes, "no se buscó el mensaje anterior del chat"
+    for plan in planes:
+        assert _sin_scan(plan, "messages"), plan
+        assert "ix_messages_sender_receiver_ts" in plan, plan
+
+
+def test_borrar_chat_usa_indice_sender_receiver(client, engine, dataset, capturar):
+    user_id, otro_id = dataset
+    client.post("/messages/send", data={"sender_id": otro_id, "receiver_id": user_id, "content": "chau"})
+    with capturar() as consultas:
+        respuesta = client.delete(f"/messages/chat/{user_id}/{otro_id}")
+    assert respuesta.status_code == 200
+
+    for plan in _planes(engine, consultas, "messages", sentencia="DELETE"):
+        assert _sin_scan(plan, "messages"), plan
+        assert "ix_messages_sender_receiver_ts" in plan, plan
+
+
+def test_historial_usa_indices_de_messages(client, engine, dataset, capturar):
+    user_id, _ = dataset
+    with capturar() as consultas:
+        respuesta = client.get(f"/messages/{user_id}")
+    assert respuesta.status_code == 200
+    assert respuesta.json()
+
+    for plan in _planes(engine, consultas, "messages"):
+        assert _sin_scan(plan, "messages"), plan
+
+
+def test_notificaciones_usan_indices_de_messages_y_payments(client, engine, dataset, capturar):
+    user_id, _ = dataset
+    with capturar() as consultas:
+        respuesta = client.get(f"/notifications/{user_id}/estudiante")
+    assert respuesta.status_code == 200
+    assert {n["tipo"] for n in respuesta.json()} >= {"mensaje", "pago"}
+
+    for plan in _planes(engine, consultas, "messages"):
+        assert _sin_scan(plan, "messages"), plan
+        assert _sin_scan(plan, "payments"), plan
+        # último mensaje recibido y último pago del usuario
+        assert "ix_messages_receiver_ts" in plan, plan
+        assert "ix_payments_user_created" in plan, plan
+
+
+def test_pendientes_usan_indices_de_payments_y_userdetails(client, engine, dataset, capturar):
+    with capturar() as consultas:
+        respuesta = client.get("/payment/pending")
+    assert respuesta.status_code == 200
+    assert respuesta.json()["total"] > 0
+
+    planes = _planes(engine, consultas, "payments")
+    for plan in planes:
+        assert _sin_scan(plan, "payments"), plan
+        assert _sin_scan(plan, "userdetails"), plan
+        # NOT EXISTS por estudiante y rango de affected_month
+        assert "ix_payments_user_month" in plan, plan
+    # El conteo por carrera arranca por los estudiantes; la página recorre
+    # usuarios por id (keyset) y corta en `limit`
+    assert any("ix_userdetails_type" in plan for plan in planes), planes
+
+
+def test_paginado_por_fecha_usa_indice_created_at(client, engine, dataset, capturar):
+    hasta = datetime.datetime.utcnow()
+    desde = hasta - datetime.timedelta(days=3)
+    token = Security.generate_token(User("indices_paginado", "x"))
+    with capturar() as consultas:
+        respuesta = client.post(
+            "/payment/paginated",
+            json={"start_date": desde.isoformat(), "end_date": hasta.isoformat()},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    assert respuesta.status_code == 200
+    assert respuesta.json()["payments"]
+
+    for plan in _planes(engine, consultas, "payments"):
+        assert _sin_scan(plan, "payments"), plan
+        assert "ix_payments_created_at" in plan, plan
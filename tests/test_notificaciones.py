@@ -0,0 +1,154 @@
+# Cache de notificaciones (user-020): la lectura repetida sale de memoria y
+# cualquier escritura que cambie las notificaciones se ve en la lectura siguiente.
+import itertools
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, select
+
+import config.db as db
+from models import notificaciones
+from models.modelo import Carer, Materia, Message, User, UserDetails
+
+_numero = itertools.count(1)
+
+
+def _crear_usuario(session, tipo, carer_id=None):
+    n = next(_numero)
+    usuario = User(f"notif_{tipo}_{n}", "x")
+    usuario.userdetail = UserDetails(
+        dni=500000 + n, firstName=f"{tipo.capitalize()}{n}", lastName="Test",
+        type=tipo, email=f"{tipo}{n}@notificaciones", carer_id=carer_id,
+    )
+    session.add(usuario)
+    session.flush()
+    return usuario.id
+
+
+@pytest.fixture
+def escenario(engine):
+    """Carrera, materia, un estudiante y un profesor nuevos para cada test."""
+    sufijo = next(_numero)
+    with db.SessionLocal(bind=engine) as session:
+        carrera = Carer(f"Carrera {sufijo}")
+        session.add(carrera)
+        session.flush()
+        materia = Materia(name=f"Materia {sufijo}", carer_id=carrera.id)
+        session.add(materia)
+        session.flush()
+        datos = {
+            "carer_id": carrera.id,
+            "materia_id": materia.id,
+            "estudiante": _crear_usuario(session, "estudiante", carrera.id),
+            "profesor": _crear_usuario(session, "profesor"),
+        }
+        session.commit()
+    return datos
+
+
+def _textos(client, user_id, tipo):
+    respuesta = client.get(f"/notifications/{user_id}/{tipo}")
+    assert respuesta.status_code == 200
+    return [n["texto"] for n in respuesta.json()]
+
+
+def _aciertos(client):
+    return client.get("/notifications/cache/stats").json()["aciertos"]
+
+
+def test_lectura_repetida_sale_del_cache(client, escenario):
+    user_id = escenario["estudiante"]
+    primera = _textos(client, user_id, "estudiante")
+    aciertos = _aciertos(client)
+    assert _textos(client, user_id, "estudiante") == primera
+    assert _aciertos(client) == aciertos + 1
+
+
+def test_mensaje_visible_en_la_lectura_siguiente(client, escenario):
+    est, prof = escenario["estudiante"], escenario["profesor"]
+    assert _textos(client, prof, "profesor") == []
+
+    client.post("/messages/send", data={"sender_id": est, "receiver_id": prof, "content": "consulta"})
+
+    assert any("consulta" in t for t in _textos(client, prof, "profesor"))
+
+
+def test_pago_visible_en_la_lectura_siguiente(client, escenario):
+    est = escenario["estudiante"]
+    assert not any("pago" in t for t in _textos(client, est, "estudiante"))
+
+    respuesta = client.post("/payment/new", json={
+        "carer_id": escenario["carer_id"], "user_id": est,
+        "amount": 1234, "affected_month": "2024-03-01",
+    })
+    assert respuesta.status_code == 200
+
+    assert any("$1234" in t for t in _textos(client, est, "estudiante"))
+
+
+def test_asignacion_y_nota_visibles_en_la_lectura_siguiente(client, escenario):
+    est, prof, materia_id = escenario["estudiante"], escenario["profesor"], escenario["materia_id"]
+    assert _textos(client, prof, "profesor") == []
+
+    client.post("/users/asignar-materia", json={
+        "user_id": prof, "materia_id": materia_id, "tipo_relacion": "profesor",
+    })
+    assert "Se te ha asignado a 1 materia(s)." in _textos(client, prof, "profesor")
+
+    client.post("/users/asignar-materia", json={
+        "user_id": est, "materia_id": materia_id, "tipo_relacion": "estudiante",
+    })
+    assert _textos(client, est, "estudiante") == []
+
+    client.post(f"/materia/{materia_id}/notas", json=[{"user_id": est, "nota": 8}])
+    assert "Se han cargado 1 nota(s)." in _textos(client, est, "estudiante")
+
+
+def test_marcar_leida_visible_en_la_lectura_siguiente(client, escenario):
+    est, prof = escenario["estudiante"], escenario["profesor"]
+    client.post("/messages/send", data={"sender_id": est, "receiver_id": prof, "content": "hola"})
+    clave = client.get(f"/notifications/{prof}/profesor").json()[0]["clave"]
+
+    client.post("/notifications/marcar-leida", json={"user_id": prof, "clave": clave})
+
+    assert _textos(client, prof, "profesor") == []
+
+
+def test_replica_atrasada_no_vuelve_a_llenar_el_cache(client, engine, escenario, monkeypatch, tmp_path):
+    est, prof = escenario["estudiante"], escenario["profesor"]
+    assert _textos(client, prof, "profesor") == []
+
+    # La réplica queda congelada en este punto; los GET van a ella
+    origen = engine.url.database
+    copia = os.path.join(tmp_path, "replica.db")
+    with sqlite3.connect(origen) as src, sqlite3.connect(copia) as dst:
+        src.backup(dst)
+    replica = create_engine(f"sqlite:///{copia}")
+    monkeypatch.setattr(db, "get_read_engine", lambda: replica)
+    monkeypatch.setattr(db, "DB_REPLICA_STICKY_SECONDS", 0)
+
+    client.post("/messages/send", data={"sender_id": est, "receiver_id": prof, "content": "recién"})
+    with replica.connect() as conn:
+        assert conn.execute(select(Message.id).where(Message.content == "recién")).first() is None
+
+    assert any("recién" in t for t in _textos(client, prof, "profesor"))
+    # y lo que quedó en el cache también es lo nuevo
+    assert any("recién" in t for t in _textos(client, prof, "profesor"))
+    replica.dispose()
+
+
+def test_invalidar_un_usuario_no_descarta_el_calculo_de_otro():
+    cache = notificaciones._Cache(maximo=10, ttl=60)
+    gen_a, gen_b = cache.generacion_de(1), cache.generacion_de(2)
+    # Mientras se calculaban las dos, un commit invalidó al usuario 1
+    cache.invalidar([1])
+    cache.put(1, "estudiante", ["viejo"], gen_a)
+    cache.put(2, "estudiante", ["vigente"], gen_b)
+    assert cache.get(1, "estudiante") is None
+    assert cache.get(2, "estudiante") == ["vigente"]
+    # Invalidar a todos sí descarta cualquier cálculo en curso
+    gen_b = cache.generacion_de(2)
+    cache.invalidar()
+    cache.put(2, "estudiante", ["viejo"], gen_b)
+    assert cache.get(2, "estudiante") is None
@@ -0,0 +1,37 @@
+# Read-your-writes entre workers (user-005): la marca de escritura viaja en una
+# cookie, así un worker que no vio la escritura igual manda el GET al primario.
+from starlette.requests import Request
+
+import config.db as db
+
+
+def _get(cookie=None):
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "headers": headers,
+        "client": ("10.0.0.1", 1234),
+    })
+
+
+def test_escritura_deja_la_cookie(client):
+    respuesta = client.post("/carer/new", json={"name": "Carrera réplicas"})
+    assert respuesta.status_code == 200
+    assert db.COOKIE_ESCRITURA in respuesta.cookies
+    assert db.COOKIE_ESCRITURA not in client.get("/carer/all").headers.get("set-cookie", "")
+
+
+def test_otro_worker_respeta_la_cookie(client, monkeypatch):
+    client.cookies.clear()
+    respuesta = client.post("/carer/new", json={"name": "Carrera otro worker"})
+    cookie = f"{db.COOKIE_ESCRITURA}={respuesta.cookies[db.COOKIE_ESCRITURA]}"
+    # Otro proceso: su dict de escrituras no sabe nada de este cliente
+    monkeypatch.setattr(db, "_escrituras", {})
+
+    assert db._usa_replica(_get()) is True
+    assert db._usa_replica(_get(cookie)) is False
+
+
+def test_cookie_fabricada_no_fija_el_primario(monkeypatch):
+    monkeypatch.setattr(db, "_escrituras", {})
+    assert db._usa_replica(_get(f"{db.COOKIE_ESCRITURA}=99999999999")) is True
+    assert db._usa_replica(_get(f"{db.COOKIE_ESCRITURA}=basura")) is True